@@ -2,7 +2,9 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
-from .models import UserProfile, Video, Comment, Feedback, Notification
+from .models import UserProfile, Video, Comment, Feedback, Notification, NotificationBroadcast, Job, Tag
+from .notifications import invalidate_unread
+from .rollups import record_feedback_read
 
 # Register your models here.
 
@@ -79,15 +81,23 @@ admin.site.register(User, CustomUserAdmin)
 
 @admin.register(Video)
 class VideoAdmin(admin.ModelAdmin):
-    list_display = ('title', 'admin', 'video_type', 'uploaded_at', 'views', 'get_likes_count')
+    list_display = ('title', 'admin', 'video_type', 'uploaded_at', 'views', 'likes_count')
     list_filter = ('video_type', 'uploaded_at', 'tags', 'admin')
-    search_fields = ('title', 'description', 'tags')
+    search_fields = ('title', 'description', 'tags_text')
     prepopulated_fields = {'slug': ('title',)}
-    readonly_fields = ('views', 'get_likes_count', 'uploaded_at')
+    # Tags are edited as text: set_tags keeps the Tag links, their counts and tags_text in step
+    readonly_fields = ('views', 'likes_count', 'uploaded_at', 'tags')
 
-    def get_likes_count(self, obj):
-        return obj.likes.count()
-    get_likes_count.short_description = 'Likes'
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        form.instance.set_tags(form.cleaned_data['tags_text'])
+
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    list_display = ('name', 'slug', 'video_count')
+    search_fields = ('name', 'slug')
+    prepopulated_fields = {'slug': ('name',)}
+    readonly_fields = ('video_count',)
 
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
@@ -103,28 +113,67 @@ class FeedbackAdmin(admin.ModelAdmin):
     actions = ['mark_as_read', 'mark_as_unread']
 
     def mark_as_read(self, request, queryset):
+        changed = list(queryset.filter(is_read=False).only('created_at'))
         queryset.update(is_read=True)
+        record_feedback_read(changed, is_read=True) # update() bypasses the rollup signals
         self.message_user(request, f"{queryset.count()} feedback messages marked as read.")
     mark_as_read.short_description = "Mark selected feedback as read"
 
     def mark_as_unread(self, request, queryset):
+        changed = list(queryset.filter(is_read=True).only('created_at'))
         queryset.update(is_read=False)
+        record_feedback_read(changed, is_read=False)
         self.message_user(request, f"{queryset.count()} feedback messages marked as unread.")
     mark_as_unread.short_description = "Mark selected feedback as unread"
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
-    list_display = ('user', 'message', 'is_read', 'created_at')
+    list_display = ('user', 'message', 'is_read', 'created_at', 'broadcast')
     list_filter = ('is_read', 'created_at', 'user')
     search_fields = ('message', 'user__username')
     actions = ['mark_as_read', 'mark_as_unread'] # Reuse actions for notifications
 
     def mark_as_read(self, request, queryset):
-        queryset.update(is_read=True)
-        self.message_user(request, f"{queryset.count()} notifications marked as read.")
+        user_ids = list(queryset.values_list('user_id', flat=True).distinct())
+        changed = queryset.update(is_read=True)
+        invalidate_unread(*user_ids) # update() bypasses the signals
+        self.message_user(request, f"{changed} notifications marked as read.")
     mark_as_read.short_description = "Mark selected notifications as read"
 
     def mark_as_unread(self, request, queryset):
-        queryset.update(is_read=False)
-        self.message_user(request, f"{queryset.count()} notifications marked as unread.")
-    mark_as_unread.short_description = "Mark selected notifications as unread"
\ No newline at end of file
+        user_ids = list(queryset.values_list('user_id', flat=True).distinct())
+        changed = queryset.update(is_read=False)
+        invalidate_unread(*user_ids)
+        self.message_user(request, f"{changed} notifications marked as unread.")
+    mark_as_unread.short_description = "Mark selected notifications as unread"
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        invalidate_unread(obj.user_id)
+
+    def delete_queryset(self, request, queryset):
+        user_ids = list(queryset.values_list('user_id', flat=True).distinct())
+        super().delete_queryset(request, queryset)
+        invalidate_unread(*user_ids)
+
+@admin.register(NotificationBroadcast)
+class NotificationBroadcastAdmin(admin.ModelAdmin):
+    list_display = ('message', 'sent_by', 'created_at')
+    search_fields = ('message',)
+    readonly_fields = ('created_at',)
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'video', 'status', 'attempts', 'run_after', 'locked_by', 'updated_at')
+    list_filter = ('kind', 'status')
+    search_fields = ('video__title', 'last_error')
+    readonly_fields = ('created_at', 'updated_at')
+    actions = ['retry_now']
+
+    def retry_now(self, request, queryset):
+        from django.utils import timezone
+        from .jobs import wake_worker
+        updated = queryset.exclude(status=Job.STATUS_RUNNING).update(status=Job.STATUS_QUEUED, attempts=0, run_after=timezone.now())
+        wake_worker()
+        self.message_user(request, f"{updated} jobs queued for retry.")
+    retry_now.short_description = "Retry selected jobs now"
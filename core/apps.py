@@ -0,0 +1,10 @@
+# core/apps.py
+from django.apps import AppConfig
+
+
+class CoreConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'core'
+
+    def ready(self):
+        from . import signals # noqa: F401 (connects the receivers)
@@ -0,0 +1,84 @@
+# core/audiences.py
+"""
+Notification audiences, resolved on the server.
+
+An audience is a small JSON-able spec, so it can be stored in a job payload
+and resolved when the job runs rather than when the form is posted:
+
+    {'segment': 'tag_engaged', 'tag': 'gis', 'days': None, 'user_ids': [3, 17]}
+
+`segment` names one of SEGMENTS (or is empty) and `user_ids` adds
+individually picked users. resolve() turns a spec into one User queryset
+built from pk__in subqueries, so it never holds duplicates, counts with a
+single COUNT, and can be streamed with iterator().
+"""
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Comment, Video
+
+DEFAULT_ACTIVE_DAYS = 30
+
+
+def _all(spec):
+    return User.objects.all()
+
+
+def _admins(spec):
+    return User.objects.filter(
+        Q(is_staff=True) | Q(userprofile__is_main_admin=True) | Q(userprofile__is_restricted_admin=True)
+    )
+
+
+def _tag_engaged(spec):
+    # Liked or commented on a video tagged with spec['tag'] (a Tag slug)
+    tagged = Video.objects.filter(tags__slug=spec.get('tag')).values('pk')
+    likers = Video.likes.through.objects.filter(video_id__in=tagged).values('user_id')
+    commenters = Comment.objects.filter(video_id__in=tagged).values('user_id')
+    return User.objects.filter(Q(pk__in=likers) | Q(pk__in=commenters))
+
+
+def _active(spec):
+    # Logged in or commented within the last spec['days'] days
+    since = timezone.now() - timedelta(days=spec.get('days') or DEFAULT_ACTIVE_DAYS)
+    commenters = Comment.objects.filter(created_at__gte=since).values('user_id')
+    return User.objects.filter(Q(last_login__gte=since) | Q(pk__in=commenters))
+
+
+# Segment key -> (label, function of the spec returning a User queryset)
+SEGMENTS = {
+    'all': ("All users", _all),
+    'admins': ("Admins", _admins),
+    'tag_engaged': ("Users who liked or commented on videos with a tag", _tag_engaged),
+    'active': ("Users active in the last N days", _active),
+}
+
+
+def resolve(spec):
+    """The users an audience spec stands for, as a single queryset."""
+    segment = spec.get('segment')
+    user_ids = spec.get('user_ids') or []
+    if segment == 'all':
+        return User.objects.all()
+    condition = Q(pk__in=user_ids)
+    if segment:
+        condition |= Q(pk__in=SEGMENTS[segment][1](spec).values('pk'))
+    return User.objects.filter(condition)
+
+
+def describe(spec):
+    """A short human-readable description of an audience, e.g. for messages."""
+    parts = []
+    segment = spec.get('segment')
+    if segment == 'tag_engaged':
+        parts.append(f"users engaged with '{spec.get('tag')}'")
+    elif segment == 'active':
+        parts.append(f"users active in the last {spec.get('days') or DEFAULT_ACTIVE_DAYS} days")
+    elif segment:
+        parts.append(SEGMENTS[segment][0].lower())
+    if spec.get('user_ids'):
+        parts.append(f"{len(spec['user_ids'])} picked user(s)")
+    return ' and '.join(parts)
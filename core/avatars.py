@@ -0,0 +1,58 @@
+# core/avatars.py
+"""
+Size variants of UserProfile.profile_picture.
+
+The picture is decoded once from its file stream (no local path, so this
+works on S3 too), cropped square and encoded as WebP and JPEG for every
+size in AVATAR_VARIANTS. The resulting URLs are kept on the profile, so
+templates render avatars without opening or resizing images.
+"""
+import uuid
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from .media import delete_directory_of
+
+FORMATS = (('webp', 'WEBP'), ('jpeg', 'JPEG'))
+
+
+def _encode(image, fmt):
+    buffer = BytesIO()
+    options = {'method': 4} if fmt == 'WEBP' else {'optimize': True, 'progressive': True}
+    image.save(buffer, format=fmt, quality=settings.AVATAR_QUALITY, **options)
+    return buffer.getvalue()
+
+
+def build_avatar_variants(user_id, file):
+    """
+    Stores every variant of the image in `file` and returns the manifest kept
+    in UserProfile.avatar_variants:
+    {'prefix': ..., 'sizes': {'navbar': {'size': 32, 'webp': url, 'jpeg': url}, ...}}
+    """
+    largest = max(settings.AVATAR_VARIANTS.values()) * settings.AVATAR_DENSITY
+    file.seek(0)
+    with Image.open(file) as source:
+        source.draft('RGB', (largest, largest)) # JPEG decodes straight at a reduced scale
+        image = ImageOps.exif_transpose(source).convert('RGB')
+    file.seek(0) # The original is still stored from this stream
+
+    prefix = f"profile_pics/variants/{user_id}/{uuid.uuid4().hex[:12]}"
+    sizes = {}
+    for variant, size in settings.AVATAR_VARIANTS.items():
+        pixels = size * settings.AVATAR_DENSITY
+        resized = ImageOps.fit(image, (pixels, pixels), Image.LANCZOS)
+        entry = {'size': size}
+        for key, fmt in FORMATS:
+            name = default_storage.save(f"{prefix}/{variant}.{key}", ContentFile(_encode(resized, fmt)))
+            entry[key] = default_storage.url(name)
+        sizes[variant] = entry
+    return {'prefix': prefix, 'sizes': sizes}
+
+
+def release_avatar_variants(manifest):
+    if manifest and manifest.get('prefix'):
+        delete_directory_of(f"{manifest['prefix']}/")
@@ -0,0 +1,190 @@
+# core/blobs.py
+"""
+Content-addressed storage for uploaded video files.
+
+Every uploaded file is stored under a key derived from its SHA-256 digest,
+so identical bytes are kept once and shared by every Video that points at
+them. Derived assets (thumbnail, HLS renditions, previews) of a duplicate
+are shared by reference too, and stored objects are only deleted once no
+Video references them any more.
+"""
+import hashlib
+import os
+
+from django.core.files.storage import default_storage
+
+from .media import delete_directory_of
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Video fields holding a stored file name / the name of a file inside a derived-asset directory
+SHARED_FILE_FIELDS = ('video_file', 'thumbnail')
+SHARED_DIRECTORY_FIELDS = ('hls_playlist', 'preview_track')
+
+
+def file_sha256(file):
+    """
+    The hex SHA-256 of an uploaded or stored file.
+
+    Uploads parsed by the hashing upload handlers (see core/uploads.py)
+    already carry the digest computed while the request streamed in; other
+    files are hashed chunk by chunk.
+    """
+    digest = getattr(file, 'sha256', None)
+    if digest:
+        return digest
+    sha256 = hashlib.sha256()
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    for chunk in file.chunks(HASH_CHUNK_SIZE):
+        sha256.update(chunk)
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    return sha256.hexdigest()
+
+
+def blob_name(digest, filename):
+    extension = os.path.splitext(filename)[1].lower()
+    return f"videos/sha256/{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+
+def store_video_file(video, file):
+    """
+    Stores `file` under its content address and points video.video_file at it.
+
+    Returns True when new bytes were written, False when an identical blob
+    was already stored and is now shared.
+    """
+    digest = file_sha256(file)
+    name = blob_name(digest, file.name)
+    video.content_hash = digest
+    if default_storage.exists(name):
+        stored = False
+    else:
+        name = default_storage.save(name, file)
+        stored = True
+    video.video_file.name = name
+    video.video_file._committed = True
+    return stored
+
+
+def copy_stored_file(source, target):
+    """Copies a stored object; S3 buckets copy server-side instead of streaming through this process."""
+    if hasattr(default_storage, 'bucket'):
+        extra_args = {'ACL': default_storage.default_acl} if default_storage.default_acl else None
+        default_storage.bucket.copy(
+            {'Bucket': default_storage.bucket_name, 'Key': default_storage._normalize_name(source)},
+            default_storage._normalize_name(target),
+            ExtraArgs=extra_args,
+        )
+    else:
+        with default_storage.open(source, 'rb') as file:
+            default_storage.save(target, file)
+
+
+def adopt_stored_file(video):
+    """
+    Moves a file that reached storage without going through Video.save()
+    (a direct-to-bucket upload) to its content address, then shares an
+    already processed duplicate's media and queues whatever is missing.
+    """
+    from .jobs import enqueue_video_processing
+
+    incoming = video.video_file.name
+    with video.video_file.open('rb') as file:
+        digest = file_sha256(file)
+    name = blob_name(digest, incoming)
+    if name != incoming:
+        if not default_storage.exists(name):
+            copy_stored_file(incoming, name)
+        default_storage.delete(incoming)
+    video.video_file.name = name
+    video.content_hash = digest
+    video.duplicate_of = find_processed_duplicate(video)
+    stale_variants = video.thumbnail_variants
+    if video.duplicate_of:
+        share_derived_assets(video.duplicate_of, video)
+    video.save(update_fields=['video_file', 'content_hash', 'thumbnail', 'thumbnail_variants', *SHARED_DIRECTORY_FIELDS, *video.METADATA_FIELDS])
+    if video.thumbnail_variants != stale_variants:
+        release_thumbnail_variants(stale_variants, exclude_pk=video.pk)
+    enqueue_video_processing(video)
+
+
+def find_processed_duplicate(video):
+    """Another Video with the same bytes whose processing already produced a thumbnail."""
+    from .models import Video
+
+    if not video.content_hash:
+        return None
+    return (
+        Video.objects.filter(content_hash=video.content_hash)
+        .exclude(pk=video.pk)
+        .exclude(thumbnail='')
+        .exclude(thumbnail__isnull=True)
+        .order_by('uploaded_at')
+        .first()
+    )
+
+
+def share_derived_assets(source, target):
+    """Points `target` at `source`'s derived assets; returns the field names that were reused."""
+    reused = []
+    if source.duration is not None and target.duration is None:
+        # Same bytes, same probe results
+        for field in source.METADATA_FIELDS:
+            setattr(target, field, getattr(source, field))
+        reused.append('duration')
+    if source.thumbnail and not target.thumbnail:
+        # The variants go with the thumbnail they were cut from; any the target held are stale
+        target.thumbnail = source.thumbnail.name
+        target.thumbnail_variants = source.thumbnail_variants
+        reused += ['thumbnail', 'thumbnail_variants']
+    for field in SHARED_DIRECTORY_FIELDS:
+        value = getattr(source, field)
+        if value and not getattr(target, field):
+            setattr(target, field, value)
+            reused.append(field)
+    return reused
+
+
+def is_referenced(field, name, exclude_pk=None):
+    from .models import Video
+
+    references = Video.objects.filter(**{field: name})
+    if exclude_pk is not None:
+        references = references.exclude(pk=exclude_pk)
+    return references.exists()
+
+
+def release_file(field, name, exclude_pk=None):
+    """Deletes a stored file unless another Video still references it."""
+    if name and not is_referenced(field, name, exclude_pk):
+        default_storage.delete(name)
+
+
+def release_directory(field, name, exclude_pk=None):
+    """Deletes a derived-asset directory unless another Video still references it."""
+    if name and not is_referenced(field, name, exclude_pk):
+        delete_directory_of(name)
+
+
+def release_thumbnail_variants(manifest, exclude_pk=None):
+    """Deletes a thumbnail variant set (see core/media.py) unless another Video still uses it."""
+    if manifest and not is_referenced('thumbnail_variants__prefix', manifest['prefix'], exclude_pk):
+        delete_directory_of(f"{manifest['prefix']}/")
+
+
+def release_video_assets(video):
+    """Called after a Video is deleted: drops every stored object only it referenced."""
+    for field in SHARED_FILE_FIELDS:
+        value = getattr(video, field)
+        release_file(field, value.name if value else None)
+    for field in SHARED_DIRECTORY_FIELDS:
+        release_directory(field, getattr(video, field))
+    release_thumbnail_variants(video.thumbnail_variants)
+
+
+# --- Job handlers (see JOB_HANDLERS in core/jobs.py) ---
+
+def fingerprint_job(job):
+    adopt_stored_file(job.video)
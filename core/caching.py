@@ -0,0 +1,157 @@
+# core/caching.py
+"""
+Response and fragment caching for the public pages.
+
+Cached content is keyed on version tokens rather than deleted when data
+changes. Each token names one thing a page can depend on:
+
+- LISTING: which videos the lists contain and in what order (uploads,
+  deletions, tag changes);
+- CATALOG: anything at all the catalog pages show, counters included; the
+  catalog ETag (core/conditional.py) is built from it. Bumped with
+  bump_catalog() on every Video write, view flushes included;
+- TAG_CLOUD: the tag cloud;
+- video_key(pk): one video's card (title, thumbnail, counts, tags);
+- comments_key(pk): one video's comment list.
+
+The receivers in core/signals.py bump exactly the tokens a change affects
+(Video, Comment, likes and tags). A fragment whose token was bumped is
+simply never looked up again and expires on its own.
+
+Anonymous GET requests to cached views are answered from a whole-response
+cache entry (serve_anonymous). The entry records the tokens the view
+declared with depend_on() while rendering, and is served only while all of
+them are unchanged: liking a video invalidates the pages that show it and
+nothing else. View counts are flushed with UPDATEs that bump only CATALOG,
+so cached counts may lag by up to PAGE_CACHE_SECONDS.
+
+Hits and misses are counted per cache name in the cache itself (shared by
+all processes); see stats() and `manage.py cache_stats`.
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+
+LISTING = 'version:listing'
+CATALOG = 'version:catalog'
+TAG_CLOUD = 'version:tag_cloud'
+STATS_PREFIX = 'cache_stats'
+STAT_NAMES_KEY = f'{STATS_PREFIX}:names'
+
+
+def video_key(pk):
+    return f'version:video:{pk}'
+
+
+def comments_key(video_pk):
+    return f'version:comments:{video_pk}'
+
+
+def _token():
+    return uuid.uuid4().hex[:12]
+
+
+def get_versions(keys):
+    """{key: current token}, creating tokens for keys not seen before (or evicted)."""
+    keys = list(keys)
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, _token(), None) # Another process may win the race; read back below
+        versions.update(cache.get_many(missing))
+    return versions
+
+
+def bump(*keys):
+    """Gives `keys` new tokens, invalidating everything cached under the old ones."""
+    if keys:
+        cache.set_many({key: _token() for key in keys}, None)
+
+
+def bump_catalog():
+    """
+    Bumps CATALOG now and again once the current transaction commits: a
+    request that read the first new token before the commit saw the old rows.
+    """
+    bump(CATALOG)
+    transaction.on_commit(lambda: bump(CATALOG))
+
+
+def depend_on(request, keys):
+    """
+    Declares that the response being rendered depends on `keys` and returns
+    their current tokens (for fragment cache keys). Call it before reading
+    the data the keys stand for.
+    """
+    versions = get_versions(keys)
+    dependencies = getattr(request, '_cache_dependencies', None)
+    if dependencies is not None:
+        dependencies.update(versions)
+    return versions
+
+
+def attach_card_versions(request, videos):
+    """Sets `cache_version` on each video for the card fragment key in core/_video_card.html."""
+    versions = depend_on(request, [video_key(video.pk) for video in videos])
+    for video in videos:
+        video.cache_version = versions[video_key(video.pk)]
+
+
+def record(name, hit):
+    stat = f"{STATS_PREFIX}:{name}:{'hits' if hit else 'misses'}"
+    if cache.add(stat, 1, None):
+        names = cache.get(STAT_NAMES_KEY, set())
+        cache.set(STAT_NAMES_KEY, names | {name}, None)
+    else:
+        try:
+            cache.incr(stat)
+        except ValueError: # Evicted between add() and incr()
+            cache.add(stat, 1, None)
+
+
+def stats():
+    """{name: {'hits': n, 'misses': n}} for every cache that has been used."""
+    names = sorted(cache.get(STAT_NAMES_KEY, set()))
+    counts = cache.get_many([f'{STATS_PREFIX}:{name}:{kind}' for name in names for kind in ('hits', 'misses')])
+    return {
+        name: {kind: counts.get(f'{STATS_PREFIX}:{name}:{kind}', 0) for kind in ('hits', 'misses')}
+        for name in names
+    }
+
+
+def reset_stats():
+    names = cache.get(STAT_NAMES_KEY, set())
+    cache.delete_many([f'{STATS_PREFIX}:{name}:{kind}' for name in names for kind in ('hits', 'misses')] + [STAT_NAMES_KEY])
+
+
+def _cacheable(request):
+    # Pages with pending flash messages are one visitor's; len() does not consume them
+    return request.method == 'GET' and not request.user.is_authenticated and not len(messages.get_messages(request))
+
+
+def serve_anonymous(request, name, view, *args, **kwargs):
+    """Serves `view` from the page cache for anonymous visitors, keyed by the full path (tag, cursor...)."""
+    if not _cacheable(request):
+        return view(request, *args, **kwargs)
+    key = f"page:{name}:{hashlib.md5(request.get_full_path().encode()).hexdigest()}"
+    entry = cache.get(key)
+    if entry is not None and get_versions(entry['versions']) == entry['versions']:
+        record(name, hit=True)
+        return HttpResponse(entry['content'], content_type=entry['content_type'])
+    record(name, hit=False)
+
+    request._cache_dependencies = {}
+    response = view(request, *args, **kwargs)
+    if response.status_code == 200 and not response.streaming and not request.META.get('CSRF_COOKIE_USED'):
+        cache.set(key, {
+            'content': response.content,
+            'content_type': response['Content-Type'],
+            'versions': request._cache_dependencies,
+        }, settings.PAGE_CACHE_SECONDS)
+    return response
@@ -0,0 +1,78 @@
+# core/conditional.py
+"""
+Conditional GET (ETag) for the catalog and video pages.
+
+Validators are computed from version stamps, never from rendered pages:
+
+- a video's stamp is its updated_at plus its view (flushed and pending)
+  and like counters: one indexed row read;
+- the catalog's stamp is the CATALOG version token (core/caching.py):
+  one cache read, however large the catalog.
+
+Video.updated_at moves on every write except view flushes: save()
+(including update_fields saves), every other Video queryset update()
+(likes, processing results) and the signal receivers for comments and tag
+changes. The CATALOG token is bumped by all of those, by view flushes
+(they are queryset updates too) and by deletions. Views change the pages
+without moving updated_at, so the pages send no Last-Modified (an
+If-Modified-Since alone could never see them); a matching If-None-Match
+gets a 304 before any template work.
+
+The ETag also covers what differs between visitors of the same URL (the
+user, their CSRF cookie and the navbar's cached unread count), and pages
+with pending flash messages are never answered with a 304.
+"""
+import hashlib
+
+from django.contrib import messages
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from . import caching
+from .counters import pending_views
+from .models import Video
+from .notifications import unread_count
+
+
+def make_etag(request, *parts):
+    """A strong ETag over `parts` and the visitor-specific bits of the page."""
+    unread = unread_count(request.user) if request.user.is_authenticated else None
+    parts = (*parts, request.user.pk, request.META.get('CSRF_COOKIE'), unread)
+    return quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+
+
+def video_stamp(slug):
+    """(pk, updated_at, views, likes_count) of a video, or None if there is no such video."""
+    return Video.objects.filter(slug=slug).values_list('pk', 'updated_at', 'views', 'likes_count').first()
+
+
+def video_validators(request, stamp):
+    """The ETag for a video's pages, from its video_stamp(); None for None."""
+    if stamp is None:
+        return None
+    pk, updated_at, views, likes_count = stamp
+    views += pending_views(pk) # As displayed
+    return make_etag(request, request.path, pk, updated_at, views, likes_count)
+
+
+def catalog_validators(request):
+    """The ETag for pages listing the catalog."""
+    version = caching.get_versions([caching.CATALOG])[caching.CATALOG]
+    return make_etag(request, request.get_full_path(), version)
+
+
+def respond(request, etag, render):
+    """
+    A 304 if the request's If-None-Match matches `etag`, else render() with
+    the ETag set. Only GET/HEAD are conditional.
+    """
+    if etag is None or request.method not in ('GET', 'HEAD') or len(messages.get_messages(request)):
+        return render()
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = render()
+    if response.status_code in (200, 304):
+        response.headers.setdefault('ETag', etag)
+        # Revalidate on every use: the validators are what make repeat visits cheap
+        response.headers.setdefault('Cache-Control', 'private, no-cache' if request.user.is_authenticated else 'no-cache')
+    return response
@@ -1,17 +1,44 @@
 # core/consumers.py
+import asyncio
 import json
+import logging
+from channels.consumer import AsyncConsumer, SyncConsumer
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
+
+from . import live_comments, notifications
+from .models import Video
+from .notifications import BROADCAST_GROUP, user_group
+
+logger = logging.getLogger(__name__)
 
 class NotificationConsumer(AsyncWebsocketConsumer):
+    """
+    A user's notifications: the unread backlog on connect, new ones as they
+    are sent, and read acknowledgements from the client:
+
+        {"action": "read", "ids": [1, 2]} or {"action": "read_all"}
+
+    Every change to the unread count is sent to all of the user's sockets.
+    """
     async def connect(self):
         self.user = self.scope["user"]
         if self.user.is_authenticated:
-            self.user_group_name = f"user_{self.user.id}"
+            self.user_group_name = user_group(self.user.id)
             await self.channel_layer.group_add(
                 self.user_group_name,
                 self.channel_name
             )
+            # Notifications to everyone are one send to this group (core/notifications.py)
+            await self.channel_layer.group_add(BROADCAST_GROUP, self.channel_name)
             await self.accept()
+            count, backlog = await self.get_backlog()
+            await self.send(text_data=json.dumps({
+                'unread_count': count,
+                'notifications': backlog,
+                'type': 'unread'
+            }))
         else:
             await self.close() # Close connection if user is not authenticated
 
@@ -21,16 +48,135 @@ class NotificationConsumer(AsyncWebsocketConsumer):
                 self.user_group_name,
                 self.channel_name
             )
+            await self.channel_layer.group_discard(BROADCAST_GROUP, self.channel_name)
 
-    # Receive message from WebSocket (not used for this simple notification system)
+    # Read acknowledgements from the WebSocket
     async def receive(self, text_data):
-        pass
+        try:
+            data = json.loads(text_data)
+            action = data.get('action')
+            ids = None if action == 'read_all' else [int(pk) for pk in data.get('ids', [])]
+        except (ValueError, TypeError, AttributeError):
+            return # Not an acknowledgement
+        if action not in ('read', 'read_all') or ids == []:
+            return
+        count = await database_sync_to_async(notifications.mark_read)(self.user, ids)
+        # The badge in every open tab of this user
+        await self.channel_layer.group_send(self.user_group_name, {'type': 'unread_update', 'unread_count': count, 'read': ids})
+
+    @database_sync_to_async
+    def get_backlog(self):
+        return notifications.unread_count(self.user), notifications.recent_unread(self.user)
+
+    @database_sync_to_async
+    def get_notification(self, event):
+        # Broadcasts carry no per-user row until it is materialized
+        if 'broadcast_id' in event:
+            notification_id = notifications.broadcast_notification_id(self.user, event['broadcast_id'])
+        else:
+            notification_id = event.get('id')
+        return notification_id, notifications.unread_count(self.user)
 
     # Receive message from channel layer (e.g., from a Django view)
     async def send_notification(self, event):
-        message = event["message"]
+        notification_id, count = await self.get_notification(event)
         # Send message to WebSocket
         await self.send(text_data=json.dumps({
-            'message': message,
+            'id': notification_id,
+            'message': event["message"],
+            'unread_count': count,
             'type': 'notification'
-        }))
\ No newline at end of file
+        }))
+
+    async def unread_update(self, event):
+        await self.send(text_data=json.dumps({
+            'read': event["read"], # null after a mark-all
+            'unread_count': event["unread_count"],
+            'type': 'unread'
+        }))
+
+    # Background job progress for videos this admin uploaded (see core/jobs.py)
+    async def job_update(self, event):
+        await self.send(text_data=json.dumps({
+            'job': event["job"],
+            'type': 'job'
+        }))
+
+
+class CommentStreamConsumer(AsyncWebsocketConsumer):
+    """Pushes new comments to an open video page (see core/live_comments.py)."""
+    async def connect(self):
+        self.group_name = None
+        video_pk = await self.get_video_pk(self.scope["url_route"]["kwargs"]["slug"])
+        if not self.scope["user"].is_authenticated or video_pk is None:
+            await self.close() # Same audience as video_detail_view
+            return
+        self.group_name = live_comments.group_name(video_pk)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        if self.group_name:
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    @database_sync_to_async
+    def get_video_pk(self, slug):
+        return Video.objects.filter(slug=slug).values_list('pk', flat=True).first()
+
+    # One event per fan-out flush, holding every comment posted since the last one
+    async def comments_batch(self, event):
+        await self.send(text_data=json.dumps({
+            'comments': event["comments"],
+            'comments_count': event.get("comments_count"),
+            'type': 'comments'
+        }))
+
+
+class CommentFanoutConsumer(AsyncConsumer):
+    """
+    Coalesces new comments on its own worker process (`runworker comment-fanout`).
+
+    Comment ids arriving within COMMENT_FANOUT_INTERVAL of the first are
+    rendered together and sent with one group_send per video.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pending = set()
+        self.flush_task = None
+
+    async def comments_publish(self, event):
+        self.pending.add(event["comment_id"])
+        if self.flush_task is None:
+            self.flush_task = asyncio.ensure_future(self.flush_later())
+
+    async def flush_later(self):
+        await asyncio.sleep(settings.COMMENT_FANOUT_INTERVAL)
+        comment_ids, self.pending = self.pending, set()
+        self.flush_task = None # Comments arriving from here on start the next batch
+        try:
+            # Not on the shared thread-sensitive executor, where a sync consumer's long job would stall it
+            batches = await database_sync_to_async(live_comments.render_batches, thread_sensitive=False)(comment_ids)
+            await asyncio.gather(*(
+                self.channel_layer.group_send(live_comments.group_name(video_pk), batch)
+                for video_pk, batch in batches.items()
+            ))
+        except Exception:
+            # Viewers still get these comments on their next page load
+            logger.exception("Comment fan-out failed for %d comment(s)", len(comment_ids))
+
+
+class JobWorkerConsumer(SyncConsumer):
+    """
+    Runs background jobs on the worker process (`runworker ... media-jobs`).
+
+    Messages are only wake-ups; the jobs themselves live in the Job table.
+    """
+    def jobs_wake(self, event):
+        from . import jobs
+
+        while jobs.run_pending():
+            pass
+        # Make sure jobs waiting out a retry backoff get picked up again
+        delay = jobs.seconds_until_next_job()
+        if delay is not None:
+            jobs.wake_worker(delay=max(delay, 1))
@@ -0,0 +1,10 @@
+# core/context_processors.py
+from .notifications import unread_count
+
+
+def notifications(request):
+    """`unread_notifications` for the navbar badge: the cached count, looked up only if a template uses it."""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {'unread_notifications': lambda: unread_count(user)}
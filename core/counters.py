@@ -0,0 +1,192 @@
+# core/counters.py
+"""
+Write-buffered video view counts.
+
+A page view only increments a counter in a shared store; the rows are
+updated later, in batches, with `views = views + n`. That keeps hot videos
+free of per-hit row writes and lost updates, and a session is counted once
+per VIEW_COUNT_DEDUPE_WINDOW.
+
+Flushes are done by the counters process in the Procfile (`manage.py
+flush_view_counts --loop`, every VIEW_COUNT_FLUSH_INTERVAL seconds). Only as
+a safety net, when that process is down, the request that notices nothing
+was flushed for VIEW_COUNT_MAX_STALENESS seconds flushes inline.
+
+The store is Redis (shared by every web process) or, for development and
+tests, an in-process dictionary.
+"""
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+FLUSH_LOCK_TIMEOUT = 60 # seconds; a crashed flusher cannot block others for longer
+
+
+class LocalCounterStore:
+    """Single-process stand-in for RedisCounterStore."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = defaultdict(int)
+        self.seen = {}
+        self.last_flush = time.time()
+        self.flushing = False
+
+    def mark_seen(self, key, window):
+        now = time.time()
+        with self.lock:
+            if self.seen.get(key, 0) > now:
+                return False
+            if len(self.seen) > 100000: # Drop expired entries now and then
+                self.seen = {k: expiry for k, expiry in self.seen.items() if expiry > now}
+            self.seen[key] = now + window
+            return True
+
+    def incr(self, pk, amount=1):
+        with self.lock:
+            self.pending[pk] += amount
+
+    def get_pending(self, pk):
+        return self.pending.get(pk, 0)
+
+    def drain(self):
+        with self.lock:
+            counts, self.pending = dict(self.pending), defaultdict(int)
+        return counts
+
+    def restore(self, counts):
+        for pk, amount in counts.items():
+            self.incr(pk, amount)
+
+    def acquire_flush_lock(self):
+        with self.lock:
+            if self.flushing:
+                return False
+            self.flushing = True
+            return True
+
+    def release_flush_lock(self):
+        with self.lock:
+            self.flushing = False
+
+    def get_last_flush(self):
+        return self.last_flush
+
+    def set_last_flush(self, when):
+        self.last_flush = when
+
+
+class RedisCounterStore:
+    PENDING = 'views:pending' # Hash of video pk -> unflushed views
+    LAST_FLUSH = 'views:last_flush'
+    FLUSH_LOCK = 'views:flush_lock'
+
+    def __init__(self, url):
+        import redis # Installed with channels_redis
+
+        self.redis = redis.Redis.from_url(url)
+        self.ResponseError = redis.ResponseError
+
+    def mark_seen(self, key, window):
+        return bool(self.redis.set(f"views:seen:{key}", 1, nx=True, ex=window))
+
+    def incr(self, pk, amount=1):
+        self.redis.hincrby(self.PENDING, pk, amount)
+
+    def get_pending(self, pk):
+        return int(self.redis.hget(self.PENDING, pk) or 0)
+
+    def drain(self):
+        # RENAME is atomic: increments arriving after it start a fresh hash
+        flushing = f"views:flushing:{uuid.uuid4().hex}"
+        try:
+            self.redis.rename(self.PENDING, flushing)
+        except self.ResponseError: # Nothing pending
+            return {}
+        counts = self.redis.hgetall(flushing)
+        self.redis.delete(flushing)
+        return {int(pk): int(amount) for pk, amount in counts.items()}
+
+    def restore(self, counts):
+        pipe = self.redis.pipeline()
+        for pk, amount in counts.items():
+            pipe.hincrby(self.PENDING, pk, amount)
+        pipe.execute()
+
+    def acquire_flush_lock(self):
+        return bool(self.redis.set(self.FLUSH_LOCK, 1, nx=True, ex=FLUSH_LOCK_TIMEOUT))
+
+    def release_flush_lock(self):
+        self.redis.delete(self.FLUSH_LOCK)
+
+    def get_last_flush(self):
+        return float(self.redis.get(self.LAST_FLUSH) or 0)
+
+    def set_last_flush(self, when):
+        self.redis.set(self.LAST_FLUSH, when)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if settings.VIEW_COUNTER_STORE == 'redis':
+                    _store = RedisCounterStore(settings.REDIS_URL)
+                else:
+                    _store = LocalCounterStore()
+    return _store
+
+
+def record_view(video_pk, session_key):
+    """Counts a view unless this session already viewed the video within the dedupe window; returns whether it counted."""
+    store = get_store()
+    if session_key and not store.mark_seen(f"{video_pk}:{session_key}", settings.VIEW_COUNT_DEDUPE_WINDOW):
+        return False
+    store.incr(video_pk)
+    if time.time() - store.get_last_flush() > settings.VIEW_COUNT_MAX_STALENESS:
+        flush_view_counts()
+    return True
+
+
+def pending_views(video_pk):
+    """Views counted but not yet written to the row."""
+    return get_store().get_pending(video_pk)
+
+
+def flush_view_counts():
+    """Applies buffered views to the database; returns how many were written."""
+    store = get_store()
+    if not store.acquire_flush_lock():
+        return 0 # Another process is flushing
+    try:
+        counts = store.drain()
+        if counts:
+            # One UPDATE per distinct increment rather than one per video
+            by_amount = defaultdict(list)
+            for pk, amount in counts.items():
+                by_amount[amount].append(pk)
+            from .models import Video
+            from .rollups import record_views
+            try:
+                with transaction.atomic():
+                    for amount, pks in by_amount.items():
+                        # Views alone leave updated_at: conditional GETs add the counters to their ETags
+                        # (and send no Last-Modified, which could not see them)
+                        Video.objects.filter(pk__in=pks).update(views=F('views') + amount, updated_at=F('updated_at'))
+                    record_views(counts) # Dashboard rollups, in the same transaction
+            except Exception:
+                store.restore(counts) # Keep the views for the next flush
+                raise
+        store.set_last_flush(time.time())
+        return sum(counts.values())
+    finally:
+        store.release_flush_lock()
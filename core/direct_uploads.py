@@ -0,0 +1,185 @@
+# core/direct_uploads.py
+"""
+Direct-to-bucket video uploads for S3-compatible storage.
+
+Instead of streaming the video through a web worker, the browser uploads it
+straight into the bucket as an S3 multipart upload, PUTting parts in
+parallel to presigned URLs. The web workers only start the upload, sign
+part URLs and complete it; the fingerprint job then hashes the object and
+moves it to its content address (see core/blobs.py).
+
+The bucket needs a CORS rule allowing PUT from the site's origin and
+exposing the ETag header.
+"""
+import math
+import mimetypes
+import os
+import uuid
+
+from botocore.exceptions import BotoCoreError, ClientError
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from storages.utils import clean_name
+
+from .jobs import enqueue
+from .models import UploadSession, Video
+from .uploads import OffsetMismatch, UploadError, sweep_stale_uploads
+
+MAX_PARTS = 10000 # S3 limit per multipart upload
+MIN_PART_SIZE = 5 * 1024 * 1024 # S3 limit for every part but the last
+
+
+def direct_uploads_enabled():
+    return settings.DIRECT_UPLOADS and hasattr(default_storage, 'bucket')
+
+
+def _client():
+    return default_storage.connection.meta.client
+
+
+def _key(name):
+    return default_storage._normalize_name(clean_name(name))
+
+
+def part_size_for(size):
+    part_size = max(settings.DIRECT_UPLOAD_PART_SIZE, MIN_PART_SIZE, math.ceil(size / MAX_PARTS))
+    return math.ceil(part_size / MIN_PART_SIZE) * MIN_PART_SIZE
+
+
+def part_count(session):
+    return max(1, math.ceil(session.size / part_size_for(session.size)))
+
+
+def start_direct_upload(admin, filename, size, title, description, tags):
+    sweep_stale_uploads()
+    filename = os.path.basename(filename)
+    name = f"videos/incoming/{uuid.uuid4().hex}{os.path.splitext(filename)[1].lower()}"
+    params = {
+        'Bucket': default_storage.bucket_name,
+        'Key': _key(name),
+        'ContentType': mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+    }
+    if default_storage.default_acl:
+        params['ACL'] = default_storage.default_acl
+    try:
+        multipart = _client().create_multipart_upload(**params)
+    except (BotoCoreError, ClientError) as e:
+        raise UploadError(f"Could not start the upload: {e}")
+    return UploadSession.objects.create(
+        admin=admin, filename=filename, size=size,
+        title=title, description=description, tags=tags,
+        storage_name=name, multipart_id=multipart['UploadId'],
+    )
+
+
+def sign_parts(session, part_numbers):
+    """Presigned PUT URLs for the given 1-based part numbers."""
+    total = part_count(session)
+    if not part_numbers or any(not 1 <= number <= total for number in part_numbers):
+        raise UploadError(f"Part numbers must be between 1 and {total}.")
+    client = _client()
+    urls = {
+        number: client.generate_presigned_url(
+            'upload_part',
+            Params={
+                'Bucket': default_storage.bucket_name,
+                'Key': _key(session.storage_name),
+                'UploadId': session.multipart_id,
+                'PartNumber': number,
+            },
+            ExpiresIn=settings.DIRECT_UPLOAD_URL_EXPIRY,
+        )
+        for number in part_numbers
+    }
+    session.save(update_fields=['updated_at']) # Signing counts as activity for sweep_stale_uploads
+    return urls
+
+
+def uploaded_parts(session):
+    """Parts the bucket already holds, so an interrupted upload can resume."""
+    client = _client()
+    parts = []
+    params = {
+        'Bucket': default_storage.bucket_name,
+        'Key': _key(session.storage_name),
+        'UploadId': session.multipart_id,
+    }
+    try:
+        while True:
+            response = client.list_parts(**params)
+            parts.extend(
+                {'PartNumber': part['PartNumber'], 'ETag': part['ETag'], 'Size': part['Size']}
+                for part in response.get('Parts', [])
+            )
+            if not response.get('IsTruncated'):
+                return parts
+            params['PartNumberMarker'] = response['NextPartNumberMarker']
+    except (BotoCoreError, ClientError) as e:
+        raise UploadError(f"Could not list uploaded parts: {e}")
+
+
+def complete_direct_upload(session, parts):
+    """
+    Assembles the uploaded parts, creates the Video and queues fingerprinting.
+    Idempotent like finalize_upload: a retried or concurrent call for the same
+    session returns the Video the first one made.
+    """
+    try:
+        parts = sorted(
+            ({'PartNumber': int(part['PartNumber']), 'ETag': str(part['ETag'])} for part in parts),
+            key=lambda part: part['PartNumber'],
+        )
+    except (KeyError, TypeError, ValueError):
+        raise UploadError("Each part needs a PartNumber and an ETag.")
+    if [part['PartNumber'] for part in parts] != list(range(1, part_count(session) + 1)):
+        raise UploadError("Some parts are missing.")
+
+    with transaction.atomic():
+        # Concurrent completions queue up here; the later ones find the Video the first one made
+        session = UploadSession.objects.select_for_update().filter(pk=session.pk).first()
+        if session is None:
+            raise UploadError("This upload has expired; please start again.")
+        if session.video_id:
+            return session.video
+
+        client = _client()
+        key = _key(session.storage_name)
+        try:
+            client.complete_multipart_upload(
+                Bucket=default_storage.bucket_name, Key=key,
+                UploadId=session.multipart_id, MultipartUpload={'Parts': parts},
+            )
+            stored_size = client.head_object(Bucket=default_storage.bucket_name, Key=key)['ContentLength']
+        except (BotoCoreError, ClientError) as e: # Also a retry after the Video was deleted: the upload is gone
+            raise UploadError(f"Could not complete the upload: {e}")
+        if stored_size == session.size:
+            video = Video(
+                admin=session.admin,
+                title=session.title,
+                description=session.description,
+                video_type='file',
+                video_file=session.storage_name, # Already in storage, so save() neither stores nor processes it
+            )
+            video.save()
+            video.set_tags(session.tags)
+            enqueue('fingerprint', video=video)
+            session.video = video # Kept until swept, for retries
+            session.save(update_fields=['video', 'updated_at'])
+            return video
+
+    default_storage.delete(session.storage_name)
+    session.delete()
+    raise OffsetMismatch(stored_size)
+
+
+def abort_direct_upload(session):
+    try:
+        _client().abort_multipart_upload(
+            Bucket=default_storage.bucket_name,
+            Key=_key(session.storage_name),
+            UploadId=session.multipart_id,
+        )
+    except ClientError:
+        pass # Already completed, aborted or expired by a bucket lifecycle rule
+    session.delete()
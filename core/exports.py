@@ -0,0 +1,183 @@
+# core/exports.py
+"""
+Streaming data exports for the admin dashboard.
+
+Each entry of EXPORTS names a queryset, the datetime column its date
+range filters on, and its columns. stream() reads the rows with
+values_list(...).iterator(chunk_size=EXPORT_CHUNK_SIZE) (a server-side
+cursor on PostgreSQL), encodes them EXPORT_CHUNK_SIZE at a time as CSV or
+JSON Lines, optionally gzips them, and yields each chunk to a
+StreamingHttpResponse: memory stays the same however many rows there are.
+
+Columns are plain lookups (joins are done by the one query) and counts are
+the denormalized columns (likes_count, comments_count), never per-row
+queries. Sync iterators stream under the WSGI web process in the Procfile;
+an ASGI server would buffer them.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Comment, Feedback, Notification, Video
+
+# Format (also the file extension) -> (label, content type)
+FORMATS = {
+    'csv': ("CSV", 'text/csv'),
+    'jsonl': ("JSON Lines", 'application/x-ndjson'),
+}
+
+
+def _users():
+    return User.objects.all()
+
+
+def _videos():
+    return Video.objects.all()
+
+
+def _comments():
+    return Comment.objects.all()
+
+
+def _feedback():
+    return Feedback.objects.all()
+
+
+def _notifications():
+    return Notification.objects.all()
+
+
+# Export name -> (label, queryset function, date range column, [(key, CSV header, lookup or expression)])
+EXPORTS = {
+    'users': ("Users", _users, 'date_joined', [
+        ('id', 'ID', 'pk'),
+        ('username', 'Username', 'username'),
+        ('email', 'Email', 'email'),
+        ('first_name', 'First Name', 'first_name'),
+        ('last_name', 'Last Name', 'last_name'),
+        ('date_joined', 'Date Joined', 'date_joined'),
+        ('is_active', 'Is Active', 'is_active'),
+        ('is_staff', 'Is Staff', 'is_staff'),
+        ('is_superuser', 'Is Superuser', 'is_superuser'),
+        # Users without a profile row are neither kind of admin
+        ('is_main_admin', 'Is Main Admin', Coalesce('userprofile__is_main_admin', Value(False))),
+        ('is_restricted_admin', 'Is Restricted Admin', Coalesce('userprofile__is_restricted_admin', Value(False))),
+        ('bio', 'Bio', 'userprofile__bio'),
+    ]),
+    'videos': ("Videos", _videos, 'uploaded_at', [
+        ('id', 'ID', 'pk'),
+        ('title', 'Title', 'title'),
+        ('slug', 'Slug', 'slug'),
+        ('video_type', 'Type', 'video_type'),
+        ('uploaded_by', 'Uploaded By', 'admin__username'),
+        ('uploaded_at', 'Uploaded At', 'uploaded_at'),
+        ('tags', 'Tags', 'tags_text'),
+        ('duration', 'Duration (s)', 'duration'),
+        ('views', 'Views', 'views'),
+        ('likes', 'Likes', 'likes_count'),
+        ('comments', 'Comments', 'comments_count'),
+    ]),
+    'comments': ("Comments", _comments, 'created_at', [
+        ('id', 'ID', 'pk'),
+        ('video', 'Video', 'video__slug'),
+        ('user', 'User', 'user__username'),
+        ('text', 'Text', 'text'),
+        ('created_at', 'Created At', 'created_at'),
+    ]),
+    'feedback': ("Feedback", _feedback, 'created_at', [
+        ('id', 'ID', 'pk'),
+        ('user', 'User', 'user__username'),
+        ('video', 'Video', 'video__slug'),
+        ('subject', 'Subject', 'subject'),
+        ('message', 'Message', 'message'),
+        ('is_read', 'Is Read', 'is_read'),
+        ('created_at', 'Created At', 'created_at'),
+    ]),
+    'notifications': ("Notifications", _notifications, 'created_at', [
+        ('id', 'ID', 'pk'),
+        ('user', 'User', 'user__username'),
+        ('message', 'Message', 'message'),
+        ('is_read', 'Is Read', 'is_read'),
+        ('broadcast', 'Broadcast', 'broadcast_id'),
+        ('created_at', 'Created At', 'created_at'),
+    ]),
+}
+
+
+def rows(name, since=None, until=None):
+    """The export's rows as value tuples, oldest first, streamed from the database."""
+    label, queryset, date_field, columns = EXPORTS[name]
+    queryset = queryset()
+    # Whole local days, as a range on the column itself so its index can be used
+    if since:
+        queryset = queryset.filter(**{f'{date_field}__gte': timezone.make_aware(datetime.combine(since, time.min))})
+    if until:
+        queryset = queryset.filter(**{f'{date_field}__lt': timezone.make_aware(datetime.combine(until + timedelta(days=1), time.min))})
+    return queryset.order_by('pk').values_list(*[source for key, header, source in columns]).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+
+
+def _csv_value(value):
+    if isinstance(value, bool):
+        return 'Yes' if value else 'No'
+    if isinstance(value, datetime):
+        return timezone.localtime(value).strftime('%Y-%m-%d %H:%M:%S')
+    return '' if value is None else value
+
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _encode_csv(columns, chunk):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([[_csv_value(value) for value in row] for row in chunk])
+    return buffer.getvalue().encode()
+
+
+def _encode_jsonl(columns, chunk):
+    keys = [key for key, header, source in columns]
+    return ''.join(
+        json.dumps(dict(zip(keys, map(_json_value, row))), ensure_ascii=False) + '\n' for row in chunk
+    ).encode()
+
+
+def _gzip(parts):
+    compressor = zlib.compressobj(wbits=31) # 31: gzip framing, one member for the whole export
+    for part in parts:
+        data = compressor.compress(part)
+        if data: # The compressor buffers small inputs
+            yield data
+    yield compressor.flush()
+
+
+def _encoded(name, format, since, until):
+    columns = EXPORTS[name][3]
+    if format == 'csv':
+        yield _encode_csv(columns, [[header for key, header, source in columns]])
+    encode = _encode_csv if format == 'csv' else _encode_jsonl
+    values = rows(name, since, until)
+    for chunk in iter(lambda: list(islice(values, settings.EXPORT_CHUNK_SIZE)), []):
+        yield encode(columns, chunk)
+
+
+def stream(name, format='csv', compress=False, since=None, until=None):
+    """The encoded (and optionally gzipped) export as an iterator of bytes, EXPORT_CHUNK_SIZE rows at a time."""
+    parts = _encoded(name, format, since, until)
+    return _gzip(parts) if compress else parts
+
+
+def content_type(format='csv', compress=False):
+    return 'application/gzip' if compress else FORMATS[format][1]
+
+
+def filename(name, format='csv', compress=False):
+    return f"{name}_data.{format}{'.gz' if compress else ''}"
@@ -2,7 +2,9 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth.models import User
-from .models import UserProfile, Video, Comment, Feedback, Notification
+from .models import UserProfile, Video, Comment, Feedback, Notification, Tag
+from .audiences import DEFAULT_ACTIVE_DAYS, SEGMENTS
+from .exports import EXPORTS, FORMATS
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Layout, Submit, Row, Column
 
@@ -81,16 +83,29 @@ class UserProfileUpdateForm(forms.ModelForm):
             user_profile.save()
         return user_profile
 
-class VideoUploadForm(forms.ModelForm):
+class TaggedVideoForm(forms.ModelForm):
+    # Video.tags relates Tag rows; the form edits them as the comma-separated text people type
     tags = forms.CharField(
         max_length=500,
         help_text="Comma-separated tags (e.g., GIS, Remote Sensing)",
         widget=forms.TextInput(attrs={'placeholder': 'Enter tags like GIS, Cartography, Survey'})
     )
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.fields['tags'].initial = self.instance.tags_text
+
+    def _save_m2m(self):
+        super()._save_m2m()
+        self.instance.set_tags(self.cleaned_data['tags'])
+
+
+class VideoUploadForm(TaggedVideoForm):
+
     class Meta:
         model = Video
-        fields = ['title', 'description', 'video_type', 'video_file', 'video_url', 'tags']
+        fields = ['title', 'description', 'video_type', 'video_file', 'video_url']
         widgets = {
             'video_type': forms.RadioSelect(choices=Video.ADMIN_ROLES),
         }
@@ -140,12 +155,17 @@ class VideoUploadForm(forms.ModelForm):
         return cleaned_data
 
 
-class VideoEditForm(forms.ModelForm):
-    tags = forms.CharField(
-        max_length=500,
-        help_text="Comma-separated tags (e.g., GIS, Remote Sensing)",
-        widget=forms.TextInput(attrs={'placeholder': 'Enter tags like GIS, Cartography, Survey'})
-    )
+class ChunkedUploadStartForm(TaggedVideoForm):
+    # Opens a resumable upload; the file itself arrives in chunks (see core/uploads.py)
+    filename = forms.CharField(max_length=255)
+    size = forms.IntegerField(min_value=1)
+
+    class Meta:
+        model = Video
+        fields = ['title', 'description']
+
+
+class VideoEditForm(TaggedVideoForm):
     # Allow replacing video file/url if admin wants
     new_video_file = forms.FileField(required=False, label="Replace Video File")
     new_video_url = forms.URLField(max_length=500, required=False, label="Replace Video URL",
@@ -155,7 +175,7 @@ class VideoEditForm(forms.ModelForm):
 
     class Meta:
         model = Video
-        fields = ['title', 'description', 'tags'] # Removed video_file, video_url, thumbnail for replacement fields
+        fields = ['title', 'description'] # Removed video_file, video_url, thumbnail for replacement fields
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -202,6 +222,7 @@ class VideoEditForm(forms.ModelForm):
 
         if commit:
             video.save()
+            self._save_m2m()
         return video
 
 
@@ -239,11 +260,26 @@ class FeedbackForm(forms.ModelForm):
         )
 
 class NotificationForm(forms.Form):
+    segment = forms.ChoiceField(
+        choices=[('', "Only the users picked below")] + [(key, label) for key, (label, _) in SEGMENTS.items()],
+        required=False,
+        label="Audience",
+        help_text="Resolved when the notifications are sent. All users get a single stored broadcast."
+    )
+    tag = forms.ModelChoiceField(
+        queryset=Tag.objects.filter(video_count__gt=0),
+        to_field_name='slug',
+        required=False,
+        label="Tag",
+        help_text="For users who liked or commented on videos with this tag."
+    )
+    days = forms.IntegerField(min_value=1, max_value=365, initial=DEFAULT_ACTIVE_DAYS, required=False, label="Active in the last N days")
+    # Individually picked users (admin_user_autocomplete), posted as one hidden input each
     users = forms.ModelMultipleChoiceField(
         queryset=User.objects.all(),
-        widget=forms.CheckboxSelectMultiple,
-        required=True,
-        label="Select Users"
+        widget=forms.MultipleHiddenInput,
+        required=False,
+        label="Individual Users"
     )
     message = forms.CharField(
         widget=forms.Textarea(attrs={'rows': 5, 'placeholder': 'Enter your notification message here...'}),
@@ -254,11 +290,48 @@ class NotificationForm(forms.Form):
         super().__init__(*args, **kwargs)
         self.helper = FormHelper()
         self.helper.layout = Layout(
+            'segment',
+            'tag',
+            'days',
             'users',
             'message',
             Submit('submit', 'Send Notifications', css_class='btn btn-primary mt-3')
         )
 
+    def clean(self):
+        cleaned_data = super().clean()
+        segment = cleaned_data.get('segment')
+        if not segment and not cleaned_data.get('users'):
+            self.add_error(None, "Choose an audience or pick at least one user.") # The picked users are hidden inputs
+        if segment == 'tag_engaged' and not cleaned_data.get('tag'):
+            self.add_error('tag', "Choose the tag for this audience.")
+        return cleaned_data
+
+    def audience(self):
+        """The audience spec (core/audiences.py) for the cleaned form."""
+        tag = self.cleaned_data.get('tag')
+        return {
+            'segment': self.cleaned_data.get('segment') or None,
+            'tag': tag.slug if tag else None,
+            'days': self.cleaned_data.get('days'),
+            'user_ids': sorted(user.pk for user in self.cleaned_data.get('users') or []),
+        }
+
+class ExportForm(forms.Form):
+    # Submitted with GET: the export streams straight back as a download
+    dataset = forms.ChoiceField(choices=[(name, label) for name, (label, *_) in EXPORTS.items()], label="Data")
+    format = forms.ChoiceField(choices=[(name, label) for name, (label, _) in FORMATS.items()], initial='csv', label="Format")
+    since = forms.DateField(required=False, label="From", widget=forms.DateInput(attrs={'type': 'date'}))
+    until = forms.DateField(required=False, label="To", widget=forms.DateInput(attrs={'type': 'date'}))
+    gzip = forms.BooleanField(required=False, label="Compress (gzip)")
+
+    def clean(self):
+        cleaned_data = super().clean()
+        since, until = cleaned_data.get('since'), cleaned_data.get('until')
+        if since and until and since > until:
+            self.add_error('until', "The end date must not be before the start date.")
+        return cleaned_data
+
 class AdminUserProfileEditForm(forms.ModelForm):
     first_name = forms.CharField(max_length=150, required=True)
     last_name = forms.CharField(max_length=150, required=True)
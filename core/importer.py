@@ -0,0 +1,105 @@
+# core/importer.py
+"""
+Bulk catalog import (manage.py import_videos).
+
+Entries come from a directory of video files or from a CSV/JSON manifest
+with title, description, tags and a file path or URL. Import runs in two
+parallel phases around a single bulk insert:
+
+1. store_import_file: hash each file and store it under its content
+   address (in a worker process);
+2. bulk_create the Video rows with slugs allocated in bulk;
+3. process_imported_video: probe and thumbnail each new row (in a worker
+   process), reusing an already processed duplicate's media.
+
+Files whose SHA-256 (or URLs that) already exist in the catalog are
+skipped, so an interrupted import can simply be run again.
+"""
+import csv
+import json
+import os
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+
+from .blobs import blob_name, file_sha256, find_processed_duplicate, share_derived_assets
+from .media import generate_thumbnail
+from .models import Video
+from .probe import probe_video
+
+VIDEO_EXTENSIONS = ('.mp4', '.m4v', '.mov', '.mkv', '.webm', '.avi')
+
+
+class ManifestError(ValueError):
+    pass
+
+
+def _entry(title, description='', tags='', file='', url=''):
+    # `file` is an absolute local path, `url` an external link; exactly one is set
+    return {'title': title, 'description': description, 'tags': tags, 'file': file, 'url': url}
+
+
+def _title_from_filename(path):
+    return os.path.splitext(os.path.basename(path))[0].replace('_', ' ').replace('-', ' ').strip().title()
+
+
+def entries_from_directory(directory, tags=''):
+    entries = []
+    for root, _dirs, files in os.walk(directory):
+        for filename in sorted(files):
+            if filename.lower().endswith(VIDEO_EXTENSIONS):
+                path = os.path.join(root, filename)
+                entries.append(_entry(_title_from_filename(path), tags=tags, file=os.path.abspath(path)))
+    return entries
+
+
+def entries_from_manifest(path, tags=''):
+    """Reads a CSV (with a header row) or JSON (a list of objects) manifest; file paths are relative to it."""
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = json.load(f) if path.lower().endswith('.json') else list(csv.DictReader(f))
+    entries = []
+    for number, row in enumerate(rows, start=1):
+        file, url = (row.get('file') or '').strip(), (row.get('url') or '').strip()
+        if bool(file) == bool(url):
+            raise ManifestError(f"Entry {number}: give exactly one of 'file' or 'url'.")
+        if file:
+            file = os.path.join(base, file)
+        entries.append(_entry(
+            title=(row.get('title') or '').strip() or _title_from_filename(file or url),
+            description=row.get('description') or '',
+            tags=row.get('tags') or tags,
+            file=file,
+            url=url,
+        ))
+    return entries
+
+
+def store_import_file(path):
+    """Hashes a local file and stores it under its content address; returns (digest, storage name)."""
+    with open(path, 'rb') as f:
+        file = File(f, name=os.path.basename(path))
+        digest = file_sha256(file)
+        name = blob_name(digest, path)
+        if not default_storage.exists(name):
+            name = default_storage.save(name, file)
+    return digest, name
+
+
+def process_imported_video(pk):
+    """Probes and thumbnails an imported video, or shares a processed duplicate's media."""
+    try:
+        video = Video.objects.get(pk=pk)
+        duplicate = find_processed_duplicate(video)
+        if duplicate:
+            share_derived_assets(duplicate, video)
+            video.save(update_fields=['thumbnail', 'thumbnail_variants', 'hls_playlist', 'preview_track', *Video.METADATA_FIELDS])
+            return pk
+        if video.duration is None:
+            probe_video(video)
+        if not video.thumbnail:
+            generate_thumbnail(video)
+        return pk
+    finally:
+        close_old_connections()
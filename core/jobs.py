@@ -0,0 +1,269 @@
+# core/jobs.py
+"""
+Database-backed background job queue.
+
+Jobs are rows in the Job table, so nothing is lost when the worker restarts.
+Enqueuing also drops a wake-up message on the JOB_CHANNEL channel, which the
+JobWorkerConsumer (see core/consumers.py) answers by draining ready jobs; the
+`process_jobs` management command drains the table without a channel layer.
+"""
+import logging
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_BOOT_ID = uuid.uuid4().hex[:8] # Tells a restarted worker from the one that died, even if it reuses the pid
+
+_wake_lock = threading.Lock()
+_wake_timer = None # The pending delayed wake_worker(), and when it fires (time.monotonic())
+_wake_due = None
+
+# Job kind -> dotted path of a callable taking the Job instance
+JOB_HANDLERS = {
+    'fingerprint': 'core.blobs.fingerprint_job',
+    'probe': 'core.probe.probe_job',
+    'thumbnail': 'core.media.thumbnail_job',
+    'hls': 'core.transcode.hls_job',
+    'previews': 'core.previews.previews_job',
+    'notify': 'core.notifications.fanout_job',
+}
+
+# Jobs queued for every newly stored video file, in order, with the Video
+# field each one fills (a job is skipped when that asset is already present,
+# e.g. shared from a duplicate upload)
+VIDEO_PIPELINE = [
+    ('probe', 'duration'),
+    ('thumbnail', 'thumbnail'),
+    ('previews', 'preview_track'),
+    ('hls', 'hls_playlist'),
+]
+
+
+def enqueue(kind, video=None, payload=None):
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    job = Job.objects.create(
+        kind=kind,
+        video=video,
+        payload=payload or {},
+        max_attempts=settings.JOB_MAX_ATTEMPTS,
+    )
+    transaction.on_commit(wake_worker)
+    return job
+
+
+def enqueue_video_processing(video):
+    return [enqueue(kind, video=video) for kind, field in VIDEO_PIPELINE if getattr(video, field) in (None, '')]
+
+
+def wake_worker(delay=0):
+    """Asks the job worker to drain the queue, optionally after `delay` seconds."""
+    if delay > 0:
+        _schedule_wake(delay)
+        return
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.send)(settings.JOB_CHANNEL, {'type': 'jobs.wake'})
+    except Exception as e:
+        # The row is already stored; the worker or `process_jobs` will pick it up later
+        logger.warning("Could not wake job worker: %s", e)
+
+
+def _schedule_wake(delay):
+    # At most one pending timer per process: the worker reschedules after every drain
+    global _wake_timer, _wake_due
+    due = time.monotonic() + delay
+    with _wake_lock:
+        if _wake_timer is not None and _wake_timer.is_alive():
+            if _wake_due <= due:
+                return
+            _wake_timer.cancel() # The new wake-up is sooner
+        _wake_timer = threading.Timer(delay, _timed_wake)
+        _wake_timer.daemon = True
+        _wake_timer.start()
+        _wake_due = due
+
+
+def _timed_wake():
+    global _wake_timer
+    with _wake_lock:
+        if _wake_timer is threading.current_thread(): # Not already replaced by a sooner one
+            _wake_timer = None
+    wake_worker()
+
+
+def retry_delay(attempts):
+    """Exponential backoff: base, 2*base, 4*base... capped at JOB_RETRY_BACKOFF_MAX."""
+    delay = settings.JOB_RETRY_BACKOFF_BASE * (2 ** max(attempts - 1, 0))
+    return min(delay, settings.JOB_RETRY_BACKOFF_MAX)
+
+
+def worker_id(node=None):
+    """This process's lock owner: its node (concurrency is capped per node), pid and boot id."""
+    return f"{node or settings.JOB_WORKER_NODE}:{os.getpid()}:{_BOOT_ID}"
+
+
+def requeue_stale(now=None):
+    """Releases jobs whose worker died mid-run (no heartbeat for JOB_LOCK_TIMEOUT seconds)."""
+    now = now or timezone.now()
+    return Job.objects.filter(
+        status=Job.STATUS_RUNNING,
+        heartbeat_at__lt=now - timedelta(seconds=settings.JOB_LOCK_TIMEOUT),
+    ).update(status=Job.STATUS_QUEUED, locked_by='', locked_at=None, heartbeat_at=None)
+
+
+@contextmanager
+def heartbeat(owner):
+    """Refreshes heartbeat_at on `owner`'s running jobs every JOB_HEARTBEAT_INTERVAL seconds until the block exits."""
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(settings.JOB_HEARTBEAT_INTERVAL):
+                try:
+                    Job.objects.filter(status=Job.STATUS_RUNNING, locked_by=owner).update(heartbeat_at=timezone.now())
+                except Exception as e: # Try again next interval; the lock only lapses after JOB_LOCK_TIMEOUT
+                    logger.warning("Job heartbeat failed: %s", e)
+        finally:
+            connection.close() # This thread's own connection
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def claim(owner, limit):
+    """
+    Claims up to `limit` ready jobs for the worker process `owner` (see worker_id()).
+
+    Each claim is a conditional UPDATE on the queued status, so two workers
+    racing for the same row cannot both win, on any database backend.
+    """
+    now = timezone.now()
+    claimed = []
+    candidates = Job.objects.filter(
+        status=Job.STATUS_QUEUED, run_after__lte=now,
+    ).values_list('pk', flat=True)[:limit * 2]
+    for pk in candidates:
+        won = Job.objects.filter(pk=pk, status=Job.STATUS_QUEUED).update(
+            status=Job.STATUS_RUNNING, locked_by=owner, locked_at=now, heartbeat_at=now, updated_at=now,
+        )
+        if won:
+            claimed.append(pk)
+            if len(claimed) >= limit:
+                break
+    return list(Job.objects.filter(pk__in=claimed).select_related('video'))
+
+
+def run_job(job):
+    handler = import_string(JOB_HANDLERS[job.kind])
+    try:
+        handler(job)
+    except Exception:
+        job.attempts += 1
+        job.last_error = traceback.format_exc()[-4000:]
+        if job.attempts >= job.max_attempts:
+            job.status = Job.STATUS_FAILED
+            logger.error("Job %s failed permanently", job.pk)
+        else:
+            job.status = Job.STATUS_QUEUED
+            job.run_after = timezone.now() + timedelta(seconds=retry_delay(job.attempts))
+            logger.warning("Job %s failed, retrying at %s", job.pk, job.run_after)
+    else:
+        job.attempts += 1
+        job.status = Job.STATUS_DONE
+        job.last_error = ''
+    job.locked_by = ''
+    job.locked_at = None
+    job.heartbeat_at = None
+    job.save(update_fields=['attempts', 'status', 'last_error', 'run_after', 'locked_by', 'locked_at', 'heartbeat_at', 'updated_at'])
+    notify_job_update(job)
+    return job
+
+
+def _run_in_thread(job):
+    close_old_connections()
+    try:
+        return run_job(job)
+    finally:
+        close_old_connections()
+
+
+def run_pending(node=None, concurrency=None):
+    """
+    Runs one batch of ready jobs and returns how many were run.
+
+    At most `concurrency` (JOB_WORKER_CONCURRENCY) jobs run at once on a node,
+    counting jobs other worker processes on the same node already hold. Jobs
+    a crashed process held stop heartbeating and free their slots once
+    requeue_stale() releases them.
+    """
+    node = node or settings.JOB_WORKER_NODE
+    owner = worker_id(node)
+    concurrency = concurrency or settings.JOB_WORKER_CONCURRENCY
+    requeue_stale()
+    running = Job.objects.filter(status=Job.STATUS_RUNNING, locked_by__startswith=f"{node}:").count()
+    slots = concurrency - running
+    if slots <= 0:
+        return 0
+    jobs = claim(owner, slots)
+    if not jobs:
+        return 0
+    with heartbeat(owner):
+        if len(jobs) == 1:
+            run_job(jobs[0])
+        else:
+            with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+                list(pool.map(_run_in_thread, jobs))
+    return len(jobs)
+
+
+def seconds_until_next_job():
+    """Seconds until the earliest queued job becomes ready, or None if the queue is empty."""
+    next_run = Job.objects.filter(status=Job.STATUS_QUEUED).order_by('run_after').values_list('run_after', flat=True).first()
+    if next_run is None:
+        return None
+    return max((next_run - timezone.now()).total_seconds(), 0)
+
+
+def notify_job_update(job):
+    """Pushes the job status to the uploading (or requesting) admin over their NotificationConsumer socket."""
+    video = job.video
+    recipient = video.admin_id if video is not None else job.payload.get('requested_by')
+    if not recipient:
+        return
+    data = job.as_dict()
+    if video is not None and video.thumbnail:
+        data['thumbnail_url'] = video.thumbnail.url
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(f"user_{recipient}", {
+            'type': 'job_update', # Corresponds to consumer method
+            'job': data,
+        })
+    except Exception as e:
+        logger.warning("Could not push job update: %s", e)
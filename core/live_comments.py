@@ -0,0 +1,61 @@
+# core/live_comments.py
+"""
+Live comment streaming for open video pages.
+
+Viewers of a video join its group (group_name) through CommentStreamConsumer.
+A saved comment is not sent to them directly: publish() drops its id on the
+COMMENT_FANOUT_CHANNEL, where CommentFanoutConsumer (`runworker
+comment-fanout`, its own process in the Procfile so media jobs never hold it
+up) collects ids for COMMENT_FANOUT_INTERVAL
+and then renders each video's new comments once and makes one group_send per
+video. A burst of comments on a popular video therefore costs one query, one
+render per comment and one channel-layer send per flush, not one per comment
+per viewer.
+
+Both consumers live in core/consumers.py.
+"""
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.template.loader import render_to_string
+
+from .models import Comment, Video
+
+logger = logging.getLogger(__name__)
+
+
+def group_name(video_pk):
+    return f"video_comments_{video_pk}"
+
+
+def publish(comment):
+    """Queues a saved comment for the next fan-out to its video's viewers."""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.send)(settings.COMMENT_FANOUT_CHANNEL, {
+            'type': 'comments.publish', # CommentFanoutConsumer.comments_publish
+            'comment_id': comment.pk,
+        })
+    except Exception as e:
+        # The comment is stored; viewers see it on their next page load
+        logger.warning("Could not publish comment: %s", e)
+
+
+def render_batches(comment_ids):
+    """
+    {video pk: group event} for the comments with `comment_ids` (oldest
+    first), each rendered once with the same partial as the page.
+    """
+    comments = Comment.objects.filter(pk__in=comment_ids).select_related('user__userprofile').order_by('created_at', 'id')
+    batches = {}
+    for comment in comments:
+        batch = batches.setdefault(comment.video_id, {'type': 'comments.batch', 'comments': []})
+        batch['comments'].append({'id': comment.pk, 'html': render_to_string('core/_comment.html', {'comment': comment})})
+    counts = Video.objects.filter(pk__in=batches).values_list('pk', 'comments_count')
+    for video_pk, comments_count in counts:
+        batches[video_pk]['comments_count'] = comments_count
+    return batches
@@ -0,0 +1,68 @@
+# core/management/commands/bench_view_counts.py
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from core.counters import flush_view_counts, record_view
+from core.models import Video
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares per-hit save() view counting with the buffered counters under concurrent hits on one video. "
+        "The video's view count is restored afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('slug', help="Video to hit.")
+        parser.add_argument('--hits', type=int, default=2000)
+        parser.add_argument('--threads', type=int, default=16)
+
+    def handle(self, *args, **options):
+        try:
+            video = Video.objects.get(slug=options['slug'])
+        except Video.DoesNotExist:
+            raise CommandError(f"No video with slug {options['slug']}.")
+        original_views = video.views
+        hits, threads = options['hits'], options['threads']
+
+        def legacy_hit(_):
+            # What video_detail_view used to do
+            try:
+                row = Video.objects.get(pk=video.pk)
+                row.views += 1
+                row.save()
+            finally:
+                close_old_connections()
+
+        def buffered_hit(_):
+            record_view(video.pk, uuid.uuid4().hex) # A new session per hit, so nothing is deduplicated
+
+        try:
+            for label, hit, finish in (
+                ('save() per hit', legacy_hit, lambda: None),
+                ('buffered', buffered_hit, flush_view_counts),
+            ):
+                Video.objects.filter(pk=video.pk).update(views=0)
+                flush_view_counts() # Start from an empty buffer
+                Video.objects.filter(pk=video.pk).update(views=0)
+                errors = 0
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=threads) as pool:
+                    for future in [pool.submit(hit, n) for n in range(hits)]:
+                        try:
+                            future.result()
+                        except Exception: # e.g. "database is locked" on SQLite
+                            errors += 1
+                elapsed = time.perf_counter() - started
+                finish()
+                counted = Video.objects.values_list('views', flat=True).get(pk=video.pk)
+                self.stdout.write(
+                    f"{label:>15}: {hits / elapsed:9.0f} hits/s, {counted}/{hits} views recorded"
+                    f" ({hits - counted} lost, {errors} errors)"
+                )
+        finally:
+            Video.objects.filter(pk=video.pk).update(views=original_views)
@@ -0,0 +1,22 @@
+# core/management/commands/cache_stats.py
+from django.core.management.base import BaseCommand
+
+from core.caching import reset_stats, stats
+
+
+class Command(BaseCommand):
+    help = "Shows hit/miss counts of the page and data caches (core/caching.py)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Zero the counters after printing them.")
+
+    def handle(self, *args, **options):
+        counts = stats()
+        if not counts:
+            self.stdout.write("No cache activity recorded yet.")
+        for name, row in counts.items():
+            total = row['hits'] + row['misses']
+            ratio = row['hits'] / total if total else 0
+            self.stdout.write(f"{name:>12}: {row['hits']} hits, {row['misses']} misses ({ratio:.0%} hit rate)")
+        if options['reset']:
+            reset_stats()
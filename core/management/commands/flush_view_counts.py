@@ -0,0 +1,29 @@
+# core/management/commands/flush_view_counts.py
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.counters import flush_view_counts
+
+
+class Command(BaseCommand):
+    help = "Writes buffered video views to the database (see core/counters.py)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep flushing every VIEW_COUNT_FLUSH_INTERVAL seconds (the counters process in the Procfile).")
+
+    def handle(self, *args, **options):
+        if not options['loop']:
+            flushed = flush_view_counts()
+            self.stdout.write(self.style.SUCCESS(f"Flushed {flushed} view(s)."))
+            return
+        while True:
+            try:
+                flushed = flush_view_counts()
+            except Exception as e: # The views were restored; try again next round
+                self.stderr.write(f"Flush failed: {e}")
+            else:
+                if flushed:
+                    self.stdout.write(f"Flushed {flushed} view(s).")
+            time.sleep(settings.VIEW_COUNT_FLUSH_INTERVAL)
@@ -0,0 +1,46 @@
+# core/management/commands/generate_thumbnail_variants.py
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from core.media import regenerate_thumbnail_variants
+from core.models import Video
+
+
+def _regenerate(pk):
+    # Runs in a worker process: frame decoding and resizing are CPU-bound
+    try:
+        regenerate_thumbnail_variants(Video.objects.get(pk=pk))
+    finally:
+        close_old_connections()
+    return pk
+
+
+class Command(BaseCommand):
+    help = "Builds responsive WebP/JPEG thumbnail variants for videos that are missing them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Rebuild every video's variants, e.g. after changing THUMBNAIL_WIDTHS.")
+        parser.add_argument('--workers', type=int, default=None, help="Worker processes (defaults to the CPU count).")
+
+    def handle(self, *args, **options):
+        videos = Video.objects.exclude(video_file='', thumbnail='')
+        if not options['all']:
+            videos = videos.filter(thumbnail_variants={})
+        pks = list(videos.values_list('pk', flat=True))
+
+        # Forked workers must not share this process's database connection
+        connections.close_all()
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            futures = {pool.submit(_regenerate, pk): pk for pk in pks}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as exc: # Any failure is reported per video; the rest carry on
+                    failed += 1
+                    self.stderr.write(f"Video {futures[future]}: {exc}")
+                else:
+                    done += 1
+        self.stdout.write(self.style.SUCCESS(f"Built thumbnail variants for {done} video(s), {failed} failed."))
@@ -0,0 +1,139 @@
+# core/management/commands/import_videos.py
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Q
+
+from core.importer import (
+    ManifestError, entries_from_directory, entries_from_manifest, process_imported_video, store_import_file,
+)
+from core.jobs import enqueue_video_processing
+from core.models import Job, Video
+from core.rollups import record_uploads
+from core.search import index_videos
+from core.tagging import bulk_set_tags, tags_text
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports videos from a directory of files or a CSV/JSON manifest (title, description, tags, file or url). "
+        "Already imported files and URLs are skipped, so an interrupted import can be re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help="A directory of video files, or a .csv/.json manifest.")
+        parser.add_argument('--admin', help="Username recorded as the uploader (defaults to the first superuser).")
+        parser.add_argument('--tags', default='', help="Tags for entries that have none (all files of a directory import).")
+        parser.add_argument('--workers', type=int, default=None, help="Worker processes for hashing and media work (defaults to the CPU count).")
+        parser.add_argument('--batch-size', type=int, default=500, help="Rows per INSERT.")
+        parser.add_argument('--skip-media', action='store_true', help="Leave probing and thumbnailing to the job worker.")
+
+    def handle(self, *args, **options):
+        admin = self.get_admin(options['admin'])
+        source = options['source']
+        try:
+            if os.path.isdir(source):
+                entries = entries_from_directory(source, tags=options['tags'])
+            elif os.path.isfile(source):
+                entries = entries_from_manifest(source, tags=options['tags'])
+            else:
+                raise CommandError(f"{source} is neither a directory nor a manifest file.")
+        except (ManifestError, ValueError, KeyError) as e:
+            raise CommandError(f"Could not read {source}: {e}")
+        missing = [entry['file'] for entry in entries if entry['file'] and not os.path.isfile(entry['file'])]
+        if missing:
+            raise CommandError(f"{len(missing)} file(s) not found, e.g. {missing[0]}")
+
+        file_entries = [entry for entry in entries if entry['file']]
+        link_entries = [entry for entry in entries if entry['url']]
+        self.stdout.write(f"Importing {len(file_entries)} file(s) and {len(link_entries)} link(s).")
+
+        # Forked workers must not share this process's database connection
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            stored = self.run_parallel(pool, store_import_file, [entry['file'] for entry in file_entries], 'Stored')
+            new_videos, pending_pks = self.create_rows(admin, file_entries, stored, link_entries, options['batch_size'])
+            if not options['skip_media'] and pending_pks:
+                connections.close_all()
+                self.run_parallel(pool, process_imported_video, pending_pks, 'Processed')
+
+        # Previews, HLS renditions and anything a worker failed on go through the job queue
+        # (videos a previous run already queued are left alone)
+        queued = Video.objects.filter(pk__in=pending_pks).exclude(jobs__status__in=[Job.STATUS_QUEUED, Job.STATUS_RUNNING])
+        for video in queued.distinct():
+            enqueue_video_processing(video)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {len(new_videos)} new video(s); skipped {len(entries) - len(new_videos)} duplicate or already imported entries."
+        ))
+
+    def get_admin(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f"No user named {username}.")
+        admin = User.objects.filter(is_superuser=True).order_by('pk').first()
+        if admin is None:
+            raise CommandError("No superuser exists; pass --admin.")
+        return admin
+
+    def run_parallel(self, pool, func, items, label):
+        """Maps `func` over `items` in the pool, reporting progress; returns {item: result} for the ones that succeeded."""
+        results = {}
+        total = len(items)
+        step = max(1, total // 20)
+        futures = {pool.submit(func, item): item for item in items}
+        for done, future in enumerate(as_completed(futures), start=1):
+            item = futures[future]
+            try:
+                results[item] = future.result()
+            except Exception as exc: # Reported per item; the rest of the import carries on
+                self.stderr.write(f"{label} failed for {item}: {exc}")
+            if done % step == 0 or done == total:
+                self.stdout.write(f"{label} {done}/{total}")
+        return results
+
+    def create_rows(self, admin, file_entries, stored, link_entries, batch_size):
+        """
+        Bulk-inserts rows for entries not yet in the catalog. Returns the new
+        videos and the pks of file videos still missing their media (new
+        ones plus any left unprocessed by an interrupted run).
+        """
+        by_hash = {}
+        for entry in file_entries:
+            if entry['file'] in stored:
+                by_hash.setdefault(stored[entry['file']][0], entry) # Identical files are imported once
+        existing = dict(Video.objects.filter(content_hash__in=by_hash).values_list('content_hash', 'pk'))
+        unprocessed = list(
+            Video.objects.filter(pk__in=existing.values()).filter(Q(thumbnail='') | Q(thumbnail__isnull=True)).values_list('pk', flat=True)
+        )
+        existing_urls = set(Video.objects.filter(video_url__in=[entry['url'] for entry in link_entries]).values_list('video_url', flat=True))
+
+        new_entries = [(digest, entry) for digest, entry in by_hash.items() if digest not in existing]
+        new_links = list({entry['url']: entry for entry in link_entries if entry['url'] not in existing_urls}.values())
+        slugs = iter(Video.allocate_unique_slugs([entry['title'] for _digest, entry in new_entries] + [entry['title'] for entry in new_links]))
+
+        videos = [
+            Video(
+                admin=admin, title=entry['title'][:255], slug=next(slugs), description=entry['description'], tags_text=tags_text(entry['tags'])[:500],
+                video_type='file', video_file=stored[entry['file']][1], content_hash=digest,
+            )
+            for digest, entry in new_entries
+        ] + [
+            Video(
+                admin=admin, title=entry['title'][:255], slug=next(slugs), description=entry['description'], tags_text=tags_text(entry['tags'])[:500],
+                video_type='link', video_url=entry['url'],
+            )
+            for entry in new_links
+        ]
+        # bulk_create skips save(), so rows arrive without per-row slug queries or job enqueues
+        created = Video.objects.bulk_create(videos, batch_size=batch_size)
+        if created and created[0].pk is None: # Backends that cannot return ids from bulk inserts
+            created = list(Video.objects.filter(slug__in=[video.slug for video in videos]))
+        bulk_set_tags([(video, video.tags_text) for video in created])
+        index_videos(created)
+        record_uploads(created)
+        return created, [video.pk for video in created if video.video_type == 'file'] + unprocessed
@@ -0,0 +1,24 @@
+# core/management/commands/migrate_tags.py
+from django.core.management.base import BaseCommand
+
+from core.models import Video
+from core.tagging import bulk_set_tags, recount_tags
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates Tag rows from the comma-separated tags of videos that have no tags attached yet "
+        "(videos saved before tags were normalized), then recounts every tag. Safe to re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        pks = list(Video.objects.exclude(tags_text='').filter(tags=None).values_list('pk', flat=True))
+        batch_size = options['batch_size']
+        for start in range(0, len(pks), batch_size):
+            videos = Video.objects.filter(pk__in=pks[start:start + batch_size]).only('pk', 'tags_text')
+            bulk_set_tags([(video, video.tags_text) for video in videos])
+        recount_tags()
+        self.stdout.write(self.style.SUCCESS(f"Tagged {len(pks)} video(s)."))
@@ -0,0 +1,43 @@
+# core/management/commands/probe_videos.py
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.models import Video
+from core.probe import ProbeError, probe_video
+
+
+class Command(BaseCommand):
+    help = "Reads duration, resolution, codecs, bitrate and size with ffprobe for uploaded videos missing them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Re-probe videos that already have metadata.")
+        parser.add_argument('--workers', type=int, default=4, help="ffprobe processes to run at once.")
+
+    def handle(self, *args, **options):
+        videos = Video.objects.filter(video_type='file').exclude(video_file='')
+        if not options['all']:
+            videos = videos.filter(duration__isnull=True)
+        videos = list(videos.only('pk', 'video_file'))
+
+        def probe(video):
+            try:
+                return probe_video(video)
+            finally:
+                close_old_connections()
+
+        probed = failed = 0
+        # ffprobe runs out of process, so threads are enough to overlap the work
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as pool:
+            futures = {pool.submit(probe, video): video for video in videos}
+            for future in as_completed(futures):
+                video = futures[future]
+                try:
+                    future.result()
+                except (ProbeError, OSError) as exc:
+                    failed += 1
+                    self.stderr.write(f"Video {video.pk}: {exc}")
+                else:
+                    probed += 1
+        self.stdout.write(self.style.SUCCESS(f"Probed {probed} video(s), {failed} failed."))
@@ -0,0 +1,27 @@
+# core/management/commands/process_jobs.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import jobs
+
+
+class Command(BaseCommand):
+    help = "Runs queued background jobs (thumbnails etc.) without the channel-layer worker."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep polling for new jobs instead of exiting when the queue is drained.")
+        parser.add_argument('--interval', type=float, default=5, help="Seconds between polls in --loop mode.")
+        parser.add_argument('--concurrency', type=int, default=None, help="Override JOB_WORKER_CONCURRENCY for this node.")
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            ran = jobs.run_pending(concurrency=options['concurrency'])
+            total += ran
+            if ran:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f"Ran {total} job(s)."))
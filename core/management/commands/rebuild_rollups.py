@@ -0,0 +1,15 @@
+# core/management/commands/rebuild_rollups.py
+from django.core.management.base import BaseCommand
+
+from core.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the admin dashboard rollups from the users, videos, comments and feedback tables. "
+        "Daily view and like history is kept (it is recorded nowhere else) and topped up to match each video's counters."
+    )
+
+    def handle(self, *args, **options):
+        days = rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rollups for {days} day(s)."))
@@ -0,0 +1,18 @@
+# core/management/commands/rebuild_search_index.py
+from django.core.management.base import BaseCommand
+
+from core.search import ensure_search_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates the full-text search index if it is missing and, on SQLite, refills it from the videos table "
+        "(e.g. after rows were changed outside the app)."
+    )
+
+    def handle(self, *args, **options):
+        rebuilt = ensure_search_index(rebuild=True)
+        if rebuilt:
+            self.stdout.write(self.style.SUCCESS("Search index rebuilt."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Search index is in place (PostgreSQL maintains it itself)."))
@@ -0,0 +1,25 @@
+# core/management/commands/reconcile_like_counts.py
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from core.models import Video
+
+
+class Command(BaseCommand):
+    help = "Repairs Video.likes_count wherever it has drifted from the likes table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report the videos that have drifted.")
+
+    def handle(self, *args, **options):
+        drifted = list(
+            Video.objects.annotate(actual=Video.counted_likes())
+            .exclude(likes_count=F('actual'))
+            .values_list('pk', 'slug', 'likes_count', 'actual')
+        )
+        for pk, slug, stored, actual in drifted:
+            self.stdout.write(f"{slug} (#{pk}): {stored} -> {actual}")
+        if drifted and not options['dry_run']:
+            Video.objects.filter(pk__in=[row[0] for row in drifted]).update(likes_count=Video.counted_likes())
+        verb = "would be repaired" if options['dry_run'] else "repaired"
+        self.stdout.write(self.style.SUCCESS(f"{len(drifted)} video(s) {verb}."))
@@ -0,0 +1,46 @@
+# core/management/commands/regenerate_avatars.py
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.avatars import build_avatar_variants, release_avatar_variants
+from core.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = "Builds the AVATAR_VARIANTS sizes for profile pictures that are missing them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Rebuild every profile's variants, e.g. after changing AVATAR_VARIANTS.")
+        parser.add_argument('--workers', type=int, default=4, help="Profiles to process at once.")
+
+    def handle(self, *args, **options):
+        profiles = UserProfile.objects.exclude(profile_picture='').exclude(profile_picture__isnull=True)
+        if not options['all']:
+            profiles = profiles.filter(avatar_variants={})
+        profiles = list(profiles.only('pk', 'user_id', 'profile_picture', 'avatar_variants'))
+
+        def regenerate(profile):
+            try:
+                with profile.profile_picture.open('rb') as picture:
+                    variants = build_avatar_variants(profile.user_id, picture)
+                # update() rather than save(): the picture itself has not changed
+                UserProfile.objects.filter(pk=profile.pk).update(avatar_variants=variants)
+                release_avatar_variants(profile.avatar_variants)
+            finally:
+                close_old_connections()
+
+        done = failed = 0
+        # Pillow releases the GIL while decoding and encoding, so threads run in parallel
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as pool:
+            futures = {pool.submit(regenerate, profile): profile for profile in profiles}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except (OSError, ValueError) as exc:
+                    failed += 1
+                    self.stderr.write(f"Profile {futures[future].pk}: {exc}")
+                else:
+                    done += 1
+        self.stdout.write(self.style.SUCCESS(f"Regenerated avatars for {done} profile(s), {failed} failed."))
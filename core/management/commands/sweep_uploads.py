@@ -0,0 +1,12 @@
+# core/management/commands/sweep_uploads.py
+from django.core.management.base import BaseCommand
+
+from core.uploads import sweep_stale_uploads
+
+
+class Command(BaseCommand):
+    help = "Removes chunked uploads that have been idle for longer than CHUNKED_UPLOAD_EXPIRY."
+
+    def handle(self, *args, **options):
+        swept = sweep_stale_uploads()
+        self.stdout.write(self.style.SUCCESS(f"Removed {swept} stale upload(s)."))
@@ -0,0 +1,161 @@
+# core/media.py
+import os
+import shutil
+import tempfile
+import uuid
+from contextlib import contextmanager
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image # For image manipulation
+
+THUMBNAIL_SIZE = (320, 180) # Common thumbnail size (16:9 aspect ratio)
+THUMBNAIL_FORMATS = (('webp', 'WEBP'), ('jpg', 'JPEG')) # extension, Pillow format; last one is the <img> fallback
+
+
+@contextmanager
+def local_video_path(field_file):
+    """
+    Yields a filesystem path for a stored file.
+
+    Local storage hands back the real path; remote backends (S3) have no
+    .path, so the object is streamed in chunks into a temporary file that is
+    removed again on exit.
+    """
+    try:
+        yield field_file.path
+        return
+    except NotImplementedError:
+        pass
+
+    suffix = os.path.splitext(field_file.name)[1]
+    tmp = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+    try:
+        with tmp:
+            field_file.open('rb')
+            try:
+                shutil.copyfileobj(field_file, tmp, 1024 * 1024)
+            finally:
+                field_file.close()
+        yield tmp.name
+    finally:
+        os.unlink(tmp.name)
+
+
+def delete_directory_of(name):
+    """
+    Removes every stored file next to `name`.
+
+    Derived assets (HLS renditions, preview sprites) each live under their
+    own per-run prefix, so this drops a whole generation at once.
+    """
+    if not name:
+        return
+    prefix = os.path.dirname(name)
+    try:
+        _dirs, files = default_storage.listdir(prefix)
+    except (FileNotFoundError, NotImplementedError):
+        return
+    for filename in files:
+        default_storage.delete(f"{prefix}/{filename}")
+
+
+def update_if_current(video, source='video_file', **values):
+    """
+    Writes a job's results to `video`'s row unless `source`, the file they
+    were made from, was replaced or removed while the job ran. Returns
+    whether the row was updated; if not, the caller releases what it stored.
+    """
+    from .models import Video
+
+    return Video.objects.filter(pk=video.pk, **{source: getattr(video, source).name}).update(**values) > 0
+
+
+def grab_frame(path, at=1):
+    """Returns the frame at `at` seconds (clamped to the clip) as a PIL image."""
+    import moviepy.editor as mp # Imported lazily: only the job worker needs moviepy
+
+    clip = mp.VideoFileClip(path)
+    try:
+        frame = clip.get_frame(min(at, clip.duration / 2) if clip.duration else 0)
+    finally:
+        clip.close() # Important to close the clip to release resources
+    return Image.fromarray(frame)
+
+
+def build_thumbnail_variants(video, image):
+    """
+    Stores `image` at every THUMBNAIL_WIDTHS width (never upscaled) in each of
+    THUMBNAIL_FORMATS and returns the manifest kept in Video.thumbnail_variants:
+    {'prefix': ..., 'widths': [...], 'formats': [...]}. Every variant is
+    resized from the same decoded frame.
+    """
+    image = image.convert('RGB')
+    widths = [width for width in settings.THUMBNAIL_WIDTHS if width <= image.width] or [min(settings.THUMBNAIL_WIDTHS)]
+    prefix = f"thumbnails/variants/{video.pk}/{uuid.uuid4().hex[:12]}"
+    for width in widths:
+        resized = image.resize((width, round(image.height * width / image.width)), Image.Resampling.LANCZOS)
+        for extension, fmt in THUMBNAIL_FORMATS:
+            buffer = BytesIO()
+            resized.save(buffer, format=fmt, quality=settings.THUMBNAIL_QUALITY)
+            default_storage.save(f"{prefix}/{width}.{extension}", ContentFile(buffer.getvalue()))
+    return {'prefix': prefix, 'widths': widths, 'formats': [extension for extension, fmt in THUMBNAIL_FORMATS]}
+
+
+def generate_thumbnail(video):
+    """Extracts a frame from the video file and stores it as the video's thumbnail and its variants."""
+    from .blobs import release_file, release_thumbnail_variants
+
+    if not video.video_file or video.thumbnail:
+        return
+
+    with local_video_path(video.video_file) as path:
+        image = grab_frame(path)
+    previous = video.thumbnail_variants
+    video.thumbnail_variants = build_thumbnail_variants(video, image)
+
+    image.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+    thumb_io = BytesIO()
+    image.convert('RGB').save(thumb_io, format='JPEG', quality=85) # Save as JPEG for compression
+
+    video.thumbnail.save(f"{video.slug}_thumb.jpg", ContentFile(thumb_io.getvalue()), save=False)
+    # Only touch the thumbnail columns so edits made while the job ran are kept
+    if not update_if_current(video, thumbnail=video.thumbnail.name, thumbnail_variants=video.thumbnail_variants):
+        release_file('thumbnail', video.thumbnail.name)
+        release_thumbnail_variants(video.thumbnail_variants)
+        return
+    release_thumbnail_variants(previous, exclude_pk=video.pk)
+
+
+def regenerate_thumbnail_variants(video, from_thumbnail=False):
+    """
+    Rebuilds a video's variants from a fresh frame, or from its stored
+    thumbnail for linked videos (or any video, with `from_thumbnail`).
+    """
+    from .blobs import release_thumbnail_variants
+
+    if video.video_file and not from_thumbnail:
+        source = 'video_file'
+        with local_video_path(video.video_file) as path:
+            image = grab_frame(path)
+    elif video.thumbnail:
+        source = 'thumbnail'
+        with video.thumbnail.open('rb') as thumbnail:
+            image = Image.open(thumbnail)
+            image.load()
+    else:
+        return
+    previous = video.thumbnail_variants
+    video.thumbnail_variants = build_thumbnail_variants(video, image)
+    if not update_if_current(video, source, thumbnail_variants=video.thumbnail_variants):
+        release_thumbnail_variants(video.thumbnail_variants)
+        return
+    release_thumbnail_variants(previous, exclude_pk=video.pk)
+
+
+# --- Job handlers (see JOB_HANDLERS in core/jobs.py) ---
+
+def thumbnail_job(job):
+    generate_thumbnail(job.video)
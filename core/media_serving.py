@@ -0,0 +1,174 @@
+# core/media_serving.py
+"""
+Byte-range aware serving of MEDIA_ROOT for local-disk deployments.
+
+Video players seek with Range requests; without 206 responses browsers
+download the whole file before playback can jump ahead. Bodies are handed
+to the server as file objects (FileResponse), so WSGI servers with
+wsgi.file_wrapper (gunicorn) send them with os.sendfile instead of copying
+through Python. Behind nginx/Apache the view can instead reply with an
+X-Accel-Redirect / X-Sendfile header and let the front server stream.
+"""
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+from django.core.exceptions import SuspiciousFileOperation
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Derived media types the platform's mimetypes table may not know; browsers
+# refuse <track> files that are not served as text/vtt.
+mimetypes.add_type('text/vtt', '.vtt')
+mimetypes.add_type('application/vnd.apple.mpegurl', '.m3u8')
+mimetypes.add_type('video/mp2t', '.ts')
+
+
+class RangedFile:
+    """
+    A read-only window [start, start + length) over an open file.
+
+    fileno() exposes the underlying descriptor, already positioned at
+    `start`, so sendfile-capable servers can use it with the response's
+    Content-Length as the byte count; read() is bounded for everyone else.
+    """
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Returns (start, end) inclusive for a single-range `bytes=` header,
+    None when the header should be ignored, or raises ValueError when the
+    range cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        return None # Absent, malformed or multi-range: serve the whole file
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("Range not satisfiable")
+    return start, min(end, size - 1)
+
+
+def _etag(st):
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+def _if_range_matches(request, etag, mtime):
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag # Weak tags never match for ranges
+    date = parse_http_date_safe(if_range)
+    return date is not None and int(mtime) <= date
+
+
+def _none_match(request, etag):
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(',')]
+    return '*' in tags or etag in tags or f"W/{etag}" in tags
+
+
+def serve_media(request, path):
+    if not path.startswith(tuple(settings.MEDIA_RANGE_SERVE_DIRS)):
+        raise Http404
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        st = os.stat(fullpath)
+    except OSError:
+        raise Http404
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404
+
+    etag = _etag(st)
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'ETag': etag,
+        'Last-Modified': http_date(st.st_mtime),
+        'Cache-Control': f"public, max-age={settings.MEDIA_CACHE_MAX_AGE}",
+    }
+    if _none_match(request, etag):
+        response = HttpResponseNotModified()
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    content_type, encoding = mimetypes.guess_type(fullpath)
+    content_type = content_type or 'application/octet-stream'
+
+    if settings.MEDIA_ACCEL_REDIRECT_PREFIX or settings.MEDIA_SENDFILE_HEADER:
+        # The front server handles Range/If-Range itself from here on
+        response = HttpResponse(content_type=content_type)
+        if settings.MEDIA_ACCEL_REDIRECT_PREFIX:
+            response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + path
+        else:
+            response[settings.MEDIA_SENDFILE_HEADER] = fullpath
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    size = st.st_size
+    byte_range = None
+    if _if_range_matches(request, etag, st.st_mtime):
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f"bytes */{size}"
+            for name, value in headers.items():
+                response[name] = value
+            return response
+
+    if byte_range is None:
+        response = FileResponse(open(fullpath, 'rb'), content_type=content_type)
+        response['Content-Length'] = size
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = FileResponse(RangedFile(open(fullpath, 'rb'), start, length), status=206, content_type=content_type)
+        response['Content-Length'] = length
+        response['Content-Range'] = f"bytes {start}-{end}/{size}"
+    if encoding:
+        response['Content-Encoding'] = encoding
+    for name, value in headers.items():
+        response[name] = value
+    return response
@@ -0,0 +1,235 @@
+// core/static/core/js/chunked_upload.js
+// Resumable uploads for the admin video upload form. With S3 storage the file goes straight
+// to the bucket as a parallel multipart upload (server side: core/direct_uploads.py), otherwise
+// it is sent in chunks through the app (core/uploads.py).
+
+document.addEventListener('DOMContentLoaded', function() {
+    const form = document.getElementById('video-upload-form');
+    if (!form || !window.fetch || !window.Blob || !Blob.prototype.slice) return; // Plain form post fallback
+
+    const fileInput = form.querySelector('input[name="video_file"]');
+    const progressWrapper = document.getElementById('upload-progress');
+    const progressBar = progressWrapper ? progressWrapper.querySelector('.progress-bar') : null;
+    const statusText = document.getElementById('upload-status');
+    const csrfToken = form.querySelector('[name=csrfmiddlewaretoken]').value;
+    const startUrl = form.dataset.chunkedStartUrl;
+    const directStartUrl = form.dataset.directStartUrl;
+    const maxRetries = 5;
+    const parallelParts = 4;
+
+    function setProgress(sent, total) {
+        if (!progressBar) return;
+        const percent = total ? Math.floor((sent / total) * 100) : 0;
+        progressBar.style.width = percent + '%';
+        progressBar.textContent = percent + '%';
+    }
+
+    function setStatus(text) {
+        if (statusText) statusText.textContent = text;
+    }
+
+    // Uploads are remembered per file so a reload or dropped connection can resume
+    function storageKey(file) {
+        return `${directStartUrl ? 'direct' : 'chunked'}-upload:${file.name}:${file.size}:${file.lastModified}`;
+    }
+
+    function sleep(ms) {
+        return new Promise(resolve => setTimeout(resolve, ms));
+    }
+
+    async function startSession(file) {
+        const saved = localStorage.getItem(storageKey(file));
+        if (saved) {
+            const session = JSON.parse(saved);
+            const response = await fetch(session.upload_url, {method: 'HEAD', credentials: 'same-origin'});
+            if (response.ok) {
+                session.offset = parseInt(response.headers.get('Upload-Offset'), 10);
+                return session;
+            }
+            localStorage.removeItem(storageKey(file)); // Expired or swept on the server
+        }
+
+        return createSession(file, startUrl);
+    }
+
+    async function createSession(file, url) {
+        const data = new FormData();
+        ['title', 'description', 'tags'].forEach(name => {
+            data.append(name, form.querySelector(`[name="${name}"]`).value);
+        });
+        data.append('filename', file.name);
+        data.append('size', file.size);
+        const response = await fetch(url, {
+            method: 'POST',
+            headers: {'X-CSRFToken': csrfToken},
+            body: data,
+            credentials: 'same-origin'
+        });
+        const session = await response.json();
+        if (!response.ok) {
+            throw new Error(session.error || Object.values(session.errors || {}).flat().join(' ') || 'Could not start upload.');
+        }
+        localStorage.setItem(storageKey(file), JSON.stringify(session));
+        return session;
+    }
+
+    async function sendChunks(file, session) {
+        let offset = session.offset;
+        let retries = 0;
+        while (offset < file.size) {
+            const chunk = file.slice(offset, offset + session.chunk_size);
+            try {
+                const response = await fetch(session.upload_url, {
+                    method: 'PATCH',
+                    headers: {
+                        'X-CSRFToken': csrfToken,
+                        'Upload-Offset': offset,
+                        'Content-Type': 'application/offset+octet-stream'
+                    },
+                    body: chunk,
+                    credentials: 'same-origin'
+                });
+                if (response.ok || response.status === 409) {
+                    // On 409 the server tells us where it actually is
+                    offset = parseInt(response.headers.get('Upload-Offset'), 10);
+                    retries = 0;
+                    setProgress(offset, file.size);
+                    continue;
+                }
+                const data = await response.json();
+                throw new Error(data.error || 'Chunk upload failed.');
+            } catch (error) {
+                if (++retries > maxRetries) throw error;
+                setStatus(`Connection problem, retrying (${retries}/${maxRetries})...`);
+                await sleep(1000 * Math.pow(2, retries));
+                const head = await fetch(session.upload_url, {method: 'HEAD', credentials: 'same-origin'}).catch(() => null);
+                if (head && head.ok) offset = parseInt(head.headers.get('Upload-Offset'), 10);
+            }
+        }
+    }
+
+    async function finalize(file, session) {
+        const response = await fetch(session.finalize_url, {
+            method: 'POST',
+            headers: {'X-CSRFToken': csrfToken},
+            credentials: 'same-origin'
+        });
+        const data = await response.json();
+        if (!response.ok) throw new Error(data.error || 'Could not finish upload.');
+        localStorage.removeItem(storageKey(file));
+        return data;
+    }
+
+    // --- Direct-to-bucket multipart uploads ---
+
+    async function postJson(url, payload) {
+        const response = await fetch(url, {
+            method: 'POST',
+            headers: {'X-CSRFToken': csrfToken, 'Content-Type': 'application/json'},
+            body: JSON.stringify(payload),
+            credentials: 'same-origin'
+        });
+        const data = await response.json();
+        if (!response.ok) throw new Error(data.error || 'Upload request failed.');
+        return data;
+    }
+
+    async function startDirectSession(file) {
+        const saved = localStorage.getItem(storageKey(file));
+        if (saved) {
+            const session = JSON.parse(saved);
+            const response = await fetch(session.parts_url, {credentials: 'same-origin'});
+            if (response.ok) {
+                // Parts already in the bucket are not sent again
+                session.done = {};
+                (await response.json()).parts.forEach(part => { session.done[part.PartNumber] = part.ETag; });
+                return session;
+            }
+            localStorage.removeItem(storageKey(file));
+        }
+        const session = await createSession(file, directStartUrl);
+        session.done = {};
+        return session;
+    }
+
+    async function putPart(file, session, number, url) {
+        const start = (number - 1) * session.part_size;
+        const response = await fetch(url, {method: 'PUT', body: file.slice(start, start + session.part_size)});
+        const etag = response.ok ? response.headers.get('ETag') : null;
+        if (!etag) throw new Error(`Part ${number} failed (${response.status}).`);
+        return etag;
+    }
+
+    async function sendParts(file, session) {
+        const pending = [];
+        for (let number = 1; number <= session.part_count; number++) {
+            if (!session.done[number]) pending.push(number);
+        }
+        const urls = pending.length ? (await postJson(session.parts_url, {part_numbers: pending})).urls : {};
+        let sent = file.size - pending.reduce((total, number) => {
+            return total + Math.min(session.part_size, file.size - (number - 1) * session.part_size);
+        }, 0);
+        setProgress(sent, file.size);
+
+        // A few workers pull part numbers off the queue so parts upload in parallel
+        async function worker() {
+            while (pending.length) {
+                const number = pending.shift();
+                let retries = 0;
+                while (true) {
+                    try {
+                        session.done[number] = await putPart(file, session, number, urls[number]);
+                        break;
+                    } catch (error) {
+                        if (++retries > maxRetries) throw error;
+                        setStatus(`Connection problem, retrying (${retries}/${maxRetries})...`);
+                        await sleep(1000 * Math.pow(2, retries));
+                    }
+                }
+                sent += Math.min(session.part_size, file.size - (number - 1) * session.part_size);
+                setProgress(sent, file.size);
+            }
+        }
+        await Promise.all(Array.from({length: parallelParts}, worker));
+    }
+
+    async function completeDirect(file, session) {
+        const parts = Object.keys(session.done).map(number => ({PartNumber: parseInt(number, 10), ETag: session.done[number]}));
+        const data = await postJson(session.complete_url, {parts: parts});
+        localStorage.removeItem(storageKey(file));
+        return data;
+    }
+
+    form.addEventListener('submit', async function(event) {
+        const videoType = form.querySelector('input[name="video_type"]:checked');
+        const file = fileInput && fileInput.files[0];
+        if (!file || (videoType && videoType.value !== 'file')) return; // Links still use the normal form post
+
+        event.preventDefault();
+        const submitButton = form.querySelector('[type=submit]');
+        if (submitButton) submitButton.disabled = true;
+        if (progressWrapper) progressWrapper.classList.remove('d-none');
+
+        try {
+            setStatus('Uploading...');
+            let result;
+            if (directStartUrl) {
+                const session = await startDirectSession(file);
+                await sendParts(file, session);
+                setStatus('Finishing upload...');
+                result = await completeDirect(file, session);
+            } else {
+                const session = await startSession(file);
+                setProgress(session.offset, file.size);
+                await sendChunks(file, session);
+                setStatus('Finishing upload...');
+                result = await finalize(file, session);
+            }
+            window.location.href = result.redirect_url;
+        } catch (error) {
+            console.error('Upload error:', error);
+            setStatus(`Upload paused: ${error.message} Submit again to resume.`);
+            if (submitButton) submitButton.disabled = false;
+        }
+    });
+});
@@ -34,20 +34,111 @@ document.addEventListener('DOMContentLoaded', function() {
         toggleVideoFields();
     }
 
-    // WebSocket for Real-time Notifications (Basic Implementation)
-    // This assumes you have a Notification consumer set up in Django Channels
-    if (document.body.dataset.userPk) { // Check if user is logged in (add data-user-pk to body in base.html)
-        const userPk = document.body.dataset.userPk;
-        const notificationSocket = new WebSocket(
-            'ws://' + window.location.host + '/ws/notifications/'
-        );
+    // Swap in a video's thumbnail once the background job has generated it
+    function showProcessedThumbnail(videoId, thumbnailUrl) {
+        if (!thumbnailUrl) return;
+        document.querySelectorAll(`img[data-thumbnail-for="${videoId}"]`).forEach(img => {
+            img.src = thumbnailUrl;
+            img.removeAttribute('data-thumbnail-for');
+        });
+    }
+
+    // Poll processing status for videos still waiting on a thumbnail (fallback when the socket is down)
+    const pendingThumbnails = document.querySelectorAll('img[data-thumbnail-for][data-jobs-url]');
+    if (pendingThumbnails.length > 0) {
+        const pollJobs = function() {
+            const waiting = document.querySelectorAll('img[data-thumbnail-for][data-jobs-url]');
+            if (waiting.length === 0) return;
+            waiting.forEach(img => {
+                fetch(img.dataset.jobsUrl)
+                    .then(response => response.json())
+                    .then(data => {
+                        showProcessedThumbnail(data.video_id, data.thumbnail_url);
+                        // Stop polling once no job for this video is still queued or running
+                        if (data.jobs.every(job => job.status === 'done' || job.status === 'failed')) {
+                            img.removeAttribute('data-jobs-url');
+                        }
+                    })
+                    .catch(error => console.error('Job status error:', error));
+            });
+            setTimeout(pollJobs, 10000);
+        };
+        setTimeout(pollJobs, 10000);
+    }
+
+    // WebSocket for real-time notifications (NotificationConsumer): the unread backlog on
+    // connect, new notifications as they are sent, and read acknowledgements sent back
+    if (document.body.dataset.userPk) {
+        const scheme = window.location.protocol === 'https:' ? 'wss://' : 'ws://';
+        const notificationSocket = new WebSocket(scheme + window.location.host + '/ws/notifications/');
+        const badge = document.getElementById('notification-badge');
+        const list = document.getElementById('notification-list');
+
+        function showUnreadCount(count) {
+            if (!badge) return;
+            badge.textContent = count;
+            badge.style.display = count > 0 ? '' : 'none';
+        }
+
+        function addNotification(notification, prepend) {
+            if (!list || !notification.id || list.querySelector(`[data-notification-id="${notification.id}"]`)) return;
+            const item = document.createElement('li');
+            item.dataset.notificationId = notification.id;
+            const button = document.createElement('button');
+            button.type = 'button';
+            button.className = 'dropdown-item text-wrap';
+            button.textContent = notification.message;
+            item.appendChild(button);
+            const divider = list.querySelector('.dropdown-divider').parentElement;
+            if (prepend) {
+                divider.after(item);
+            } else {
+                list.appendChild(item);
+            }
+            list.querySelector('.notification-empty').style.display = 'none';
+        }
+
+        function removeNotifications(items) {
+            items.forEach(item => item.remove());
+            if (!list.querySelector('[data-notification-id]')) {
+                list.querySelector('.notification-empty').style.display = '';
+            }
+        }
+
+        function acknowledge(message) {
+            if (notificationSocket.readyState === WebSocket.OPEN) {
+                notificationSocket.send(JSON.stringify(message));
+            }
+        }
+
+        if (list) {
+            list.addEventListener('click', function(event) {
+                const item = event.target.closest('[data-notification-id]');
+                if (item) {
+                    acknowledge({action: 'read', ids: [Number(item.dataset.notificationId)]});
+                    removeNotifications([item]);
+                } else if (event.target.id === 'notification-read-all') {
+                    acknowledge({action: 'read_all'});
+                    removeNotifications(list.querySelectorAll('[data-notification-id]'));
+                }
+            });
+        }
 
         notificationSocket.onmessage = function(e) {
             const data = JSON.parse(e.data);
-            if (data.type === 'notification') {
-                alert(`New Notification: ${data.message}`);
-                // In a real app, you'd update a notification bell icon, show a toast, etc.
-                // For now, a simple alert.
+            if (data.type === 'unread') {
+                (data.notifications || []).forEach(notification => addNotification(notification, false));
+                if (list && 'read' in data) { // Acknowledged here or in another tab
+                    removeNotifications(data.read === null
+                        ? list.querySelectorAll('[data-notification-id]')
+                        : data.read.map(id => list.querySelector(`[data-notification-id="${id}"]`)).filter(Boolean));
+                }
+                showUnreadCount(data.unread_count);
+            } else if (data.type === 'notification') {
+                addNotification(data, true);
+                showUnreadCount(data.unread_count);
+            } else if (data.type === 'job' && data.job.video_id) { // Other jobs report progress on their own pages
+                showProcessedThumbnail(data.job.video_id, data.job.thumbnail_url);
             }
         };
 
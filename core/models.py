@@ -1,13 +1,16 @@
 # core/models.py
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from django.utils.text import slugify
 from django.urls import reverse
+from django.utils import timezone
+from django.core.files.storage import default_storage
+import mimetypes
+import operator
 import os
-import moviepy.editor as mp # For video processing
-from PIL import Image # For image manipulation
-from io import BytesIO
-from django.core.files.uploadedfile import InMemoryUploadedFile
+import uuid
+from functools import reduce
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -15,18 +18,55 @@ class UserProfile(models.Model):
     profile_picture = models.ImageField(upload_to='profile_pics/', blank=True, null=True)
     is_main_admin = models.BooleanField(default=False) # For the primary admin (CelestaKim)
     is_restricted_admin = models.BooleanField(default=False) # For other admins
+    avatar_variants = models.JSONField(default=dict, blank=True) # Resized avatar URLs (core/avatars.py)
 
     def __str__(self):
         return self.user.username
 
+    def avatar(self, variant):
+        """The {'size', 'webp', 'jpeg'} entry for a size in AVATAR_VARIANTS, or None."""
+        return self.avatar_variants.get('sizes', {}).get(variant)
+
     def save(self, *args, **kwargs):
+        from .avatars import build_avatar_variants, release_avatar_variants
+
+        # Variants are only rebuilt when a new picture is assigned, not on every profile save
+        new_picture = bool(self.profile_picture) and not self.profile_picture._committed
+        stale_variants = None
+        if new_picture or not self.profile_picture:
+            stale_variants, self.avatar_variants = self.avatar_variants, {}
+        if new_picture:
+            self.avatar_variants = build_avatar_variants(self.user_id, self.profile_picture.file)
         super().save(*args, **kwargs)
-        if self.profile_picture:
-            img = Image.open(self.profile_picture.path)
-            if img.height > 300 or img.width > 300:
-                output_size = (300, 300)
-                img.thumbnail(output_size)
-                img.save(self.profile_picture.path) # Overwrite original with resized
+        release_avatar_variants(stale_variants)
+
+class Tag(models.Model):
+    name = models.CharField(max_length=100)
+    slug = models.SlugField(max_length=100, unique=True) # Tag lookups and ?tag= filters go through this index
+    video_count = models.PositiveIntegerField(default=0) # Maintained incrementally (core/tagging.py)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+class VideoQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        # Every write moves updated_at, the version stamp behind a video's conditional GETs,
+        # and the catalog token behind the catalog's (core/conditional.py)
+        from . import caching
+
+        kwargs.setdefault('updated_at', timezone.now())
+        rows = super().update(**kwargs)
+        if rows:
+            caching.bump_catalog()
+        return rows
+
+    def touch(self):
+        """Marks the videos changed without changing any other field, e.g. after a comment is posted."""
+        return self.update(updated_at=timezone.now())
+
 
 class Video(models.Model):
     ADMIN_ROLES = (
@@ -44,14 +84,40 @@ class Video(models.Model):
     video_url = models.URLField(max_length=500, blank=True, null=True,
                                 help_text="Enter a URL for external videos (e.g., YouTube, Vimeo embed URL)")
     thumbnail = models.ImageField(upload_to='thumbnails/', blank=True, null=True)
-    tags = models.CharField(max_length=500, help_text="Comma-separated tags (e.g., GIS, Remote Sensing, Cartography)")
+    thumbnail_variants = models.JSONField(default=dict, blank=True) # Responsive WebP/JPEG widths of the thumbnail (core/media.py)
+    hls_playlist = models.CharField(max_length=255, blank=True) # Storage name of the HLS master playlist, if transcoded
+    preview_track = models.CharField(max_length=255, blank=True) # WebVTT seek-preview track, next to its sprite sheets
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True) # SHA-256 of video_file; also its storage key
+    # Container metadata read by ffprobe (core/probe.py); empty until the probe job has run
+    duration = models.FloatField(null=True, blank=True, db_index=True) # seconds
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+    video_codec = models.CharField(max_length=32, blank=True)
+    audio_codec = models.CharField(max_length=32, blank=True)
+    bitrate = models.PositiveBigIntegerField(null=True, blank=True) # bits per second
+    file_size = models.PositiveBigIntegerField(null=True, blank=True) # bytes
+    # Tags live in Tag rows; the comma-separated names are kept (in the original `tags` column)
+    # for display without a join. Change both with set_tags().
+    tags = models.ManyToManyField(Tag, related_name='videos', blank=True)
+    tags_text = models.CharField(max_length=500, db_column='tags', help_text="Comma-separated tags (e.g., GIS, Remote Sensing, Cartography)")
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True) # Any change to the video, its counters or comments
     views = models.PositiveIntegerField(default=0)
     # Using ManyToManyField for likes to track users who liked a video
     likes = models.ManyToManyField(User, related_name='liked_videos', blank=True)
+    likes_count = models.PositiveIntegerField(default=0, db_index=True) # Denormalized len(likes); see toggle_like
+    comments_count = models.PositiveIntegerField(default=0) # Denormalized; kept by the Comment receivers in core/signals.py
+
+    SLUG_PREFIX_BATCH = 500 # Keeps the OR-ed prefix query under SQLite's expression depth limit
+    METADATA_FIELDS = ('duration', 'width', 'height', 'video_codec', 'audio_codec', 'bitrate', 'file_size')
+
+    objects = VideoQuerySet.as_manager()
 
     class Meta:
         ordering = ['-uploaded_at']
+        indexes = [
+            models.Index(fields=['uploaded_at', 'id']), # Keyset pagination (core/pagination.py)
+        ]
 
     def __str__(self):
         return self.title
@@ -59,54 +125,195 @@ class Video(models.Model):
     def get_absolute_url(self):
         return reverse('video_detail', kwargs={'slug': self.slug})
 
+    @property
+    def hls_url(self):
+        return default_storage.url(self.hls_playlist) if self.hls_playlist else None
+
+    @property
+    def preview_track_url(self):
+        return default_storage.url(self.preview_track) if self.preview_track else None
+
+    def thumbnail_srcset(self, extension):
+        """The `srcset` value listing every stored width of the thumbnail in one format."""
+        prefix = self.thumbnail_variants['prefix']
+        return ', '.join(f"{default_storage.url(f'{prefix}/{width}.{extension}')} {width}w" for width in self.thumbnail_variants['widths'])
+
+    @property
+    def duration_display(self):
+        if self.duration is None:
+            return ''
+        minutes, seconds = divmod(int(round(self.duration)), 60)
+        hours, minutes = divmod(minutes, 60)
+        if hours:
+            return f"{hours}:{minutes:02d}:{seconds:02d}"
+        return f"{minutes}:{seconds:02d}"
+
+    @property
+    def quality_label(self):
+        if not self.height:
+            return ''
+        for min_height, label in ((2160, '4K'), (1440, '1440p'), (1080, '1080p'), (720, '720p'), (480, '480p'), (360, '360p')):
+            if self.height >= min_height:
+                return label
+        return f"{self.height}p"
+
+    @property
+    def video_mime_type(self):
+        if not self.video_file:
+            return None
+        return mimetypes.guess_type(self.video_file.name)[0] or 'video/mp4'
+
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = slugify(self.title)
             # Ensure unique slug in case of duplicate titles
-            original_slug = self.slug
-            counter = 1
-            while Video.objects.filter(slug=self.slug).exists():
-                self.slug = f"{original_slug}-{counter}"
-                counter += 1
+            self.slug = Video.allocate_unique_slugs([self.title])[0]
 
-        # Generate thumbnail from video file if it's a file upload and no thumbnail is provided
-        if self.video_file and not self.thumbnail:
-            try:
-                # Save the video file temporarily to disk to be processed by moviepy
-                # Use BytesIO to avoid saving to physical disk if storage is cloud-based
-                temp_video_buffer = BytesIO(self.video_file.read())
-                clip = mp.VideoFileClip(temp_video_buffer.name) # moviepy expects a file path
-                frame = clip.get_frame(1) # Get frame at 1 second
-                clip.close() # Important to close the clip to release resources
-
-                image = Image.fromarray(frame)
-                # Resize thumbnail
-                output_size = (320, 180) # Common thumbnail size (16:9 aspect ratio)
-                image.thumbnail(output_size, Image.Resampling.LANCZOS)
-
-                thumb_io = BytesIO()
-                image.save(thumb_io, format='JPEG', quality=85) # Save as JPEG for compression
-                thumb_file_name = f"{self.slug}_thumb.jpg"
-                self.thumbnail = InMemoryUploadedFile(
-                    thumb_io, 'ImageField', thumb_file_name, 'image/jpeg',
-                    thumb_io.tell(), None
-                )
-            except Exception as e:
-                print(f"Error generating thumbnail: {e}")
-                # Fallback or log error, maybe use a default thumbnail
-                self.thumbnail = None # Ensure it's not set if generation fails
+        # A freshly assigned upload is uncommitted until it is written to
+        # storage; processing is queued once the row is saved.
+        new_upload = bool(self.video_file) and not self.video_file._committed
+        new_thumbnail = bool(self.thumbnail) and not self.thumbnail._committed
+        stale_assets = {}
+        stale_variants = None
+        stale_files = {}
+        self.duplicate_of = None
+        if self.pk and (new_upload or new_thumbnail or not self.video_file or not self.thumbnail):
+            # The stored objects this save may replace or clear, released once the row no longer points at them
+            stale_files = Video.objects.filter(pk=self.pk).values('video_file', 'thumbnail').first() or {}
+        if new_upload or new_thumbnail or not self.thumbnail:
+            # Variants are cut from the thumbnail (or the file's frame) they came with
+            stale_variants, self.thumbnail_variants = self.thumbnail_variants, {}
+        if new_upload or not self.video_file:
+            # Renditions and previews of a replaced file must not be served for the new one
+            stale_assets = {'hls_playlist': self.hls_playlist, 'preview_track': self.preview_track}
+            self.hls_playlist = ''
+            self.preview_track = ''
+            self.content_hash = ''
+            for field in self.METADATA_FIELDS:
+                setattr(self, field, self._meta.get_field(field).get_default())
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'updated_at'} # auto_now is only saved when listed
+            if stale_variants and 'thumbnail_variants' not in kwargs['update_fields']:
+                self.thumbnail_variants = stale_variants # Not being saved, so not stale in the row
+                stale_variants = None
+            stale_files = {field: name for field, name in stale_files.items() if field in kwargs['update_fields']}
+
+        if new_upload:
+            from .blobs import find_processed_duplicate, share_derived_assets, store_video_file
+            # Identical bytes are stored once, under their SHA-256 address
+            store_video_file(self, self.video_file.file)
+            self.duplicate_of = find_processed_duplicate(self)
+            if self.duplicate_of:
+                share_derived_assets(self.duplicate_of, self)
 
         super().save(*args, **kwargs)
 
+        if any(stale_files.values()):
+            from .blobs import release_file
+            for field, name in stale_files.items():
+                if name != getattr(self, field).name: # Re-uploading the same bytes keeps the same blob
+                    release_file(field, name)
+        if any(stale_assets.values()):
+            from .blobs import release_directory
+            for field, name in stale_assets.items():
+                release_directory(field, name)
+        if stale_variants and stale_variants != self.thumbnail_variants: # Unless shared back from a duplicate
+            from .blobs import release_thumbnail_variants
+            release_thumbnail_variants(stale_variants)
+
+        if new_thumbnail:
+            # An uploaded thumbnail is used as-is; its variants are cut from it, not from a frame
+            from .media import regenerate_thumbnail_variants
+            regenerate_thumbnail_variants(self, from_thumbnail=True)
+
+        if new_upload:
+            # Thumbnailing and other media work runs in the job worker, so the
+            # upload request returns as soon as the file is stored. Assets
+            # shared from a duplicate upload are not generated again.
+            from .jobs import enqueue_video_processing
+            enqueue_video_processing(self)
+
+    def toggle_like(self, user):
+        """
+        Likes the video for `user`, or removes an existing like, and returns
+        (liked, likes_count). The through-table insert/delete, the counter
+        update and the read of the new count share one transaction.
+        """
+        Like = Video.likes.through
+        with transaction.atomic():
+            removed, _ = Like.objects.filter(video_id=self.pk, user_id=user.pk).delete()
+            if removed:
+                liked, delta = False, -removed
+            else:
+                liked, delta = True, 1
+                try:
+                    with transaction.atomic():
+                        Like.objects.create(video_id=self.pk, user_id=user.pk)
+                except IntegrityError: # A concurrent request just added the same like
+                    delta = 0
+            if delta:
+                Video.objects.filter(pk=self.pk).update(likes_count=models.F('likes_count') + delta)
+                from . import caching
+                from .rollups import record_likes
+                record_likes({self.pk: delta})
+                caching.bump(caching.video_key(self.pk))
+            self.likes_count = Video.objects.values_list('likes_count', flat=True).get(pk=self.pk)
+        return liked, self.likes_count
+
+    @staticmethod
+    def counted_likes():
+        """Each video's real number of likes, as an expression for UPDATEs of likes_count."""
+        return Coalesce(models.Subquery(
+            Video.likes.through.objects.filter(video_id=models.OuterRef('pk'))
+            .values('video_id').annotate(total=models.Count('pk')).values('total')
+        ), 0)
+
+    @staticmethod
+    def counted_comments():
+        """Each video's real number of comments, as an expression for UPDATEs of comments_count."""
+        return Coalesce(models.Subquery(
+            Comment.objects.filter(video_id=models.OuterRef('pk'))
+            .values('video_id').annotate(total=models.Count('pk')).values('total')
+        ), 0)
+
+    @staticmethod
+    def allocate_unique_slugs(titles):
+        """
+        Unique slugs for `titles`, in order, following the `slug`, `slug-1`,
+        `slug-2`... scheme. Slugs already taken are read with one prefix query
+        per SLUG_PREFIX_BATCH distinct titles rather than one exists() query
+        per collision.
+        """
+        bases = [slugify(title)[:240] or 'video' for title in titles] # Leave room for a counter suffix
+        distinct = list(dict.fromkeys(bases))
+        taken = set()
+        for start in range(0, len(distinct), Video.SLUG_PREFIX_BATCH):
+            prefixes = reduce(operator.or_, (models.Q(slug__startswith=base) for base in distinct[start:start + Video.SLUG_PREFIX_BATCH]))
+            taken.update(Video.objects.filter(prefixes).values_list('slug', flat=True))
+
+        slugs = []
+        next_counter = {}
+        for base in bases:
+            counter = next_counter.get(base, 0)
+            slug = f"{base}-{counter}" if counter else base
+            while slug in taken:
+                counter += 1
+                slug = f"{base}-{counter}"
+            next_counter[base] = counter + 1
+            taken.add(slug)
+            slugs.append(slug)
+        return slugs
+
+    def set_tags(self, text):
+        """Replaces the video's tags with the comma-separated names in `text`."""
+        from .tagging import set_video_tags
+        set_video_tags(self, text)
+
     # Method to retrieve all unique tags from all videos
     @staticmethod
     def get_all_tags():
-        tags = set()
-        for video in Video.objects.values_list('tags', flat=True):
-            if video:
-                for tag in video.split(','):
-                    tags.add(tag.strip().lower())
-        return sorted(list(tags))
+        """The cached tag cloud: [{'name', 'slug', 'video_count'}, ...] for tags in use."""
+        from .tagging import tag_cloud
+        return tag_cloud()
 
 
 class Comment(models.Model):
@@ -117,6 +324,9 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['video', 'created_at', 'id']), # Cursor pages of one video's comments
+        ]
 
     def __str__(self):
         return f"Comment by {self.user.username} on {self.video.title[:30]}..."
@@ -132,19 +342,167 @@ class Feedback(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id']), # Keyset pagination (core/pagination.py)
+        ]
 
     def __str__(self):
         return f"Feedback from {self.user.username} about {self.video.title if self.video else 'General'}"
 
 
+class NotificationBroadcast(models.Model):
+    """
+    A notification to every user, stored once. Each user's Notification row is
+    created when their notifications are first read (core/notifications.py).
+    """
+    message = models.TextField()
+    sent_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Broadcast: {self.message[:50]}..."
+
+
 class Notification(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
     message = models.TextField()
     is_read = models.BooleanField(default=False)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(default=timezone.now, editable=False) # Rows materialized from a broadcast keep its time
+    broadcast = models.ForeignKey(NotificationBroadcast, on_delete=models.CASCADE, null=True, blank=True, related_name='notifications')
 
     class Meta:
         ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['broadcast', 'user'], name='unique_broadcast_notification'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'is_read', '-created_at'], name='notification_unread_idx'), # Unread counts and backlog
+        ]
+
+    def __str__(self):
+        return f"Notification for {self.user.username}: {self.message[:50]}..."
+
+
+# Pre-aggregated analytics read by the admin dashboard (maintained by core/rollups.py).
+# Creations are counted on the object's own date; views and likes on the day they happen.
+class DailyStats(models.Model):
+    date = models.DateField(unique=True)
+    users = models.IntegerField(default=0)
+    videos = models.IntegerField(default=0)
+    views = models.IntegerField(default=0)
+    likes = models.IntegerField(default=0) # Net: unlikes subtract
+    comments = models.IntegerField(default=0)
+    feedback = models.IntegerField(default=0)
+    unread_feedback = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['date']
+
+    def __str__(self):
+        return f"Stats for {self.date}"
+
+
+class DailyVideoStats(models.Model):
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField(db_index=True)
+    views = models.IntegerField(default=0)
+    likes = models.IntegerField(default=0)
+    comments = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('video', 'date')
 
     def __str__(self):
-        return f"Notification for {self.user.username}: {self.message[:50]}..."
\ No newline at end of file
+        return f"{self.video_id} on {self.date}"
+
+
+class DailyTagStats(models.Model):
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField(db_index=True)
+    views = models.IntegerField(default=0) # Views of videos carrying the tag
+
+    class Meta:
+        unique_together = ('tag', 'date')
+
+    def __str__(self):
+        return f"{self.tag_id} on {self.date}"
+
+
+class Job(models.Model):
+    """A unit of background work (thumbnailing, transcoding...) run by the job worker."""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    )
+
+    kind = models.CharField(max_length=50)
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, null=True, blank=True, related_name='jobs')
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now) # Pushed back on each failed attempt
+    locked_by = models.CharField(max_length=255, blank=True) # Worker process running the job: "<node>:<pid>:<boot id>"
+    locked_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True) # Refreshed by that process while the job runs
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['run_after', 'id']
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+            models.Index(fields=['status', 'locked_by']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} job #{self.pk} ({self.status})"
+
+    def as_dict(self):
+        return {
+            'id': self.pk,
+            'kind': self.kind,
+            'video_id': self.video_id,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'run_after': self.run_after.isoformat() if self.run_after else None,
+            'last_error': self.last_error,
+            'progress': self.payload.get('progress'), # {'done', 'total'} for jobs that report it
+        }
+
+
+class UploadSession(models.Model):
+    """A resumable video upload still being staged on disk (core/uploads.py) or in the bucket (core/direct_uploads.py)."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    admin = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField() # Total size announced by the client
+    offset = models.PositiveBigIntegerField(default=0) # Bytes received so far
+    title = models.CharField(max_length=255)
+    description = models.TextField()
+    tags = models.CharField(max_length=500)
+    # Set for direct-to-bucket uploads (core/direct_uploads.py): the object being assembled and its S3 multipart id
+    storage_name = models.CharField(max_length=255, blank=True)
+    multipart_id = models.CharField(max_length=255, blank=True)
+    # The Video a finalized upload became; the session is kept until swept so a retried finalize returns it
+    video = models.ForeignKey(Video, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True) # Used to sweep stale uploads
+
+    def __str__(self):
+        return f"Upload of {self.filename} ({self.offset}/{self.size} bytes)"
+
+    @property
+    def is_complete(self):
+        return self.offset >= self.size
\ No newline at end of file
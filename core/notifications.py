@@ -0,0 +1,205 @@
+# core/notifications.py
+"""
+Sending notifications to many users.
+
+admin_send_notification_view only queues a 'notify' job (core/jobs.py)
+holding an audience spec (core/audiences.py); the worker does the fan-out:
+
+- Sends to a segment or to picked users resolve the audience when the job
+  runs and stream its ids with iterator(), bulk_creating Notification rows
+  NOTIFICATION_BATCH_SIZE at a time, then pushing each batch to the users'
+  sockets with concurrent group_sends on one event loop.
+- Sends to everyone store a single NotificationBroadcast and make a single
+  group_send to BROADCAST_GROUP, which every NotificationConsumer joins.
+  A user's own row is created from the broadcast by materialize_broadcasts()
+  when their notifications are next read.
+
+Progress ({'done', 'total'} recipients and the last user id) is saved in
+the job payload after each batch, so a retried job resumes where it
+stopped, and is pushed to the sending admin's socket as a job update.
+
+Reading: each user's unread count is cached (unread_count()) under the
+BROADCASTS version token, so a new or deleted broadcast recounts everyone
+lazily. Writes keep it current: mark_read() decrements it, new rows from
+a fan-out batch or a save() drop it. The navbar badge reads only the
+cache; NotificationConsumer sends recent_unread() (one indexed query) on
+connect and applies read acknowledgements with mark_read().
+"""
+import asyncio
+import logging
+from itertools import islice
+
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+
+from . import audiences, caching, jobs
+from .models import Notification, NotificationBroadcast
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_GROUP = 'notifications_broadcast'
+BROADCASTS = 'version:broadcasts' # caching token, bumped when a broadcast is created or deleted
+
+
+def user_group(user_id):
+    return f"user_{user_id}"
+
+
+def send(message, sender, audience):
+    """Queues `message` for an audience spec (see core/audiences.py) and returns the Job doing the fan-out."""
+    payload = {'message': message, 'requested_by': sender.pk, 'audience': audience}
+    with transaction.atomic():
+        if audience.get('segment') == 'all':
+            broadcast = NotificationBroadcast.objects.create(message=message, sent_by=sender)
+            payload['broadcast_id'] = broadcast.pk
+            total = broadcast_recipients(broadcast).count()
+        else:
+            total = audiences.resolve(audience).count() # Recipients may come and go before the job runs
+        payload['progress'] = {'done': 0, 'total': total, 'last_user_id': 0}
+        return jobs.enqueue('notify', payload=payload)
+
+
+def broadcast_recipients(broadcast):
+    """Users a broadcast is for: everyone who had joined when it was sent."""
+    return User.objects.filter(date_joined__lte=broadcast.created_at)
+
+
+def _broadcasts_version():
+    return caching.get_versions([BROADCASTS])[BROADCASTS]
+
+
+def _unread_key(user_id, version):
+    return f'notifications:unread:{user_id}:{version}'
+
+
+def materialize_broadcasts(user):
+    """Creates `user`'s rows for broadcasts they have not received yet; returns how many."""
+    version = _broadcasts_version()
+    marker = f'notifications:materialized:{user.pk}'
+    if cache.get(marker) == version: # Nothing was broadcast since the last call
+        return 0
+    pending = list(
+        NotificationBroadcast.objects.filter(created_at__gte=user.date_joined)
+        .exclude(notifications__user=user).values_list('pk', 'message', 'created_at')
+    )
+    Notification.objects.bulk_create([
+        Notification(user=user, broadcast_id=pk, message=message, created_at=created_at)
+        for pk, message, created_at in pending
+    ], ignore_conflicts=True) # A concurrent request may materialize the same rows
+    cache.set(marker, version, settings.NOTIFICATION_UNREAD_CACHE_SECONDS)
+    return len(pending)
+
+
+def unread_count(user):
+    """How many unread notifications `user` has; a cache read except after a change drops the count."""
+    key = _unread_key(user.pk, _broadcasts_version())
+    count = cache.get(key)
+    if count is None:
+        materialize_broadcasts(user)
+        count = Notification.objects.filter(user=user, is_read=False).count()
+        cache.set(key, count, settings.NOTIFICATION_UNREAD_CACHE_SECONDS)
+    return count
+
+
+def invalidate_unread(*user_ids):
+    """Drops the cached counts of `user_ids`, e.g. after rows were created or updated in bulk."""
+    if user_ids:
+        version = _broadcasts_version()
+        cache.delete_many([_unread_key(pk, version) for pk in user_ids])
+
+
+def recent_unread(user, limit=None):
+    """`user`'s newest unread notifications as dicts, from the (user, is_read, created_at) index."""
+    materialize_broadcasts(user)
+    rows = (
+        Notification.objects.filter(user=user, is_read=False).order_by('-created_at')
+        .values('id', 'message', 'created_at')[:limit or settings.NOTIFICATION_BACKLOG_SIZE]
+    )
+    return [{**row, 'created_at': row['created_at'].isoformat()} for row in rows]
+
+
+def broadcast_notification_id(user, broadcast_id):
+    """The pk of `user`'s row for a broadcast, materializing it first."""
+    materialize_broadcasts(user)
+    return Notification.objects.filter(user=user, broadcast_id=broadcast_id).values_list('pk', flat=True).first()
+
+
+def mark_read(user, ids=None):
+    """Marks `ids` (all when None) of `user`'s notifications read with one UPDATE; returns the new unread count."""
+    if ids is None:
+        materialize_broadcasts(user) # Mark-all covers broadcasts not read yet
+    unread = Notification.objects.filter(user=user, is_read=False)
+    if ids is not None:
+        unread = unread.filter(pk__in=ids)
+    changed = unread.update(is_read=True)
+    key = _unread_key(user.pk, _broadcasts_version())
+    if ids is None:
+        cache.set(key, 0, settings.NOTIFICATION_UNREAD_CACHE_SECONDS)
+    elif changed:
+        try:
+            cache.incr(key, -changed)
+        except ValueError: # Not cached; counted on the next read
+            pass
+    return unread_count(user)
+
+
+def fanout_job(job):
+    """Job handler for 'notify' jobs (see send())."""
+    async_to_sync(_fanout)(job) # Every push of the job shares this one event loop
+
+
+async def _fanout(job):
+    payload = job.payload
+    channel_layer = get_channel_layer()
+    event = {'type': 'send_notification', 'message': payload['message']} # NotificationConsumer.send_notification
+    if 'broadcast_id' in payload:
+        await _push(channel_layer, [(BROADCAST_GROUP, {**event, 'broadcast_id': payload['broadcast_id']})])
+        payload['progress']['done'] = payload['progress']['total']
+        await sync_to_async(_save_progress)(job)
+        return
+
+    progress = payload['progress']
+    batches = await sync_to_async(_recipient_batches)(job)
+    while batch := await sync_to_async(next)(batches, []):
+        progress['done'] += len(batch)
+        progress['last_user_id'] = batch[-1]
+        created = await sync_to_async(_write_batch)(job, batch)
+        await _push(channel_layer, [(user_group(user_id), {**event, 'id': pk}) for user_id, pk in created])
+        await _push(channel_layer, [(user_group(payload['requested_by']), {'type': 'job_update', 'job': job.as_dict()})])
+    progress['total'] = progress['done'] # The audience as it was actually resolved
+    await sync_to_async(_save_progress)(job)
+
+
+def _recipient_batches(job):
+    # Streamed in id order, after the last user a previous attempt got to
+    recipients = audiences.resolve(job.payload['audience']).filter(pk__gt=job.payload['progress']['last_user_id'])
+    ids = recipients.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=settings.NOTIFICATION_BATCH_SIZE)
+    return iter(lambda: list(islice(ids, settings.NOTIFICATION_BATCH_SIZE)), [])
+
+
+def _write_batch(job, user_ids):
+    # The rows and the progress that counts them commit together, so a retry neither skips nor repeats a batch
+    with transaction.atomic():
+        rows = Notification.objects.bulk_create([Notification(user_id=pk, message=job.payload['message']) for pk in user_ids])
+        _save_progress(job)
+    invalidate_unread(*user_ids)
+    return [(row.user_id, row.pk) for row in rows]
+
+
+def _save_progress(job):
+    job.save(update_fields=['payload', 'updated_at'])
+
+
+async def _push(channel_layer, sends):
+    """Sends each (group, event) of `sends` concurrently."""
+    if channel_layer is None:
+        return
+    results = await asyncio.gather(*(channel_layer.group_send(group, event) for group, event in sends), return_exceptions=True)
+    failed = [result for result in results if isinstance(result, Exception)]
+    if failed:
+        # The rows are stored; offline or unreachable users see them on their next visit
+        logger.warning("Could not push %d of %d notification(s): %s", len(failed), len(sends), failed[0])
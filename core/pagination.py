@@ -0,0 +1,152 @@
+# core/pagination.py
+"""
+Keyset (cursor) pagination for the list views.
+
+Instead of OFFSET and COUNT(*), a page is "the next per_page rows after
+this row's sort key": one indexed range scan whatever the depth. The sort
+key is an ordering that ends in a unique column, e.g. ('-uploaded_at',
+'-id'), and a cursor is an opaque token holding the key of the row a page
+starts after (or ends before, going back).
+
+Pages cannot be addressed by number and there is no exact total; an
+optional estimate (PostgreSQL's planner row estimate, or a count capped at
+ESTIMATE_CAP elsewhere) stands in for it.
+"""
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Q
+
+ESTIMATE_CAP = 1000 # Rows counted at most where the database cannot estimate
+
+
+def _dump(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat() # Full precision; the key must match exactly
+    return value
+
+
+class KeysetPage:
+    def __init__(self, paginator, object_list, next_cursor, previous_cursor):
+        self.paginator = paginator
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    is_keyset = True # pagination.html renders cursor links rather than page numbers
+
+    def __init__(self, queryset, per_page, ordering=('-uploaded_at', '-id'), estimate_total=False):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.fields = [queryset.model._meta.get_field(name.lstrip('-')) for name in self.ordering]
+        self.estimate_total = estimate_total
+        self._estimate = None
+
+    def page(self, cursor=None):
+        """The page a cursor token points at; a missing or invalid token gives the first page."""
+        direction, key = self.decode_cursor(cursor)
+        if direction == 'previous':
+            rows = list(self.queryset.filter(self._beyond(key, forward=False)).order_by(*self._reversed())[:self.per_page + 1])
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_next = True
+        else:
+            queryset = self.queryset.filter(self._beyond(key, forward=True)) if key else self.queryset
+            rows = list(queryset.order_by(*self.ordering)[:self.per_page + 1])
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_previous = key is not None
+        if not rows:
+            has_next = has_previous = False
+        return KeysetPage(
+            self, rows,
+            next_cursor=self.encode_cursor('next', rows[-1]) if has_next else None,
+            previous_cursor=self.encode_cursor('previous', rows[0]) if has_previous else None,
+        )
+
+    def encode_cursor(self, direction, obj):
+        key = [_dump(getattr(obj, field.attname)) for field in self.fields]
+        payload = json.dumps([direction[0], key], separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """(direction, key values) for a token, or ('next', None) when it is missing or malformed."""
+        if not cursor:
+            return 'next', None
+        try:
+            payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, key = json.loads(payload)
+            if direction not in ('n', 'p') or len(key) != len(self.fields):
+                raise ValueError
+            return ('next' if direction == 'n' else 'previous'), [field.to_python(value) for field, value in zip(self.fields, key)]
+        except (binascii.Error, ValueError, TypeError, ValidationError): # Tampered or stale (e.g. the ordering changed)
+            return 'next', None
+
+    def _beyond(self, key, forward):
+        """Rows sorting strictly after (forward) or before `key` in this ordering."""
+        names = [name.lstrip('-') for name in self.ordering]
+        condition = Q()
+        for i, name in enumerate(names):
+            descending = self.ordering[i].startswith('-')
+            term = Q(**{f"{name}__{'lt' if descending == forward else 'gt'}": key[i]})
+            for earlier, value in zip(names[:i], key[:i]):
+                term &= Q(**{earlier: value})
+            condition |= term
+        # The redundant bound on the leading column lets the database range-scan its index
+        leading = 'lte' if self.ordering[0].startswith('-') == forward else 'gte'
+        return Q(**{f'{names[0]}__{leading}': key[0]}) & condition
+
+    def _reversed(self):
+        return [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+
+    @property
+    def estimated_count(self):
+        """Roughly how many rows the list holds, or None unless estimate_total was requested."""
+        if not self.estimate_total:
+            return None
+        if self._estimate is None:
+            if connection.vendor == 'postgresql':
+                sql, params = self.queryset.order_by().query.sql_with_params()
+                with connection.cursor() as cursor:
+                    cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+                    plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                self._estimate = int(plan[0]['Plan']['Plan Rows'])
+            else:
+                self._estimate = self.queryset.order_by()[:ESTIMATE_CAP + 1].count()
+        return self._estimate
+
+    @property
+    def estimate_label(self):
+        """The estimate for display: '~1234', or '1000+' where only a capped count was taken."""
+        if self.estimated_count is None:
+            return ''
+        if connection.vendor != 'postgresql' and self.estimated_count > ESTIMATE_CAP:
+            return f'{ESTIMATE_CAP}+'
+        return f'~{self.estimated_count}'
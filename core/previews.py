@@ -0,0 +1,143 @@
+# core/previews.py
+"""
+Seek-preview sprite sheets and a WebVTT thumbnails track.
+
+ffmpeg decodes the video once, keeping one frame every PREVIEW_INTERVAL
+seconds, scaled to a tile and piped out as raw RGB. Frames are pasted into
+a sprite sheet as they arrive and each full sheet is encoded and stored
+straight away, so memory holds at most one sheet and one frame no matter
+how long the video is.
+"""
+import subprocess
+import uuid
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+
+from .blobs import release_directory
+from .media import local_video_path, update_if_current
+
+TRACK_NAME = 'previews.vtt'
+
+
+class PreviewError(Exception):
+    pass
+
+
+def _decode_command(source):
+    width, height = settings.PREVIEW_TILE_WIDTH, settings.PREVIEW_TILE_HEIGHT
+    return [
+        settings.FFMPEG_BINARY, '-nostdin', '-loglevel', 'error',
+        '-i', source,
+        '-an',
+        # One frame per interval, letterboxed into a fixed-size tile
+        '-vf', (
+            f"fps=1/{settings.PREVIEW_INTERVAL},"
+            f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2"
+        ),
+        '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+        'pipe:1',
+    ]
+
+
+def iter_preview_frames(source):
+    """Yields tile-sized PIL images, one per PREVIEW_INTERVAL seconds of video."""
+    width, height = settings.PREVIEW_TILE_WIDTH, settings.PREVIEW_TILE_HEIGHT
+    frame_size = width * height * 3
+    process = subprocess.Popen(_decode_command(source), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        while True:
+            raw = process.stdout.read(frame_size)
+            if len(raw) < frame_size:
+                break
+            yield Image.frombytes('RGB', (width, height), raw)
+    finally:
+        process.stdout.close()
+        stderr = process.stderr.read()
+        process.stderr.close()
+        returncode = process.wait()
+    if returncode != 0:
+        raise PreviewError(f"ffmpeg failed: {stderr.decode(errors='replace')[-2000:]}")
+
+
+def _timestamp(seconds):
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{seconds:06.3f}"
+
+
+def _save_sheet(sheet, prefix, index):
+    fmt = settings.PREVIEW_FORMAT.upper()
+    extension = 'webp' if fmt == 'WEBP' else 'jpg'
+    name = f"sprite_{index:03d}.{extension}"
+    buffer = BytesIO()
+    sheet.save(buffer, format=fmt, quality=settings.PREVIEW_QUALITY)
+    default_storage.save(f"{prefix}/{name}", ContentFile(buffer.getvalue()))
+    return name
+
+
+def generate_previews(video):
+    """Builds the sprite sheets and VTT track for `video` and records the track on it."""
+    from .models import Video
+
+    if not video.video_file:
+        return
+
+    width, height = settings.PREVIEW_TILE_WIDTH, settings.PREVIEW_TILE_HEIGHT
+    columns, rows = settings.PREVIEW_COLUMNS, settings.PREVIEW_ROWS
+    per_sheet = columns * rows
+    interval = settings.PREVIEW_INTERVAL
+    prefix = f"thumbnails/previews/{video.pk}/{uuid.uuid4().hex[:12]}"
+
+    cues = ['WEBVTT', '']
+    sheet = None
+    sheet_index = 0
+    pending = [] # (start, end, x, y) cues for tiles on the current sheet
+    count = 0
+
+    def flush():
+        name = _save_sheet(sheet, prefix, sheet_index)
+        for start, end, x, y in pending:
+            cues.append(f"{_timestamp(start)} --> {_timestamp(end)}")
+            cues.append(f"{name}#xywh={x},{y},{width},{height}")
+            cues.append('')
+
+    with local_video_path(video.video_file) as source:
+        for frame in iter_preview_frames(source):
+            slot = count % per_sheet
+            if slot == 0:
+                if sheet is not None:
+                    flush()
+                    sheet_index += 1
+                    pending = []
+                sheet = Image.new('RGB', (width * columns, height * rows))
+            x, y = (slot % columns) * width, (slot // columns) * height
+            sheet.paste(frame, (x, y))
+            pending.append((count * interval, (count + 1) * interval, x, y))
+            count += 1
+
+    if sheet is None:
+        return
+    # Crop unused rows off the last sheet
+    used_rows = (len(pending) + columns - 1) // columns
+    sheet = sheet.crop((0, 0, width * columns, height * used_rows))
+    flush()
+
+    default_storage.save(f"{prefix}/{TRACK_NAME}", ContentFile('\n'.join(cues).encode('utf-8')))
+
+    previous = Video.objects.filter(pk=video.pk).values_list('preview_track', flat=True).first()
+    video.preview_track = f"{prefix}/{TRACK_NAME}"
+    if not update_if_current(video, preview_track=video.preview_track):
+        release_directory('preview_track', video.preview_track) # Previews of a file the video no longer has
+        return
+    release_directory('preview_track', previous)
+
+
+# --- Job handlers (see JOB_HANDLERS in core/jobs.py) ---
+
+def previews_job(job):
+    generate_previews(job.video)
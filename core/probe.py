@@ -0,0 +1,89 @@
+# core/probe.py
+"""
+Container-level media metadata via ffprobe.
+
+ffprobe only reads the headers it needs. Local files are probed in place;
+remote files are probed over their storage URL, which ffprobe reads with
+HTTP range requests instead of downloading the whole object.
+"""
+import json
+import subprocess
+
+from django.conf import settings
+
+from .media import update_if_current
+
+
+class ProbeError(Exception):
+    pass
+
+
+def probe_input(field_file):
+    try:
+        return field_file.path
+    except NotImplementedError:
+        return field_file.url
+
+
+def run_ffprobe(source):
+    result = subprocess.run(
+        [
+            settings.FFPROBE_BINARY, '-v', 'error',
+            '-print_format', 'json',
+            '-show_format', '-show_streams',
+            source,
+        ],
+        capture_output=True,
+        timeout=settings.FFPROBE_TIMEOUT,
+    )
+    if result.returncode != 0:
+        raise ProbeError(result.stderr.decode(errors='replace')[-2000:])
+    return json.loads(result.stdout)
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_probe(data):
+    """Maps ffprobe JSON onto Video metadata fields."""
+    streams = data.get('streams', [])
+    fmt = data.get('format', {})
+    video_stream = next((s for s in streams if s.get('codec_type') == 'video' and not s.get('disposition', {}).get('attached_pic')), {})
+    audio_stream = next((s for s in streams if s.get('codec_type') == 'audio'), {})
+    return {
+        'duration': _float(fmt.get('duration')) or _float(video_stream.get('duration')),
+        'width': _int(video_stream.get('width')),
+        'height': _int(video_stream.get('height')),
+        'video_codec': video_stream.get('codec_name', '')[:32],
+        'audio_codec': audio_stream.get('codec_name', '')[:32],
+        'bitrate': _int(fmt.get('bit_rate')),
+        'file_size': _int(fmt.get('size')),
+    }
+
+
+def probe_video(video):
+    """Probes `video`'s file and stores the results on it; returns the metadata dict."""
+    if not video.video_file:
+        return {}
+    metadata = parse_probe(run_ffprobe(probe_input(video.video_file)))
+    for field, value in metadata.items():
+        setattr(video, field, value)
+    update_if_current(video, **metadata) # Nothing stored to release if the file was replaced meanwhile
+    return metadata
+
+
+# --- Job handlers (see JOB_HANDLERS in core/jobs.py) ---
+
+def probe_job(job):
+    probe_video(job.video)
@@ -0,0 +1,204 @@
+# core/rollups.py
+"""
+Daily analytics rollups for the admin dashboard.
+
+DailyStats (site-wide), DailyVideoStats and DailyTagStats hold per-day
+counts that are bumped as things happen:
+
+- new/deleted users, videos, comments and feedback: signal receivers in
+  core/signals.py, counted on the object's own creation date;
+- views: flush_view_counts, in the same transaction as the Video update;
+- likes: Video.toggle_like and the likes m2m_changed receiver.
+
+Every bump is an UPDATE ... SET n = n + delta (the row is created first if
+needed), so concurrent writers never lose counts. The dashboard reads only
+these tables and Tag.video_count.
+
+`manage.py rebuild_rollups` recomputes everything derivable from the
+source tables. Views and likes carry no timestamps there, so their daily
+history lives only in DailyVideoStats; a rebuild keeps it, reconciles it
+with Video.views/likes_count, and derives the site and tag views from it.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Comment, DailyStats, DailyTagStats, DailyVideoStats, Feedback, Tag, Video
+
+CHARTS_CACHE_KEY = 'rollups:charts'
+DAILY_FIELDS = ('users', 'videos', 'views', 'likes', 'comments', 'feedback', 'unread_feedback')
+
+
+def _bump(model, lookup, create=True, **deltas):
+    """Adds `deltas` to the row matching `lookup`, creating it first when `create` is set."""
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    updates = {field: F(field) + delta for field, delta in deltas.items()}
+    if model.objects.filter(**lookup).update(**updates) or not create:
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError: # Another writer created the row first
+        model.objects.filter(**lookup).update(**updates)
+
+
+def _bulk_bump(model, key, counts, field, date):
+    """Adds {pk: n} counts to `field` of the `date` rows keyed on `key`, with one UPDATE per distinct n."""
+    model.objects.bulk_create([model(**{key: pk, 'date': date}) for pk in counts], ignore_conflicts=True)
+    by_amount = defaultdict(list)
+    for pk, amount in counts.items():
+        if amount:
+            by_amount[amount].append(pk)
+    for amount, pks in by_amount.items():
+        model.objects.filter(date=date, **{f'{key}__in': pks}).update(**{field: F(field) + amount})
+
+
+def record_site(date, **deltas):
+    _bump(DailyStats, {'date': date}, **deltas)
+
+
+def record_views(counts):
+    """Adds flushed {video pk: views} to today's video, tag and site rows."""
+    today = timezone.localdate()
+    counts = {pk: counts[pk] for pk in Video.objects.filter(pk__in=counts).values_list('pk', flat=True)} # Skip deleted videos
+    if not counts:
+        return
+    _bulk_bump(DailyVideoStats, 'video_id', counts, 'views', today)
+    by_tag = Counter()
+    for video_id, tag_id in Video.tags.through.objects.filter(video_id__in=counts).values_list('video_id', 'tag_id'):
+        by_tag[tag_id] += counts[video_id]
+    _bulk_bump(DailyTagStats, 'tag_id', by_tag, 'views', today)
+    record_site(today, views=sum(counts.values()))
+
+
+def record_likes(deltas):
+    """Applies {video pk: change in likes} to today's rows."""
+    today = timezone.localdate()
+    for pk, delta in deltas.items():
+        _bump(DailyVideoStats, {'video_id': pk, 'date': today}, likes=delta)
+    record_site(today, likes=sum(deltas.values()))
+
+
+def record_comment(comment, delta):
+    date = timezone.localdate(comment.created_at)
+    # Never create a row on removal: the video may be mid-deletion (its stats rows go with it)
+    _bump(DailyVideoStats, {'video_id': comment.video_id, 'date': date}, create=delta > 0, comments=delta)
+    record_site(date, comments=delta)
+
+
+def record_uploads(videos, delta=1):
+    by_date = Counter(timezone.localdate(video.uploaded_at) for video in videos)
+    for date, count in by_date.items():
+        record_site(date, videos=count * delta)
+
+
+def forget_video(video):
+    """Takes a video's daily views and likes out of the site and tag rollups before it is deleted (its own rows cascade)."""
+    tag_ids = list(video.tags.values_list('pk', flat=True))
+    for date, views, likes in DailyVideoStats.objects.filter(video=video).values_list('date', 'views', 'likes'):
+        record_site(date, views=-views, likes=-likes)
+        for tag_id in tag_ids:
+            _bump(DailyTagStats, {'tag_id': tag_id, 'date': date}, create=False, views=-views)
+
+
+def record_feedback_read(feedback_items, is_read):
+    """Moves feedback between read and unread, e.g. after a bulk `update(is_read=...)`."""
+    by_date = Counter(timezone.localdate(item.created_at) for item in feedback_items)
+    for date, count in by_date.items():
+        record_site(date, unread_feedback=-count if is_read else count)
+
+
+def totals():
+    """All-time totals summed from DailyStats (one row per day)."""
+    sums = DailyStats.objects.aggregate(**{field: Sum(field) for field in DAILY_FIELDS})
+    return {field: sums[field] or 0 for field in DAILY_FIELDS}
+
+
+def chart_data(days=30):
+    """The admin dashboard charts, cached for ROLLUP_CHARTS_CACHE_SECONDS."""
+    data = cache.get(CHARTS_CACHE_KEY)
+    if data is not None:
+        return data
+    since = timezone.localdate() - timedelta(days=days - 1)
+    tags = Tag.objects.filter(video_count__gt=0).order_by('-video_count', 'name').values_list('name', 'video_count')
+    uploads = DailyStats.objects.exclude(videos=0).values_list('date', 'videos')
+    viewed = list(
+        DailyVideoStats.objects.filter(date__gte=since).values('video_id')
+        .annotate(total=Sum('views')).filter(total__gt=0).order_by('-total')[:5]
+    )
+    titles = dict(Video.objects.filter(pk__in=[row['video_id'] for row in viewed]).values_list('pk', 'title'))
+    tag_views = (
+        DailyTagStats.objects.filter(date__gte=since).values('tag__name')
+        .annotate(total=Sum('views')).filter(total__gt=0).order_by('-total')[:10]
+    )
+    data = {
+        'tags': {'labels': [name for name, count in tags], 'data': [count for name, count in tags]},
+        'uploads': {'labels': [str(date) for date, count in uploads], 'data': [count for date, count in uploads]},
+        'viewed': {'labels': [titles.get(row['video_id'], '') for row in viewed], 'data': [row['total'] for row in viewed]},
+        'tag_views': {'labels': [row['tag__name'] for row in tag_views], 'data': [row['total'] for row in tag_views]},
+        'days': days,
+    }
+    cache.set(CHARTS_CACHE_KEY, data, settings.ROLLUP_CHARTS_CACHE_SECONDS)
+    return data
+
+
+def _by_date(queryset, date_field, *group_by, **aggregates):
+    day = TruncDate(date_field, tzinfo=timezone.get_current_timezone())
+    return queryset.annotate(day=day).values(*group_by, 'day').annotate(**aggregates).order_by()
+
+
+@transaction.atomic
+def rebuild_rollups():
+    """Recomputes the rollups from the source tables (see the module docstring for views and likes)."""
+    # Per-video: comments from the comments table; views/likes topped up so each video's
+    # daily rows add up to its counters (the remainder is dated on its upload day).
+    DailyVideoStats.objects.update(comments=0)
+    for row in _by_date(Comment.objects.all(), 'created_at', 'video_id', n=Count('pk')):
+        _bump(DailyVideoStats, {'video_id': row['video_id'], 'date': row['day']}, comments=row['n'])
+    recorded = {
+        row['video_id']: row for row in
+        DailyVideoStats.objects.values('video_id').annotate(views=Sum('views'), likes=Sum('likes'))
+    }
+    for video in Video.objects.only('pk', 'uploaded_at', 'views', 'likes_count'):
+        row = recorded.get(video.pk, {'views': 0, 'likes': 0})
+        _bump(
+            DailyVideoStats, {'video_id': video.pk, 'date': timezone.localdate(video.uploaded_at)},
+            views=video.views - row['views'], likes=video.likes_count - row['likes'],
+        )
+
+    days = defaultdict(Counter)
+    for field, queryset, date_field, aggregate in (
+        ('users', User.objects.all(), 'date_joined', Count('pk')),
+        ('videos', Video.objects.all(), 'uploaded_at', Count('pk')),
+        ('comments', Comment.objects.all(), 'created_at', Count('pk')),
+        ('feedback', Feedback.objects.all(), 'created_at', Count('pk')),
+        ('unread_feedback', Feedback.objects.filter(is_read=False), 'created_at', Count('pk')),
+    ):
+        for row in _by_date(queryset, date_field, n=aggregate):
+            days[row['day']][field] = row['n']
+    for row in DailyVideoStats.objects.values('date').annotate(views=Sum('views'), likes=Sum('likes')):
+        days[row['date']].update(views=row['views'], likes=row['likes'])
+    DailyStats.objects.all().delete()
+    DailyStats.objects.bulk_create([DailyStats(date=date, **counts) for date, counts in days.items()], batch_size=1000)
+
+    # Per-tag views, attributed through the videos' current tags
+    tag_days = (
+        DailyVideoStats.objects.filter(views__gt=0, video__tags__isnull=False)
+        .values('video__tags', 'date').annotate(views=Sum('views'))
+    )
+    DailyTagStats.objects.all().delete()
+    DailyTagStats.objects.bulk_create(
+        [DailyTagStats(tag_id=row['video__tags'], date=row['date'], views=row['views']) for row in tag_days],
+        batch_size=1000,
+    )
+    cache.delete(CHARTS_CACHE_KEY)
+    return len(days)
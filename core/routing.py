@@ -1,7 +1,15 @@
 # core/routing.py
+from django.conf import settings
 from django.urls import re_path
 from . import consumers
 
 websocket_urlpatterns = [
     re_path(r'ws/notifications/$', consumers.NotificationConsumer.as_asgi()),
-]
\ No newline at end of file
+    re_path(r'ws/videos/(?P<slug>[-\w]+)/comments/$', consumers.CommentStreamConsumer.as_asgi()),
+]
+
+# Background channels served by `runworker` (see the worker and comments lines in the Procfile)
+channel_routes = {
+    settings.JOB_CHANNEL: consumers.JobWorkerConsumer.as_asgi(),
+    settings.COMMENT_FANOUT_CHANNEL: consumers.CommentFanoutConsumer.as_asgi(),
+}
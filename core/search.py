@@ -0,0 +1,174 @@
+# core/search.py
+"""
+Ranked full-text search over the video catalog.
+
+search_videos(query) is the one entry point; the index behind it depends
+on the database:
+
+- PostgreSQL: core_video.search_document, a tsvector column generated from
+  the title (weight A), tags (B) and description (C) and kept current by
+  the database itself, with a GIN index. Results are ranked by ts_rank.
+- SQLite: core_video_fts, an FTS5 table with the same three columns,
+  updated from the post_save/post_delete receivers in core/signals.py and
+  by index_videos() wherever rows change without signals (bulk imports,
+  queryset updates). Results are ranked by bm25.
+
+Neither is known to the ORM (there are no migrations), so ensure_search_index()
+creates them after `migrate` and `manage.py rebuild_search_index` rebuilds them.
+
+Only the requested page is materialized: counting and ranking run in the
+database, and highlighted snippets are computed for the page's rows alone.
+"""
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Video
+
+SEARCH_CONFIG = 'english'
+SEARCHED_FIELDS = frozenset({'title', 'description', 'tags_text'})
+FTS_TABLE = 'core_video_fts'
+SNIPPET_WORDS = 24
+# Markers around matched terms in raw snippets; replaced with <mark> once the text is escaped
+MATCH_START, MATCH_STOP = '\x02', '\x03'
+
+
+def _is_postgresql():
+    return connection.vendor == 'postgresql'
+
+
+def ensure_search_index(rebuild=False):
+    """Creates the search column/table and its index if missing; returns whether anything was (re)built."""
+    with connection.cursor() as cursor:
+        if _is_postgresql():
+            cursor.execute(f"""
+                ALTER TABLE core_video ADD COLUMN IF NOT EXISTS search_document tsvector GENERATED ALWAYS AS (
+                    setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A') ||
+                    setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(tags, '')), 'B') ||
+                    setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'C')
+                ) STORED
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS core_video_search_document_gin ON core_video USING gin (search_document)")
+            return False # The generated column is filled in by the database
+        if connection.vendor != 'sqlite':
+            return False
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = %s", [FTS_TABLE])
+        created = cursor.fetchone() is None
+        if created:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(title, tags, description, tokenize='porter unicode61')"
+            )
+        if created or rebuild:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, tags, description) SELECT id, title, tags, description FROM core_video"
+            )
+        return created or rebuild
+
+
+def index_videos(videos):
+    """Refreshes the SQLite index rows of `videos` (no-op on PostgreSQL, where the column is generated)."""
+    if _is_postgresql() or not videos:
+        return
+    rows = [(video.pk, video.title, video.tags_text, video.description) for video in videos]
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+        cursor.executemany(f"INSERT INTO {FTS_TABLE} (rowid, title, tags, description) VALUES (%s, %s, %s, %s)", rows)
+
+
+def unindex_video(pk):
+    if _is_postgresql():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [pk])
+
+
+def _fts_query(query):
+    # FTS5 has its own query syntax; quoting each word keeps user input from being parsed
+    # as operators. The last word matches as a prefix, so results appear while typing.
+    words = re.findall(r'\w+', query)
+    if not words:
+        return ''
+    return ' '.join(f'"{word}"' for word in words) + '*'
+
+
+def _highlight(snippet):
+    return mark_safe(escape(snippet).replace(MATCH_START, '<mark>').replace(MATCH_STOP, '</mark>'))
+
+
+class SearchResults:
+    """
+    Lazily evaluated ranked matches, shaped for django.core.paginator.Paginator:
+    count() runs one COUNT, and slicing fetches just that slice with snippets.
+    Each returned Video carries `search_rank` and a safe, highlighted `search_snippet`.
+    """
+    def __init__(self, query, queryset=None):
+        self.query = query
+        self.queryset = Video.objects.all() if queryset is None else queryset
+        self._count = None
+        if _is_postgresql():
+            from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField
+
+            self._ts_query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+            document = RawSQL('core_video.search_document', (), output_field=SearchVectorField())
+            self.matches = (
+                self.queryset.alias(document=document).filter(document=self._ts_query)
+                .annotate(search_rank=SearchRank(document, self._ts_query))
+                .order_by('-search_rank', '-uploaded_at')
+            )
+        else:
+            self._fts_query = _fts_query(query)
+            if self._fts_query:
+                self.matches = self.queryset.extra(
+                    tables=[FTS_TABLE],
+                    where=[f'{FTS_TABLE}.rowid = core_video.id', f'{FTS_TABLE} MATCH %s'],
+                    params=[self._fts_query],
+                    # bm25 is lower for better matches; title and tag hits count for more
+                    select={'search_rank': f'bm25({FTS_TABLE}, 10.0, 5.0, 1.0)'},
+                ).order_by('search_rank', '-uploaded_at')
+            else:
+                self.matches = self.queryset.none()
+
+    def count(self):
+        if self._count is None:
+            self._count = self.matches.count()
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        videos = list(self.matches[index])
+        snippets = self._snippets([video.pk for video in videos])
+        for video in videos:
+            video.search_snippet = _highlight(snippets.get(video.pk) or video.description[:200])
+        return videos
+
+    def _snippets(self, pks):
+        if not pks:
+            return {}
+        if _is_postgresql():
+            from django.contrib.postgres.search import SearchHeadline
+
+            headline = SearchHeadline(
+                'description', self._ts_query, config=SEARCH_CONFIG, start_sel=MATCH_START, stop_sel=MATCH_STOP,
+                max_words=SNIPPET_WORDS, min_words=SNIPPET_WORDS // 2,
+            )
+            return dict(Video.objects.filter(pk__in=pks).annotate(snippet=headline).values_list('pk', 'snippet'))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, snippet({FTS_TABLE}, 2, %s, %s, '…', %s) FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s AND rowid IN ({', '.join(['%s'] * len(pks))})",
+                [MATCH_START, MATCH_STOP, SNIPPET_WORDS, self._fts_query, *pks],
+            )
+            return dict(cursor.fetchall())
+
+
+def search_videos(query, queryset=None):
+    """Videos matching `query` (optionally within `queryset`), best match first; see SearchResults."""
+    return SearchResults(query.strip(), queryset)
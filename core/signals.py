@@ -0,0 +1,238 @@
+# core/signals.py
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .avatars import release_avatar_variants
+from .blobs import release_video_assets
+from . import caching, live_comments, notifications, rollups
+from .models import Comment, Feedback, Notification, NotificationBroadcast, Tag, UserProfile, Video
+from .search import SEARCHED_FIELDS, ensure_search_index, index_videos, unindex_video
+from .tagging import adjust_video_counts, invalidate_tag_cloud
+
+
+@receiver(post_delete, sender=Video)
+def release_deleted_video_assets(sender, instance, **kwargs):
+    # Blobs and derived assets may be shared with duplicate uploads
+    release_video_assets(instance)
+
+
+@receiver(post_save, sender=Video)
+def index_saved_video(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or SEARCHED_FIELDS.intersection(update_fields):
+        index_videos([instance])
+
+
+@receiver(post_delete, sender=Video)
+def unindex_deleted_video(sender, instance, **kwargs):
+    unindex_video(instance.pk)
+
+
+@receiver(post_migrate)
+def create_search_index(sender, app_config=None, **kwargs):
+    # The full-text index lives outside the ORM's tables (see core/search.py)
+    if app_config is not None and app_config.name == 'core':
+        ensure_search_index()
+
+
+@receiver(post_delete, sender=UserProfile)
+def release_deleted_avatar_variants(sender, instance, **kwargs):
+    release_avatar_variants(instance.avatar_variants)
+
+
+
+@receiver(m2m_changed, sender=Video.likes.through)
+def recount_likes(sender, instance, action, reverse, pk_set, **kwargs):
+    # Likes changed through the M2M manager (Django admin, user.liked_videos...);
+    # Video.toggle_like maintains the count itself.
+    if action == 'pre_clear' and reverse:
+        instance._cleared_like_video_ids = list(instance.liked_videos.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        pks = [instance.pk]
+    elif action == 'post_clear':
+        pks = getattr(instance, '_cleared_like_video_ids', [])
+    else:
+        pks = pk_set
+    before = dict(Video.objects.filter(pk__in=pks).values_list('pk', 'likes_count'))
+    Video.objects.filter(pk__in=pks).update(likes_count=Video.counted_likes())
+    after = Video.objects.filter(pk__in=pks).values_list('pk', 'likes_count')
+    rollups.record_likes({pk: count - before.get(pk, 0) for pk, count in after})
+    caching.bump(*[caching.video_key(pk) for pk in pks])
+
+
+@receiver(pre_delete, sender=User)
+def uncount_deleted_user_likes(sender, instance, **kwargs):
+    # The cascade removes the user's likes without m2m_changed
+    pks = list(instance.liked_videos.values_list('pk', flat=True))
+    if not pks:
+        return
+    Video.objects.filter(pk__in=pks, likes_count__gt=0).update(likes_count=F('likes_count') - 1)
+    rollups.record_likes({pk: -1 for pk in pks})
+    caching.bump(*[caching.video_key(pk) for pk in pks])
+
+
+@receiver(m2m_changed, sender=Video.tags.through)
+def count_tagged_videos(sender, instance, action, reverse, pk_set, **kwargs):
+    # Keeps Tag.video_count in step with Video.tags (set_video_tags and the Django admin)
+    if action == 'pre_clear':
+        related = instance.videos if reverse else instance.tags
+        instance._cleared_tag_links = list(related.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    pks = instance._cleared_tag_links if action == 'post_clear' else pk_set
+    sign = 1 if action == 'post_add' else -1
+    if reverse: # tag.videos.add(...) and friends
+        adjust_video_counts({instance.pk: sign * len(pks)})
+    else:
+        adjust_video_counts({pk: sign for pk in pks})
+
+
+@receiver(pre_delete, sender=Video)
+def uncount_deleted_video_tags(sender, instance, **kwargs):
+    # The cascade removes the through rows without m2m_changed
+    adjust_video_counts({pk: -1 for pk in instance.tags.values_list('pk', flat=True)})
+
+
+# --- Dashboard rollups (core/rollups.py) ---
+
+@receiver(post_save, sender=User)
+def count_new_user(sender, instance, created, **kwargs):
+    if created:
+        rollups.record_site(timezone.localdate(instance.date_joined), users=1)
+
+
+@receiver(post_delete, sender=User)
+def uncount_deleted_user(sender, instance, **kwargs):
+    rollups.record_site(timezone.localdate(instance.date_joined), users=-1)
+
+
+@receiver(post_save, sender=Video)
+def count_new_video(sender, instance, created, **kwargs):
+    if created:
+        rollups.record_uploads([instance])
+
+
+@receiver(pre_delete, sender=Video)
+def forget_deleted_video_stats(sender, instance, **kwargs):
+    rollups.forget_video(instance)
+
+
+@receiver(post_delete, sender=Video)
+def uncount_deleted_video(sender, instance, **kwargs):
+    rollups.record_uploads([instance], delta=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        rollups.record_comment(instance, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_deleted_comment(sender, instance, **kwargs):
+    rollups.record_comment(instance, -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_video_comment(sender, instance, created, **kwargs):
+    if created:
+        Video.objects.filter(pk=instance.video_id).update(comments_count=F('comments_count') + 1)
+
+
+@receiver(post_save, sender=Comment)
+def stream_new_comment(sender, instance, created, **kwargs):
+    # To the viewers of the video's open pages (core/live_comments.py)
+    if created:
+        transaction.on_commit(lambda: live_comments.publish(instance))
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_video_comment(sender, instance, **kwargs):
+    Video.objects.filter(pk=instance.video_id, comments_count__gt=0).update(comments_count=F('comments_count') - 1)
+
+
+@receiver(pre_save, sender=Feedback)
+def remember_feedback_read_state(sender, instance, **kwargs):
+    instance._was_read = Feedback.objects.filter(pk=instance.pk).values_list('is_read', flat=True).first() if instance.pk else None
+
+
+@receiver(post_save, sender=Feedback)
+def count_feedback(sender, instance, created, **kwargs):
+    if created:
+        rollups.record_site(timezone.localdate(instance.created_at), feedback=1, unread_feedback=0 if instance.is_read else 1)
+    elif instance._was_read is not None and instance._was_read != instance.is_read:
+        rollups.record_feedback_read([instance], instance.is_read)
+
+
+@receiver(post_delete, sender=Feedback)
+def uncount_deleted_feedback(sender, instance, **kwargs):
+    rollups.record_site(timezone.localdate(instance.created_at), feedback=-1, unread_feedback=0 if instance.is_read else -1)
+
+
+# --- Page and fragment cache invalidation (core/caching.py) ---
+
+@receiver(post_save, sender=Video)
+def invalidate_saved_video(sender, instance, created, **kwargs):
+    if created:
+        caching.bump(caching.video_key(instance.pk), caching.LISTING)
+    else:
+        caching.bump(caching.video_key(instance.pk))
+    caching.bump_catalog()
+
+
+@receiver(post_delete, sender=Video)
+def invalidate_deleted_video(sender, instance, **kwargs):
+    caching.bump(caching.video_key(instance.pk), caching.LISTING)
+    caching.bump_catalog()
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comments(sender, instance, **kwargs):
+    caching.bump(caching.comments_key(instance.video_id))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_renamed_tag(sender, instance, **kwargs):
+    invalidate_tag_cloud()
+
+
+# --- Version stamps for conditional GETs (core/conditional.py) ---
+
+@receiver(post_save, sender=Comment)
+def touch_commented_video(sender, instance, created, **kwargs):
+    if not created: # New and deleted comments change comments_count, which stamps the video
+        Video.objects.filter(pk=instance.video_id).touch()
+
+
+@receiver(post_save, sender=Tag)
+def touch_renamed_tag_videos(sender, instance, created, **kwargs):
+    if not created:
+        Video.objects.filter(tags=instance).touch()
+
+
+@receiver(pre_delete, sender=Tag)
+def touch_deleted_tag_videos(sender, instance, **kwargs):
+    # Before the cascade removes the links
+    Video.objects.filter(tags=instance).touch()
+
+# --- Cached unread notification counts (core/notifications.py) ---
+
+@receiver(post_save, sender=Notification)
+def invalidate_unread_count(sender, instance, **kwargs):
+    notifications.invalidate_unread(instance.user_id)
+
+
+@receiver(post_save, sender=NotificationBroadcast)
+@receiver(post_delete, sender=NotificationBroadcast)
+def invalidate_broadcast_counts(sender, instance, **kwargs):
+    # Every user's count may change; after commit, so no one recounts without the new rows
+    transaction.on_commit(lambda: caching.bump(notifications.BROADCASTS))
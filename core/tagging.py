@@ -0,0 +1,118 @@
+# core/tagging.py
+"""
+Normalized video tags.
+
+Video.tags relates videos to Tag rows, which are matched on their unique,
+indexed slug, so "GIS" and "gis" are one tag and filtering by tag is an
+exact index lookup. Video.tags_text keeps the names as typed for display.
+
+Tag.video_count is kept up to date incrementally: by the m2m_changed and
+pre_delete receivers in core/signals.py, and by bulk_set_tags for rows
+inserted in bulk. The tag cloud shown on the listing pages is cached until
+one of those counts changes.
+"""
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.text import slugify
+
+from . import caching
+from .models import Tag, Video
+from .search import index_videos
+
+TAG_CLOUD_CACHE_KEY = 'tags:cloud'
+TAG_NAME_MAX_LENGTH = Tag._meta.get_field('name').max_length
+
+
+def parse_tags(text):
+    """The distinct tag names in a comma-separated string, first spelling wins."""
+    names = {}
+    for name in (text or '').split(','):
+        name = name.strip()[:TAG_NAME_MAX_LENGTH]
+        slug = slugify(name)
+        if slug and slug not in names:
+            names[slug] = name
+    return names
+
+
+def tags_text(text):
+    """The normalized comma-separated form of `text` kept in Video.tags_text."""
+    return ', '.join(parse_tags(text).values())
+
+
+def get_or_create_tags(names):
+    """{slug: Tag} for a {slug: name} mapping, creating missing tags in one INSERT."""
+    tags = {tag.slug: tag for tag in Tag.objects.filter(slug__in=names)}
+    missing = [Tag(name=name, slug=slug) for slug, name in names.items() if slug not in tags]
+    if missing:
+        Tag.objects.bulk_create(missing, ignore_conflicts=True) # Another request may create the same tag
+        tags.update((tag.slug, tag) for tag in Tag.objects.filter(slug__in=[tag.slug for tag in missing]))
+    return tags
+
+
+def set_video_tags(video, text):
+    names = parse_tags(text)
+    with transaction.atomic():
+        tags = get_or_create_tags(names)
+        video.tags_text = ', '.join(names.values())
+        Video.objects.filter(pk=video.pk).update(tags_text=video.tags_text)
+        index_videos([video])
+        caching.bump(caching.video_key(video.pk), caching.LISTING) # Card badges and ?tag= lists
+        video.tags.set(tags.values()) # Counts follow through the m2m_changed receiver
+
+
+def bulk_set_tags(videos_and_text):
+    """Tags freshly bulk-created videos: [(video, text), ...]. Through rows skip signals, so counts are adjusted here."""
+    parsed = [(video, parse_tags(text)) for video, text in videos_and_text]
+    all_names = {}
+    for _video, names in parsed:
+        for slug, name in names.items():
+            all_names.setdefault(slug, name)
+    with transaction.atomic():
+        tags = get_or_create_tags(all_names)
+        links = [
+            Video.tags.through(video_id=video.pk, tag_id=tags[slug].pk)
+            for video, names in parsed for slug in names
+        ]
+        Video.tags.through.objects.bulk_create(links, ignore_conflicts=True)
+        adjust_video_counts(Counter(link.tag_id for link in links))
+        caching.bump(caching.LISTING)
+        caching.bump_catalog() # The videos themselves were bulk-created, without save()
+
+
+def adjust_video_counts(deltas):
+    """Applies {tag pk: change} to Tag.video_count with one UPDATE per distinct change."""
+    by_delta = {}
+    for pk, delta in deltas.items():
+        if delta:
+            by_delta.setdefault(delta, []).append(pk)
+    for delta, pks in by_delta.items():
+        Tag.objects.filter(pk__in=pks).update(video_count=F('video_count') + delta)
+    if by_delta:
+        invalidate_tag_cloud()
+
+
+def recount_tags():
+    """Recomputes every Tag.video_count from the through table."""
+    Tag.objects.update(video_count=Coalesce(Subquery(
+        Video.tags.through.objects.filter(tag_id=OuterRef('pk'))
+        .values('tag_id').annotate(total=Count('pk')).values('total')
+    ), 0))
+    invalidate_tag_cloud()
+
+
+def tag_cloud():
+    cloud = cache.get(TAG_CLOUD_CACHE_KEY)
+    caching.record('tag_cloud', hit=cloud is not None)
+    if cloud is None:
+        cloud = list(Tag.objects.filter(video_count__gt=0).order_by('name').values('name', 'slug', 'video_count'))
+        cache.set(TAG_CLOUD_CACHE_KEY, cloud, None)
+    return cloud
+
+
+def invalidate_tag_cloud():
+    cache.delete(TAG_CLOUD_CACHE_KEY)
+    caching.bump(caching.TAG_CLOUD) # Rendered tag cloud fragments
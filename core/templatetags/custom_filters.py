@@ -1,4 +1,8 @@
 from django import template
+from django.conf import settings
+from django.templatetags.static import static
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
 
 register = template.Library()
 
@@ -7,4 +11,53 @@ def split_tags(tags_string):
     """Splits a comma-separated string of tags into a list."""
     if tags_string:
         return [tag.strip() for tag in tags_string.split(',') if tag.strip()]
-    return []
\ No newline at end of file
+    return []
+
+@register.simple_tag
+def avatar(user, variant, css_class=''):
+    """Renders `user`'s pre-sized avatar variant (see core/avatars.py), or a placeholder icon."""
+    profile = getattr(user, 'userprofile', None)
+    entry = profile.avatar(variant) if profile else None
+    if not entry:
+        return format_html('<i class="fas fa-user-circle avatar-placeholder {}" style="font-size: {}px;"></i>', css_class, settings.AVATAR_VARIANTS[variant])
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}">'
+        '<img src="{}" width="{}" height="{}" alt="{}" class="rounded-circle avatar {}" loading="lazy"></picture>',
+        entry['webp'], entry['jpeg'], entry['size'], entry['size'], user.username, css_class,
+    )
+
+
+# Grid cards are col-md-4 col-sm-6 inside the page container
+CARD_SIZES = '(min-width: 768px) 33vw, (min-width: 576px) 50vw, 100vw'
+
+
+@register.simple_tag
+def video_thumbnail(video, css_class='', sizes=CARD_SIZES):
+    """Renders a video's thumbnail as a responsive <picture> when variants exist, else a plain <img>."""
+    alt = f"{video.title} thumbnail"
+    if video.thumbnail_variants:
+        *modern, fallback = video.thumbnail_variants['formats']
+        smallest = video.thumbnail_variants['widths'][0] # For browsers without srcset support
+        return format_html(
+            '<picture>{}<img src="{}" srcset="{}" sizes="{}" class="{}" alt="{}" loading="lazy"></picture>',
+            format_html_join('', '<source type="image/{}" srcset="{}" sizes="{}">', (
+                (extension, video.thumbnail_srcset(extension), sizes) for extension in modern
+            )),
+            default_storage.url(f"{video.thumbnail_variants['prefix']}/{smallest}.{fallback}"),
+            video.thumbnail_srcset(fallback), sizes, css_class, alt,
+        )
+    if video.thumbnail:
+        return format_html('<img src="{}" class="{}" alt="{}" loading="lazy">', video.thumbnail.url, css_class, alt)
+    return format_html('<img src="{}" class="{}" alt="Default thumbnail">', static('core/img/default_video_thumbnail.jpg'), css_class)
+
+
+@register.simple_tag(takes_context=True)
+def query_transform(context, **changes):
+    """The current query string with `changes` applied (None removes a key), e.g. ?{% query_transform cursor=page_obj.next_cursor %}."""
+    query = context['request'].GET.copy()
+    for key, value in changes.items():
+        if value is None:
+            query.pop(key, None)
+        else:
+            query[key] = value
+    return query.urlencode()
@@ -0,0 +1,845 @@
+# core/tests.py
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import counters, jobs, notifications, tagging, uploads
+from .media_serving import serve_media
+from .pagination import KeysetPaginator
+from .models import Job, Notification, NotificationBroadcast, Tag, UploadSession, Video
+
+try:
+    import moto
+except ImportError:
+    moto = None
+
+
+class RangeMediaServingTests(SimpleTestCase):
+    FILE_SIZE = 8 * 1024 * 1024 + 123 # Spans many read blocks and ends mid-block
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(cls.media_root, 'videos'))
+        cls.path = os.path.join(cls.media_root, 'videos', 'lecture.mp4')
+        # Position-dependent bytes so an off-by-one slice cannot pass
+        pattern = bytes(range(251)) * (cls.FILE_SIZE // 251 + 1)
+        cls.data = pattern[:cls.FILE_SIZE]
+        with open(cls.path, 'wb') as f:
+            f.write(cls.data)
+        cls.settings_override = override_settings(
+            MEDIA_ROOT=cls.media_root,
+            MEDIA_ACCEL_REDIRECT_PREFIX='',
+            MEDIA_SENDFILE_HEADER='',
+        )
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        shutil.rmtree(cls.media_root)
+        super().tearDownClass()
+
+    def get(self, path='videos/lecture.mp4', **headers):
+        request = RequestFactory().get(f'/media/{path}', **headers)
+        return serve_media(request, path)
+
+    def body(self, response):
+        try:
+            return b''.join(response.streaming_content)
+        finally:
+            response.close()
+
+    def test_full_response_advertises_ranges(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(int(response['Content-Length']), self.FILE_SIZE)
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+        self.assertEqual(self.body(response), self.data)
+
+    def test_partial_reads(self):
+        cases = {
+            'bytes=0-0': (0, 0),
+            'bytes=0-99': (0, 99),
+            'bytes=4194300-4194399': (4194300, 4194399), # Straddles a read block
+            'bytes=8000000-': (8000000, self.FILE_SIZE - 1),
+            'bytes=-500': (self.FILE_SIZE - 500, self.FILE_SIZE - 1),
+            f'bytes=100-{self.FILE_SIZE * 2}': (100, self.FILE_SIZE - 1), # End clamped
+        }
+        for header, (start, end) in cases.items():
+            with self.subTest(range=header):
+                response = self.get(HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response['Content-Range'], f'bytes {start}-{end}/{self.FILE_SIZE}')
+                self.assertEqual(int(response['Content-Length']), end - start + 1)
+                self.assertEqual(self.body(response), self.data[start:end + 1])
+
+    def test_ranged_file_exposes_positioned_descriptor_for_sendfile(self):
+        response = self.get(HTTP_RANGE='bytes=1000-1999')
+        try:
+            fileno = response.file_to_stream.fileno()
+            self.assertEqual(os.lseek(fileno, 0, os.SEEK_CUR), 1000)
+        finally:
+            response.close()
+
+    def test_unsatisfiable_range(self):
+        response = self.get(HTTP_RANGE=f'bytes={self.FILE_SIZE}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{self.FILE_SIZE}')
+
+    def test_multi_range_falls_back_to_full_body(self):
+        response = self.get(HTTP_RANGE='bytes=0-1,5-6')
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+    def test_if_range(self):
+        etag = self.get()['ETag']
+        response = self.get(HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.body(response), self.data[10:20])
+
+        # A stale validator means the client's cached bytes are useless: send everything
+        response = self.get(HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.body(response)), self.FILE_SIZE)
+
+    def test_if_none_match(self):
+        etag = self.get()['ETag']
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_rejects_paths_outside_served_dirs(self):
+        from django.http import Http404
+        for path in ('profile_pics/a.jpg', 'videos/../../etc/passwd', 'videos/missing.mp4'):
+            with self.subTest(path=path), self.assertRaises(Http404):
+                self.get(path)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/')
+    def test_accel_redirect_handoff(self):
+        response = self.get(HTTP_RANGE='bytes=0-99')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/videos/lecture.mp4')
+        self.assertEqual(response.content, b'')
+
+
+class ChunkedUploadTests(TestCase):
+    """The resumable upload protocol of core/uploads.py, through its views."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        settings_override = override_settings(
+            MEDIA_ROOT=os.path.join(self.tmp, 'media'),
+            CHUNKED_UPLOAD_DIR=os.path.join(self.tmp, 'staging'),
+            CHUNKED_UPLOAD_CHUNK_SIZE=4,
+            CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.admin = User.objects.create_user('admin', password='x', is_staff=True)
+        self.client.force_login(self.admin)
+        self.data = b'0123456789'
+
+    def start(self):
+        response = self.client.post(reverse('admin_chunked_upload_start'), {
+            'title': 'Field survey', 'description': 'Drone footage', 'tags': 'GIS',
+            'filename': 'survey.mp4', 'size': len(self.data),
+        })
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def patch(self, upload, offset, data):
+        return self.client.generic(
+            'PATCH', upload['upload_url'], data, content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def upload_all(self, upload, start=0):
+        for offset in range(start, len(self.data), 4):
+            self.assertEqual(self.patch(upload, offset, self.data[offset:offset + 4]).status_code, 200)
+
+    def finalize(self, upload):
+        return self.client.post(upload['finalize_url'])
+
+    def test_out_of_order_chunks_and_resume_after_short_write(self):
+        upload = self.start()
+        response = self.patch(upload, 4, self.data[4:8])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Upload-Offset'], '0')
+        self.assertEqual(self.patch(upload, 0, self.data[:5]).status_code, 413)
+        self.assertEqual(self.patch(upload, 0, self.data[:4]).status_code, 200)
+
+        # The connection drops two bytes into the next chunk: they are staged, but the offset stays put
+        session = UploadSession.objects.get(pk=upload['upload_id'])
+        with self.assertRaises(uploads.UploadError):
+            uploads.append_chunk(session, 4, io.BytesIO(b'xx'), 4)
+        self.assertEqual(self.client.get(upload['upload_url'])['Upload-Offset'], '4')
+
+        # Resuming at the recorded offset overwrites the partial bytes
+        self.assertEqual(self.patch(upload, 4, self.data[4:8]).json()['offset'], 8)
+        self.assertEqual(self.patch(upload, 8, self.data[8:]).json()['offset'], 10)
+        with open(uploads.staging_path(session), 'rb') as staged:
+            self.assertEqual(staged.read(), self.data)
+
+    def test_finalize_is_idempotent(self):
+        upload = self.start()
+        self.patch(upload, 0, self.data[:4])
+        self.assertEqual(self.finalize(upload).status_code, 409) # Not all there yet
+        self.upload_all(upload, start=4)
+
+        first = self.finalize(upload)
+        self.assertEqual(first.status_code, 201)
+        retry = self.finalize(upload) # After a dropped response
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.json()['video_id'], first.json()['video_id'])
+
+        video = Video.objects.get()
+        self.assertEqual(video.tags_text, 'GIS')
+        self.assertEqual(Job.objects.get(video=video).kind, 'fingerprint') # Hashed by the job worker
+        with video.video_file.open('rb') as stored:
+            self.assertEqual(stored.read(), self.data)
+
+    def test_sweep_deletes_expired_sessions(self):
+        finished = self.start()
+        self.upload_all(finished)
+        self.finalize(finished)
+        abandoned = self.start()
+        self.patch(abandoned, 0, self.data[:4])
+        staged = uploads.staging_path(UploadSession.objects.get(pk=abandoned['upload_id']))
+
+        self.assertEqual(uploads.sweep_stale_uploads(), 0)
+        UploadSession.objects.update(updated_at=timezone.now() - timedelta(seconds=settings.CHUNKED_UPLOAD_EXPIRY + 1))
+        self.assertEqual(uploads.sweep_stale_uploads(), 2)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(os.path.exists(staged))
+        self.assertEqual(Video.objects.count(), 1) # The finalized upload's video stays
+        self.assertEqual(self.finalize(finished).status_code, 404)
+
+
+@unittest.skipIf(moto is None, "moto is not installed")
+@override_settings(
+    STORAGES={
+        'default': {'BACKEND': 'storages.backends.s3boto3.S3Boto3Storage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    },
+    AWS_STORAGE_BUCKET_NAME='video-hub-test',
+    AWS_S3_REGION_NAME='us-east-1',
+    AWS_ACCESS_KEY_ID='testing',
+    AWS_SECRET_ACCESS_KEY='testing',
+    AWS_DEFAULT_ACL=None,
+    DIRECT_UPLOADS=True,
+    DIRECT_UPLOAD_PART_SIZE=5 * 1024 * 1024,
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+)
+class DirectUploadTests(TestCase):
+    """Presigned multipart uploads against moto's in-process S3."""
+
+    def setUp(self):
+        self.aws = moto.mock_aws()
+        self.aws.start()
+        self.addCleanup(self.aws.stop)
+        import boto3
+        self.s3 = boto3.client('s3', region_name='us-east-1')
+        self.s3.create_bucket(Bucket='video-hub-test')
+        self.admin = User.objects.create_user('admin', password='x', is_staff=True)
+        self.client.force_login(self.admin)
+        self.data = os.urandom(5 * 1024 * 1024) + b'tail'
+
+    def start(self):
+        response = self.client.post(reverse('admin_direct_upload_start'), {
+            'title': 'Field survey', 'description': 'Drone footage', 'tags': 'GIS',
+            'filename': 'survey.mp4', 'size': len(self.data),
+        })
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def upload_parts(self, session, numbers):
+        response = self.client.post(session['parts_url'], json.dumps({'part_numbers': numbers}), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        urls = response.json()['urls']
+        upload = UploadSession.objects.get(pk=session['upload_id'])
+        etags = {}
+        for number in numbers:
+            self.assertIn('Signature=', urls[str(number)])
+            start = (number - 1) * session['part_size']
+            # What the browser PUTs to the presigned URL
+            etags[number] = self.s3.upload_part(
+                Bucket='video-hub-test', Key=upload.storage_name, UploadId=upload.multipart_id,
+                PartNumber=number, Body=self.data[start:start + session['part_size']],
+            )['ETag']
+        return etags
+
+    def test_parts_upload_complete_and_fingerprint(self):
+        session = self.start()
+        self.assertEqual(session['part_count'], 2)
+        etags = self.upload_parts(session, [1])
+
+        # Resuming lists what the bucket already has
+        listed = self.client.get(session['parts_url']).json()['parts']
+        self.assertEqual([part['PartNumber'] for part in listed], [1])
+        etags.update(self.upload_parts(session, [2]))
+
+        response = self.client.post(session['complete_url'], json.dumps({
+            'parts': [{'PartNumber': number, 'ETag': etag} for number, etag in etags.items()],
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        video = Video.objects.get(pk=response.json()['video_id'])
+        self.assertTrue(video.video_file.name.startswith('videos/incoming/'))
+        self.assertEqual(UploadSession.objects.get().video, video) # Kept for retries until swept
+
+        # A retry after a dropped response learns the same video
+        retry = self.client.post(session['complete_url'], json.dumps({
+            'parts': [{'PartNumber': number, 'ETag': etag} for number, etag in etags.items()],
+        }), content_type='application/json')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.json()['video_id'], video.pk)
+        self.assertEqual(Video.objects.count(), 1)
+
+        job = Job.objects.get(video=video)
+        self.assertEqual(job.kind, 'fingerprint')
+
+        from .blobs import fingerprint_job
+        fingerprint_job(job)
+        video.refresh_from_db()
+        self.assertEqual(len(video.content_hash), 64)
+        self.assertTrue(video.video_file.name.startswith('videos/sha256/'))
+        body = self.s3.get_object(Bucket='video-hub-test', Key=video.video_file.name)['Body'].read()
+        self.assertEqual(body, self.data)
+        self.assertIn('probe', Job.objects.filter(video=video).values_list('kind', flat=True))
+
+    def test_incomplete_parts_are_rejected_and_abort_cleans_up(self):
+        session = self.start()
+        etags = self.upload_parts(session, [1])
+        response = self.client.post(session['complete_url'], json.dumps({
+            'parts': [{'PartNumber': 1, 'ETag': etags[1]}],
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Video.objects.exists())
+
+        self.assertEqual(self.client.post(session['abort_url']).status_code, 200)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(self.s3.list_multipart_uploads(Bucket='video-hub-test').get('Uploads', []), [])
+
+    @override_settings(DIRECT_UPLOADS=False)
+    def test_disabled_falls_back_to_form_post(self):
+        response = self.client.get(reverse('admin_video_upload'))
+        self.assertNotContains(response, 'data-direct-start-url')
+        self.assertEqual(self.client.post(reverse('admin_direct_upload_start')).status_code, 404)
+
+
+def succeeding_job(job):
+    pass
+
+
+def failing_job(job):
+    raise RuntimeError("ffmpeg exited with status 1")
+
+
+@override_settings(
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    JOB_WORKER_NODE='node-a',
+    JOB_MAX_ATTEMPTS=2,
+)
+class JobQueueTests(TestCase):
+    """Claiming, retries and the per-node cap of core/jobs.py."""
+
+    def setUp(self):
+        handlers = mock.patch.dict(jobs.JOB_HANDLERS, {'probe': 'core.tests.succeeding_job', 'hls': 'core.tests.failing_job'})
+        handlers.start()
+        self.addCleanup(handlers.stop)
+
+    def test_claim_is_a_conditional_update(self):
+        first, second = jobs.enqueue('probe'), jobs.enqueue('probe')
+        later = jobs.enqueue('probe')
+        Job.objects.filter(pk=later.pk).update(run_after=timezone.now() + timedelta(hours=1))
+        claimed = jobs.claim('node-a:1:aaaa', 5)
+        self.assertEqual({job.pk for job in claimed}, {first.pk, second.pk}) # Not the one due later
+        self.assertEqual(jobs.claim('node-b:1:bbbb', 5), []) # Already running
+        self.assertEqual(set(Job.objects.filter(locked_by='node-a:1:aaaa').values_list('status', flat=True)), {Job.STATUS_RUNNING})
+
+    def test_failures_back_off_then_fail(self):
+        self.assertEqual([jobs.retry_delay(n) for n in (1, 2, 3)], [30, 60, 120])
+        with override_settings(JOB_RETRY_BACKOFF_MAX=45):
+            self.assertEqual(jobs.retry_delay(3), 45)
+
+        job = jobs.enqueue('hls')
+        before = timezone.now()
+        with self.assertLogs('core.jobs', 'WARNING'):
+            self.assertEqual(jobs.run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.locked_by), (Job.STATUS_QUEUED, 1, ''))
+        self.assertIn('ffmpeg exited', job.last_error)
+        self.assertGreaterEqual(job.run_after, before + timedelta(seconds=30))
+        self.assertEqual(jobs.run_pending(), 0) # Not due yet
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        with self.assertLogs('core.jobs', 'ERROR'):
+            jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.STATUS_FAILED, 2))
+
+    def test_node_cap_counts_every_process_on_the_node(self):
+        # Another live worker process on this node holds the only slot
+        Job.objects.create(kind='probe', status=Job.STATUS_RUNNING, locked_by='node-a:4242:cafe', locked_at=timezone.now(), heartbeat_at=timezone.now())
+        job = jobs.enqueue('probe')
+        self.assertEqual(jobs.run_pending(concurrency=1), 0)
+        self.assertEqual(jobs.run_pending(node='node-b', concurrency=1), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_DONE)
+
+    def test_jobs_of_a_dead_process_are_requeued(self):
+        stale = timezone.now() - timedelta(seconds=settings.JOB_LOCK_TIMEOUT + 1)
+        orphan = Job.objects.create(kind='probe', status=Job.STATUS_RUNNING, locked_by='node-a:4242:cafe', locked_at=stale, heartbeat_at=stale)
+        live = Job.objects.create(kind='probe', status=Job.STATUS_RUNNING, locked_by='node-a:4343:beef', locked_at=stale, heartbeat_at=timezone.now())
+        self.assertEqual(jobs.requeue_stale(), 1)
+        orphan.refresh_from_db()
+        self.assertEqual((orphan.status, orphan.locked_by), (Job.STATUS_QUEUED, ''))
+
+        # The freed slot is this process's to take
+        self.assertEqual(jobs.run_pending(concurrency=2), 1)
+        orphan.refresh_from_db()
+        live.refresh_from_db()
+        self.assertEqual((orphan.status, live.status), (Job.STATUS_DONE, Job.STATUS_RUNNING))
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class ViewCounterTests(TestCase):
+    """Buffered view counts and their flush (core/counters.py)."""
+
+    def setUp(self):
+        store = mock.patch.object(counters, '_store', counters.LocalCounterStore())
+        store.start()
+        self.addCleanup(store.stop)
+        admin = User.objects.create_user('admin')
+        self.video = Video.objects.create(admin=admin, title='Coastal erosion', description='d', video_type='link', video_url='https://example.com/coast')
+
+    def views(self):
+        return Video.objects.values_list('views', flat=True).get(pk=self.video.pk)
+
+    def test_sessions_are_counted_once(self):
+        self.assertTrue(counters.record_view(self.video.pk, 'session-1'))
+        self.assertFalse(counters.record_view(self.video.pk, 'session-1'))
+        self.assertTrue(counters.record_view(self.video.pk, 'session-2'))
+        self.assertEqual(counters.pending_views(self.video.pk), 2)
+        self.assertEqual(self.views(), 0)
+
+    def test_failed_flush_keeps_the_views(self):
+        counters.record_view(self.video.pk, 'session-1')
+        counters.record_view(self.video.pk, 'session-2')
+        with mock.patch('core.rollups.record_views', side_effect=RuntimeError("database is locked")):
+            with self.assertRaises(RuntimeError):
+                counters.flush_view_counts()
+        self.assertEqual(self.views(), 0) # Rolled back with the rollups
+        self.assertEqual(counters.pending_views(self.video.pk), 2)
+
+        counters.record_view(self.video.pk, 'session-3') # Arrives between the two flushes
+        self.assertEqual(counters.flush_view_counts(), 3)
+        self.assertEqual(self.views(), 3)
+        self.assertEqual(counters.pending_views(self.video.pk), 0)
+
+    def test_one_flusher_at_a_time(self):
+        counters.record_view(self.video.pk, 'session-1')
+        store = counters.get_store()
+        self.assertTrue(store.acquire_flush_lock()) # Another process is flushing
+        self.assertEqual(counters.flush_view_counts(), 0)
+        store.release_flush_lock()
+        self.assertEqual(counters.flush_view_counts(), 1)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class TagCountTests(TestCase):
+    """Tag.video_count kept incrementally (core/tagging.py and the receivers in core/signals.py)."""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        admin = User.objects.create_user('admin')
+        self.first, self.second = [
+            Video.objects.create(admin=admin, title=title, description='d', video_type='link', video_url=f'https://example.com/{title}')
+            for title in ('Coastal erosion', 'Flood mapping')
+        ]
+
+    def counts(self):
+        return dict(Tag.objects.filter(video_count__gt=0).values_list('slug', 'video_count'))
+
+    def assertMatchesRecount(self):
+        counts = self.counts()
+        tagging.recount_tags()
+        self.assertEqual(self.counts(), counts)
+
+    def test_counts_follow_set_tags(self):
+        self.first.set_tags('GIS, Hydrology, gis')
+        self.second.set_tags(' gis ,')
+        self.assertEqual(self.counts(), {'gis': 2, 'hydrology': 1})
+        self.assertEqual(self.first.tags_text, 'GIS, Hydrology')
+
+        self.first.set_tags('Hydrology, Cartography')
+        self.assertEqual(self.counts(), {'gis': 1, 'hydrology': 1, 'cartography': 1})
+        self.assertMatchesRecount()
+
+    def test_counts_follow_deletes(self):
+        self.first.set_tags('GIS, Hydrology')
+        self.second.set_tags('GIS')
+        self.second.delete()
+        self.assertEqual(self.counts(), {'gis': 1, 'hydrology': 1})
+
+        self.first.tags.clear() # The Django admin and other m2m manager calls
+        self.assertEqual(self.counts(), {})
+        self.first.set_tags('GIS, Hydrology')
+        Tag.objects.get(slug='hydrology').delete()
+        self.assertEqual(list(self.first.tags.values_list('slug', flat=True)), ['gis'])
+        self.assertMatchesRecount()
+
+    def test_rename_refreshes_the_cached_cloud(self):
+        self.first.set_tags('Gis')
+        self.assertEqual(tagging.tag_cloud(), [{'name': 'Gis', 'slug': 'gis', 'video_count': 1}])
+        tag = Tag.objects.get(slug='gis')
+        tag.name = 'GIS'
+        tag.save()
+        self.assertEqual(tagging.tag_cloud(), [{'name': 'GIS', 'slug': 'gis', 'video_count': 1}])
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class KeysetPaginationTests(TestCase):
+    """Cursor pages over ('-uploaded_at', '-id') (core/pagination.py)."""
+
+    def setUp(self):
+        admin = User.objects.create_user('admin')
+        for n in range(7):
+            Video.objects.create(admin=admin, title=f'Survey {n}', description='d', video_type='link', video_url=f'https://example.com/{n}')
+        # Ties on uploaded_at across page boundaries, and a timestamp that only differs in microseconds
+        tie = timezone.now().replace(microsecond=123456)
+        pks = list(Video.objects.order_by('pk').values_list('pk', flat=True))
+        Video.objects.filter(pk__in=pks[1:5]).update(uploaded_at=tie)
+        Video.objects.filter(pk=pks[5]).update(uploaded_at=tie + timedelta(microseconds=1))
+        self.expected = list(Video.objects.order_by('-uploaded_at', '-id').values_list('pk', flat=True))
+        self.paginator = KeysetPaginator(Video.objects.all(), per_page=2)
+
+    def test_pages_forward_and_back_cover_every_row_once(self):
+        pages, page = [], self.paginator.page()
+        self.assertFalse(page.has_previous())
+        while True:
+            pages.append([video.pk for video in page])
+            if not page.has_next():
+                break
+            page = self.paginator.page(page.next_cursor)
+        self.assertEqual([pk for rows in pages for pk in rows], self.expected)
+        self.assertEqual([len(rows) for rows in pages], [2, 2, 2, 1])
+
+        back = []
+        while page.has_previous():
+            page = self.paginator.page(page.previous_cursor)
+            back.append([video.pk for video in page])
+        self.assertEqual(back, pages[-2::-1])
+
+    def test_invalid_cursors_give_the_first_page(self):
+        first = [video.pk for video in self.paginator.page()]
+        for cursor in ('not-a-cursor', 'eyJ4IjoxfQ', KeysetPaginator(Video.objects.all(), 2, ordering=('-id',)).page().next_cursor):
+            self.assertEqual([video.pk for video in self.paginator.page(cursor)], first)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class NotificationTests(TestCase):
+    """Broadcast materialization and cached unread counts (core/notifications.py)."""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.admin = User.objects.create_user('admin', is_staff=True)
+        self.user = User.objects.create_user('viewer')
+
+    def broadcast(self, message):
+        with self.captureOnCommitCallbacks(execute=True): # The count invalidation waits for the commit
+            job = notifications.send(message, self.admin, {'segment': 'all'})
+        notifications.fanout_job(job)
+        return NotificationBroadcast.objects.get(pk=job.payload['broadcast_id'])
+
+    def test_broadcasts_are_materialized_once_per_user(self):
+        broadcast = self.broadcast("Maintenance tonight")
+        self.assertFalse(Notification.objects.exists()) # Stored once, not per user
+        late = User.objects.create_user('late', date_joined=broadcast.created_at + timedelta(seconds=1))
+
+        self.assertEqual(notifications.unread_count(self.user), 1)
+        self.assertEqual(notifications.unread_count(late), 0) # Joined after it was sent
+        row = Notification.objects.get(user=self.user)
+        self.assertEqual((row.broadcast, row.message, row.created_at), (broadcast, "Maintenance tonight", broadcast.created_at))
+        self.assertEqual(notifications.broadcast_notification_id(self.user, broadcast.pk), row.pk)
+        self.assertEqual(notifications.materialize_broadcasts(self.user), 0)
+
+        self.broadcast("Back online")
+        self.assertEqual(notifications.unread_count(self.user), 2)
+        self.assertEqual(Notification.objects.filter(user=self.user).count(), 2)
+
+    def test_unread_count_is_cached_and_kept_in_step(self):
+        self.assertEqual(notifications.unread_count(self.user), 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(notifications.unread_count(self.user), 0)
+
+        first = Notification.objects.create(user=self.user, message="Your video was processed")
+        Notification.objects.create(user=self.user, message="New comment")
+        self.broadcast("Maintenance tonight")
+        self.assertEqual(notifications.unread_count(self.user), 3)
+
+        self.assertEqual(notifications.mark_read(self.user, [first.pk]), 2)
+        self.assertEqual(notifications.mark_read(self.user, [first.pk]), 2) # Already read
+        self.assertEqual(notifications.mark_read(self.user), 0)
+        self.assertFalse(Notification.objects.filter(user=self.user, is_read=False).exists())
+        self.assertEqual(notifications.recent_unread(self.user), [])
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class ConditionalGetTests(TestCase):
+    """ETag revalidation of the catalog and video pages (core/conditional.py)."""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create_user('viewer', password='x')
+        self.video = Video.objects.create(
+            admin=self.user, title='Coastal erosion', description='Shoreline change', video_type='link',
+            video_url='https://example.com/coast', tags_text='GIS',
+        )
+        self.detail_url = reverse('video_detail', args=[self.video.slug])
+        self.likes_url = reverse('video_likes', args=[self.video.slug])
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_catalog_not_modified_costs_one_query(self):
+        first = self.client.get(reverse('home'))
+        self.assertEqual(first.status_code, 200)
+        self.assertNotIn('Last-Modified', first) # View flushes do not move updated_at
+        with self.assertNumQueries(0): # The catalog token comes from the cache; no rendering, no page cache
+            response = self.revalidate(reverse('home'), first)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], first['ETag'])
+
+        # Another page of the catalog has its own validator
+        self.assertEqual(self.revalidate(reverse('home') + '?tag=gis', first).status_code, 200)
+
+    def test_video_page_not_modified_skips_rendering(self):
+        self.client.force_login(self.user)
+        self.client.get(self.detail_url) # Sets the CSRF cookie, which is part of the ETag
+        first = self.client.get(self.detail_url)
+        self.assertEqual(first.status_code, 200)
+        # Session and user, the video stamp, and nothing else (the view is still counted in the buffer)
+        with self.assertNumQueries(3):
+            response = self.revalidate(self.detail_url, first)
+        self.assertEqual(response.status_code, 304)
+
+        likes = self.client.get(self.likes_url)
+        with self.assertNumQueries(3):
+            response = self.revalidate(self.likes_url, likes)
+        self.assertEqual(response.status_code, 304)
+
+    def test_writes_change_the_validators(self):
+        self.client.force_login(self.user)
+        self.client.get(self.detail_url)
+        home = self.client.get(reverse('home'))
+        detail = self.client.get(self.detail_url)
+        likes = self.client.get(self.likes_url)
+        self.assertEqual(likes.json(), {'liked': False, 'likes_count': 0})
+
+        self.client.post(reverse('like_video', args=[self.video.slug]))
+        response = self.revalidate(self.likes_url, likes)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'liked': True, 'likes_count': 1})
+        self.assertEqual(self.revalidate(self.detail_url, detail).status_code, 200)
+        self.assertEqual(self.revalidate(reverse('home'), home).status_code, 200)
+
+        detail = self.client.get(self.detail_url)
+        self.assertEqual(self.revalidate(self.detail_url, detail).status_code, 304)
+        self.video.comments.create(user=self.user, text='Great footage')
+        self.assertEqual(self.revalidate(self.detail_url, detail).status_code, 200)
+
+        home = self.client.get(reverse('home'))
+        self.video.set_tags('GIS, Hydrology')
+        self.assertEqual(self.revalidate(reverse('home'), home).status_code, 200)
+
+        # Flushed views change the cards and the video page without touching updated_at
+        from .counters import flush_view_counts
+
+        home = self.client.get(reverse('home'))
+        detail = self.client.get(self.detail_url)
+        visitor = self.client_class() # Another session, so the view counts
+        visitor.force_login(User.objects.create_user('visitor', password='x'))
+        visitor.get(self.detail_url)
+        flush_view_counts()
+        self.assertEqual(self.revalidate(reverse('home'), home).status_code, 200)
+        self.assertEqual(self.revalidate(self.detail_url, detail).status_code, 200)
+
+        # Deleting a video changes the catalog
+        Video.objects.create(admin=self.user, title='Old survey', description='d', video_type='link', video_url='https://example.com/old')
+        home = self.client.get(reverse('home'))
+        Video.objects.filter(title='Old survey').delete()
+        self.assertEqual(self.revalidate(reverse('home'), home).status_code, 200)
+
+    def test_validators_differ_per_user(self):
+        self.client.force_login(self.user)
+        detail = self.client.get(self.detail_url)
+        self.client.force_login(User.objects.create_user('other', password='x'))
+        self.assertEqual(self.revalidate(self.detail_url, detail).status_code, 200)
+
+
+@override_settings(
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    COMMENT_FANOUT_INTERVAL=0.1,
+)
+class LiveCommentTests(TransactionTestCase):
+    """Comments pushed to open video pages through the fan-out worker (core/live_comments.py)."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('viewer', password='x')
+        self.video = Video.objects.create(
+            admin=self.user, title='Live lecture', description='Q&A', video_type='link', video_url='https://example.com/live',
+        )
+        self.other = Video.objects.create(
+            admin=self.user, title='Other lecture', description='d', video_type='link', video_url='https://example.com/other',
+        )
+
+    def socket(self, slug, user):
+        # channels.testing needs daphne; the plain ASGI communicator is enough here
+        from asgiref.testing import ApplicationCommunicator
+        from channels.routing import URLRouter
+
+        from .routing import websocket_urlpatterns
+
+        path = f'/ws/videos/{slug}/comments/'
+        return ApplicationCommunicator(URLRouter(websocket_urlpatterns), {
+            'type': 'websocket', 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+            'headers': [], 'subprotocols': [], 'user': user,
+        })
+
+    async def connect(self, communicator):
+        await communicator.send_input({'type': 'websocket.connect'})
+        return (await communicator.receive_output(timeout=2))['type'] == 'websocket.accept'
+
+    def test_burst_is_coalesced_into_one_send_per_video(self):
+        # Published on commit by the post_save receiver
+        comments = [self.video.comments.create(user=self.user, text=f'Question {n}') for n in range(3)]
+        self.other.comments.create(user=self.user, text='Elsewhere')
+        async_to_sync(self.stream)([comment.pk for comment in comments], published=4)
+
+    async def stream(self, comment_ids, published):
+        from asgiref.testing import ApplicationCommunicator
+        from channels.layers import get_channel_layer
+        from django.conf import settings
+
+        from .consumers import CommentFanoutConsumer
+
+        viewer = self.socket(self.video.slug, self.user)
+        self.assertTrue(await self.connect(viewer))
+
+        fanout = ApplicationCommunicator(
+            CommentFanoutConsumer.as_asgi(), {'type': 'channel', 'channel': settings.COMMENT_FANOUT_CHANNEL},
+        )
+        channel_layer = get_channel_layer()
+        for _ in range(published): # What `runworker` would deliver
+            await fanout.send_input(await channel_layer.receive(settings.COMMENT_FANOUT_CHANNEL))
+
+        message = json.loads((await viewer.receive_output(timeout=2))['text'])
+        self.assertEqual(message['type'], 'comments')
+        self.assertEqual([comment['id'] for comment in message['comments']], comment_ids) # Oldest first
+        self.assertIn('Question 0', message['comments'][0]['html'])
+        self.assertEqual(message['comments_count'], 3)
+        # One send for the whole burst, and nothing from the other video
+        self.assertTrue(await viewer.receive_nothing(timeout=0.3))
+
+        await viewer.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await viewer.wait()
+        fanout.stop()
+
+    def test_anonymous_and_unknown_videos_are_refused(self):
+        async_to_sync(self.refused)()
+
+    async def refused(self):
+        from django.contrib.auth.models import AnonymousUser
+
+        for slug, user in ((self.video.slug, AnonymousUser()), ('no-such-video', self.user)):
+            self.assertFalse(await self.connect(self.socket(slug, user)))
+
+
+@override_settings(EXPORT_CHUNK_SIZE=2)
+class ExportTests(TestCase):
+    """Streamed admin data exports (core/exports.py)."""
+
+    def setUp(self):
+        self.admin = User.objects.create_user('admin', email='admin@example.com', password='x', is_staff=True)
+        for n in range(4):
+            User.objects.create_user(f'student{n}', email=f'student{n}@example.com')
+        self.video = Video.objects.create(
+            admin=self.admin, title='Coastal erosion', description='d', video_type='link', video_url='https://example.com/coast',
+        )
+        self.video.comments.create(user=self.admin, text='Great, "clear" footage')
+        self.client.force_login(self.admin)
+
+    def download(self, **params):
+        response = self.client.get(reverse('admin_export'), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_users_csv_keeps_its_columns_across_chunks(self):
+        response = self.client.get(reverse('admin_download_users_csv'))
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('filename="users_data.csv"', response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'ID,Username,Email,First Name,Last Name,Date Joined,Is Active,Is Staff,Is Superuser,Is Main Admin,Is Restricted Admin,Bio')
+        self.assertEqual(len(lines), 6) # Header and five users over three chunks
+        self.assertTrue(lines[1].startswith(f'{self.admin.pk},admin,admin@example.com,,,'))
+        self.assertTrue(lines[1].endswith(',Yes,Yes,No,No,No,'))
+
+    def test_jsonl_rows_and_gzip_round_trip(self):
+        import gzip
+
+        response, body = self.download(dataset='comments', format='jsonl')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        (row,) = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual(set(row), {'id', 'video', 'user', 'text', 'created_at'})
+        self.assertEqual((row['video'], row['user'], row['text']), (self.video.slug, 'admin', 'Great, "clear" footage'))
+
+        response, compressed = self.download(dataset='videos', format='jsonl', gzip='on')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('filename="videos_data.jsonl.gz"', response['Content-Disposition'])
+        (row,) = [json.loads(line) for line in gzip.decompress(compressed).decode().splitlines()]
+        self.assertEqual((row['title'], row['likes'], row['comments']), ('Coastal erosion', 0, 1))
+
+        response, compressed = self.download(dataset='users', format='csv', gzip='on')
+        self.assertEqual(len(gzip.decompress(compressed).decode().splitlines()), 6)
+
+    def test_date_range_is_inclusive_of_whole_days(self):
+        today = timezone.localdate()
+        User.objects.filter(username='student0').update(date_joined=timezone.now() - timedelta(days=10))
+
+        response, body = self.download(dataset='users', format='jsonl', since=today.isoformat(), until=today.isoformat())
+        usernames = {json.loads(line)['username'] for line in body.decode().splitlines()}
+        self.assertEqual(usernames, {'admin', 'student1', 'student2', 'student3'})
+
+        earlier = (today - timedelta(days=10)).isoformat()
+        response, body = self.download(dataset='users', format='jsonl', since=earlier, until=earlier)
+        self.assertEqual([json.loads(line)['username'] for line in body.decode().splitlines()], ['student0'])
+
+        response, body = self.download(dataset='users', format='csv', until=(today - timedelta(days=30)).isoformat())
+        self.assertEqual(body.decode().count('\n'), 1) # Only the header
+
+    def test_reversed_range_is_rejected(self):
+        today = timezone.localdate()
+        response = self.client.get(reverse('admin_export'), {
+            'dataset': 'users', 'format': 'csv', 'since': today.isoformat(), 'until': (today - timedelta(days=1)).isoformat(),
+        })
+        self.assertRedirects(response, reverse('admin_dashboard'), fetch_redirect_response=False)
@@ -0,0 +1,119 @@
+# core/transcode.py
+"""
+Adaptive-bitrate HLS renditions for file-type videos.
+
+Each rung of HLS_LADDER is encoded by its own ffmpeg process into
+MPEG-TS segments plus a media playlist; a master playlist then lists the
+rungs so players can switch bitrate as bandwidth changes.
+"""
+import os
+import subprocess
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+
+from .blobs import release_directory
+from .media import local_video_path, update_if_current
+
+MASTER_PLAYLIST = 'master.m3u8'
+
+# Caps concurrent ffmpeg processes for the whole worker, across all running jobs
+_ffmpeg_slots = threading.BoundedSemaphore(settings.HLS_MAX_PROCESSES)
+
+
+def _rendition_command(source, out_dir, rung):
+    name = f"{rung['height']}p"
+    video_bitrate = rung['video_bitrate']
+    return [
+        settings.FFMPEG_BINARY, '-nostdin', '-y', '-loglevel', 'error',
+        '-i', source,
+        '-map', '0:v:0', '-map', '0:a:0?', # Audio is optional (screen recordings often have none)
+        '-vf', f"scale=-2:{rung['height']}",
+        '-c:v', 'libx264', '-preset', 'veryfast', '-profile:v', 'main', '-pix_fmt', 'yuv420p',
+        '-b:v', video_bitrate, '-maxrate', video_bitrate, '-bufsize', video_bitrate,
+        # Keyframes on segment boundaries so every segment is independently decodable
+        '-force_key_frames', f"expr:gte(t,n_forced*{settings.HLS_SEGMENT_SECONDS})",
+        '-c:a', 'aac', '-b:a', rung['audio_bitrate'], '-ac', '2',
+        '-f', 'hls',
+        '-hls_time', str(settings.HLS_SEGMENT_SECONDS),
+        '-hls_playlist_type', 'vod',
+        '-hls_segment_filename', os.path.join(out_dir, f"{name}_%04d.ts"),
+        os.path.join(out_dir, f"{name}.m3u8"),
+    ]
+
+
+class TranscodeError(Exception):
+    pass
+
+
+def _encode_rendition(source, out_dir, rung):
+    with _ffmpeg_slots:
+        result = subprocess.run(_rendition_command(source, out_dir, rung), capture_output=True)
+    if result.returncode != 0:
+        raise TranscodeError(f"ffmpeg failed for {rung['height']}p: {result.stderr.decode(errors='replace')[-2000:]}")
+
+
+def _bits_per_second(bitrate):
+    """'1200k' -> 1200000"""
+    multipliers = {'k': 1000, 'm': 1000 * 1000}
+    suffix = bitrate[-1].lower()
+    if suffix in multipliers:
+        return int(float(bitrate[:-1]) * multipliers[suffix])
+    return int(bitrate)
+
+
+def master_playlist(rungs):
+    lines = ['#EXTM3U', '#EXT-X-VERSION:3']
+    for rung in rungs:
+        bandwidth = _bits_per_second(rung['video_bitrate']) + _bits_per_second(rung['audio_bitrate'])
+        lines.append(f"#EXT-X-STREAM-INF:BANDWIDTH={bandwidth}")
+        lines.append(f"{rung['height']}p.m3u8")
+    return '\n'.join(lines) + '\n'
+
+
+def transcode_hls(video):
+    """Encodes the HLS ladder for `video` and records the master playlist on it."""
+    from .models import Video
+
+    if not video.video_file:
+        return
+
+    rungs = list(settings.HLS_LADDER)
+    # Don't upscale: drop rungs taller than the probed source (keeping the smallest)
+    source_height = Video.objects.filter(pk=video.pk).values_list('height', flat=True).first()
+    if source_height:
+        rungs = [rung for rung in rungs if rung['height'] <= source_height] or rungs[:1]
+    # A fresh prefix per run keeps playlist-relative segment names stable
+    # even on storages that refuse to overwrite existing keys.
+    prefix = f"hls/{video.pk}/{uuid.uuid4().hex[:12]}"
+
+    with local_video_path(video.video_file) as source, tempfile.TemporaryDirectory() as out_dir:
+        with ThreadPoolExecutor(max_workers=len(rungs)) as pool:
+            futures = [pool.submit(_encode_rendition, source, out_dir, rung) for rung in rungs]
+            for future in futures:
+                future.result() # Re-raise the first ffmpeg failure so the job is retried
+
+        with open(os.path.join(out_dir, MASTER_PLAYLIST), 'w') as master:
+            master.write(master_playlist(rungs))
+
+        for name in sorted(os.listdir(out_dir)):
+            with open(os.path.join(out_dir, name), 'rb') as f:
+                default_storage.save(f"{prefix}/{name}", File(f))
+
+    previous = Video.objects.filter(pk=video.pk).values_list('hls_playlist', flat=True).first()
+    video.hls_playlist = f"{prefix}/{MASTER_PLAYLIST}"
+    if not update_if_current(video, hls_playlist=video.hls_playlist):
+        release_directory('hls_playlist', video.hls_playlist) # Renditions of a file the video no longer has
+        return
+    release_directory('hls_playlist', previous)
+
+
+# --- Job handlers (see JOB_HANDLERS in core/jobs.py) ---
+
+def hls_job(job):
+    transcode_hls(job.video)
@@ -0,0 +1,209 @@
+# core/uploads.py
+"""
+Resumable chunked uploads for admin_video_upload_view.
+(Direct-to-bucket uploads reuse UploadSession; see core/direct_uploads.py.)
+
+The protocol follows tus: the client opens an UploadSession, PATCHes raw
+chunks carrying an Upload-Offset header, asks for the current offset (HEAD)
+after a dropped connection, and finally asks for the staged file to be
+attached to a new Video. A finalized session records that Video and is
+swept later with the stale ones, so finalizing twice is harmless.
+
+Finalizing only moves the staged file into storage; like a direct upload,
+the fingerprint job then hashes it and moves it to its content address
+(see core/blobs.py), so the request never reads the whole file.
+"""
+import hashlib
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db import transaction
+from django.utils import timezone
+
+from .jobs import enqueue
+from .models import UploadSession, Video
+
+COPY_BUFFER_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    status = 400
+
+
+class OffsetMismatch(UploadError):
+    """The client's offset disagrees with what the server has stored."""
+    status = 409
+
+    def __init__(self, expected):
+        super().__init__(f"Expected offset {expected}.")
+        self.expected = expected
+
+
+class ChunkTooLarge(UploadError):
+    status = 413
+
+
+class StagedUpload(File):
+    """
+    A completed staging file handed to the storage backend.
+
+    Exposing temporary_file_path() lets FileSystemStorage move the file into
+    MEDIA_ROOT instead of copying it; other backends stream it via chunks().
+    Either way the video is never read into memory.
+    """
+    def __init__(self, path, name):
+        super().__init__(open(path, 'rb'), name=name)
+        self._path = path
+
+    def temporary_file_path(self):
+        return self._path
+
+
+def staging_path(session):
+    return os.path.join(settings.CHUNKED_UPLOAD_DIR, f"{session.pk}.part")
+
+
+def start_upload(admin, filename, size, title, description, tags):
+    sweep_stale_uploads()
+    os.makedirs(settings.CHUNKED_UPLOAD_DIR, exist_ok=True)
+    session = UploadSession.objects.create(
+        admin=admin, filename=os.path.basename(filename), size=size,
+        title=title, description=description, tags=tags,
+    )
+    open(staging_path(session), 'wb').close()
+    return session
+
+
+def append_chunk(session, offset, stream, length):
+    """Appends `length` bytes read from `stream` at `offset` and returns the new offset."""
+    if offset != session.offset:
+        raise OffsetMismatch(session.offset)
+    if length > settings.CHUNKED_UPLOAD_CHUNK_SIZE:
+        raise ChunkTooLarge(f"Chunks may be at most {settings.CHUNKED_UPLOAD_CHUNK_SIZE} bytes.")
+    if offset + length > session.size:
+        raise UploadError("Chunk runs past the announced upload size.")
+
+    path = staging_path(session)
+    with open(path, 'r+b') as staged:
+        # Drop any bytes a previous, interrupted request wrote past the recorded offset
+        staged.truncate(offset)
+        staged.seek(offset)
+        remaining = length
+        while remaining:
+            data = stream.read(min(COPY_BUFFER_SIZE, remaining))
+            if not data:
+                break
+            staged.write(data)
+            remaining -= len(data)
+    if remaining:
+        raise UploadError("Connection closed before the whole chunk arrived.")
+
+    new_offset = offset + length
+    # Guard against two requests racing on the same offset
+    updated = UploadSession.objects.filter(pk=session.pk, offset=offset).update(
+        offset=new_offset, updated_at=timezone.now(),
+    )
+    if not updated:
+        session.refresh_from_db(fields=['offset'])
+        raise OffsetMismatch(session.offset)
+    session.offset = new_offset
+    return new_offset
+
+
+def finalize_upload(session):
+    """
+    Attaches the fully staged file to a new Video. Idempotent: a retried or
+    concurrent call for the same session returns the Video the first one made.
+    """
+    path = staging_path(session)
+    with transaction.atomic():
+        # Concurrent finalizes queue up here; only the first finds the staging file still in place
+        session = UploadSession.objects.select_for_update().filter(pk=session.pk).first()
+        if session is None:
+            raise UploadError("This upload has expired; please start again.")
+        if session.video_id:
+            return session.video
+        if not session.is_complete:
+            raise OffsetMismatch(session.offset)
+        if not os.path.exists(path): # Finalized once, and that video has since been deleted
+            raise UploadError("This upload has already been used; please start again.")
+
+        staged = StagedUpload(path, session.filename)
+        try:
+            name = default_storage.save(f"videos/incoming/{session.pk.hex}{os.path.splitext(session.filename)[1].lower()}", staged)
+        finally:
+            staged.close()
+        video = Video(
+            admin=session.admin,
+            title=session.title,
+            description=session.description,
+            video_type='file',
+            video_file=name, # Already in storage, so save() neither stores nor processes it
+        )
+        video.save()
+        video.set_tags(session.tags)
+        enqueue('fingerprint', video=video)
+        session.video = video
+        session.save(update_fields=['video', 'updated_at'])
+    if os.path.exists(path):
+        os.remove(path)
+    return video
+
+
+def sweep_stale_uploads(now=None):
+    """
+    Deletes sessions (and their staging files) idle for longer than
+    CHUNKED_UPLOAD_EXPIRY, finalized ones included: by then no client is
+    still retrying its finalize or complete request.
+    """
+    cutoff = (now or timezone.now()) - timedelta(seconds=settings.CHUNKED_UPLOAD_EXPIRY)
+    stale = list(UploadSession.objects.filter(updated_at__lt=cutoff))
+    for session in stale:
+        if session.multipart_id:
+            from .direct_uploads import abort_direct_upload
+            abort_direct_upload(session) # Frees the parts already stored in the bucket
+            continue
+        path = staging_path(session)
+        if os.path.exists(path):
+            os.remove(path)
+    UploadSession.objects.filter(pk__in=[s.pk for s in stale]).delete()
+    return len(stale)
+
+
+# --- Upload handlers (FILE_UPLOAD_HANDLERS) ---
+
+class HashingUploadMixin:
+    """
+    Computes the SHA-256 of each uploaded file while the request streams in.
+
+    The digest is attached to the resulting UploadedFile as `.sha256`, so
+    content-addressed storage (core/blobs.py) never re-reads the upload.
+    Only the handler that actually keeps the data hashes it.
+    """
+    def new_file(self, *args, **kwargs):
+        self.sha256 = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        passed_on = super().receive_data_chunk(raw_data, start)
+        if passed_on is None:
+            self.sha256.update(raw_data)
+        return passed_on
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        if uploaded is not None:
+            uploaded.sha256 = self.sha256.hexdigest()
+        return uploaded
+
+
+class HashingMemoryFileUploadHandler(HashingUploadMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadMixin, TemporaryFileUploadHandler):
+    pass
@@ -14,27 +14,42 @@ urlpatterns = [
     path('dashboard/', views.user_dashboard_view, name='user_dashboard'),
     path('video/<slug:slug>/', views.video_detail_view, name='video_detail'),
     path('video/<slug:slug>/like/', views.like_video, name='like_video'), # AJAX endpoint
+    path('video/<slug:slug>/likes/', views.video_likes, name='video_likes'), # Like count (JSON, conditional GET)
+    path('video/<slug:slug>/comments/', views.video_comments, name='video_comments'), # Comment pages and AJAX posting (JSON)
     path('profile/update/', views.profile_update_view, name='profile_update'),
 
 
     # Admin Dashboard
     path('admin_dashboard/', views.admin_dashboard_view, name='admin_dashboard'),
+    path('admin_dashboard/charts/', views.admin_dashboard_charts, name='admin_dashboard_charts'),
     path('admin_dashboard/videos/', views.admin_video_list_view, name='admin_video_list'),
     path('admin_dashboard/videos/upload/', views.admin_video_upload_view, name='admin_video_upload'),
+    path('admin_dashboard/videos/upload/chunked/', views.admin_chunked_upload_start, name='admin_chunked_upload_start'),
+    path('admin_dashboard/videos/upload/chunked/<uuid:upload_id>/', views.admin_chunked_upload, name='admin_chunked_upload'),
+    path('admin_dashboard/videos/upload/chunked/<uuid:upload_id>/finalize/', views.admin_chunked_upload_finalize, name='admin_chunked_upload_finalize'),
+    path('admin_dashboard/videos/upload/direct/', views.admin_direct_upload_start, name='admin_direct_upload_start'),
+    path('admin_dashboard/videos/upload/direct/<uuid:upload_id>/parts/', views.admin_direct_upload_parts, name='admin_direct_upload_parts'),
+    path('admin_dashboard/videos/upload/direct/<uuid:upload_id>/complete/', views.admin_direct_upload_complete, name='admin_direct_upload_complete'),
+    path('admin_dashboard/videos/upload/direct/<uuid:upload_id>/abort/', views.admin_direct_upload_abort, name='admin_direct_upload_abort'),
     path('admin_dashboard/videos/edit/<int:pk>/', views.admin_video_edit_view, name='admin_video_edit'),
     path('admin_dashboard/videos/delete/<int:pk>/', views.admin_video_delete_view, name='admin_video_delete'),
     path('admin_dashboard/videos/add_likes/<int:pk>/', views.admin_video_add_likes_view, name='admin_video_add_likes'),
+    path('admin_dashboard/videos/<int:pk>/jobs/', views.admin_video_jobs_view, name='admin_video_jobs'), # Processing status (JSON)
 
     path('admin_dashboard/users/', views.admin_user_list_view, name='admin_user_list'),
     path('admin_dashboard/users/edit/<int:pk>/', views.admin_user_edit_view, name='admin_user_edit'),
     path('admin_dashboard/users/delete/<int:pk>/', views.admin_user_delete_view, name='admin_user_delete'),
     path('admin_dashboard/users/download_csv/', views.admin_download_users_csv, name='admin_download_users_csv'),
+    path('admin_dashboard/export/', views.admin_export_view, name='admin_export'), # Streamed CSV/JSONL downloads
 
     path('admin_dashboard/feedback/', views.admin_feedback_list_view, name='admin_feedback_list'),
     path('admin_dashboard/feedback/<int:pk>/toggle_read/', views.admin_feedback_mark_read_toggle, name='admin_feedback_mark_read_toggle'),
     path('admin_dashboard/feedback/<int:pk>/delete/', views.admin_feedback_delete, name='admin_feedback_delete'),
 
     path('admin_dashboard/notifications/send/', views.admin_send_notification_view, name='admin_send_notification'),
+    path('admin_dashboard/notifications/audience/', views.admin_notification_audience_count, name='admin_notification_audience_count'), # Live recipient count (JSON)
+    path('admin_dashboard/users/autocomplete/', views.admin_user_autocomplete, name='admin_user_autocomplete'), # Recipient picker (JSON)
+    path('admin_dashboard/jobs/<int:pk>/', views.admin_job_status_view, name='admin_job_status'), # Job progress (JSON)
 
     # Static Pages
     path('terms/', views.terms_view, name='terms'),
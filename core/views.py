@@ -1,25 +1,30 @@
 # core/views.py
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
+from django.conf import settings
+from django.urls import reverse
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.db.models import Count, Sum
-from django.http import JsonResponse, HttpResponse
+from django.contrib.auth.models import User
+from django.http import JsonResponse, Http404, StreamingHttpResponse
 from django.contrib import messages
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_POST, require_http_methods
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.db.models import Q
+from django.utils.text import slugify
 
-import csv
 import json
 import asyncio # For async operations with channels if needed
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
 
-from .models import UserProfile, Video, Comment, Feedback, Notification
+from .models import UserProfile, Video, Feedback, Job, UploadSession
 from .forms import (
     UserRegisterForm, UserLoginForm, UserProfileUpdateForm,
     VideoUploadForm, VideoEditForm, CommentForm, FeedbackForm,
-    NotificationForm, AdminUserProfileEditForm
+    NotificationForm, AdminUserProfileEditForm, ChunkedUploadStartForm, ExportForm
 )
+from . import audiences, caching, conditional, counters, direct_uploads, exports, notifications, rollups, uploads
+from .pagination import KeysetPaginator
+from .search import search_videos
 
 # --- Helper Functions for Admin Restrictions ---
 def is_admin_user(user):
@@ -34,28 +39,33 @@ def is_restricted_admin(user):
 # --- Public & User Authentication Views ---
 
 def home_view(request):
+    # The anonymous landing page gets most traffic: revalidated against the catalog's
+    # version stamp (core/conditional.py), then served from the page cache until
+    # something it shows changes (core/caching.py)
+    return conditional.respond(
+        request, conditional.catalog_validators(request),
+        lambda: caching.serve_anonymous(request, 'home', _render_home),
+    )
+
+def _render_home(request):
     # For non-logged-in users, show thumbnails and titles only
-    all_tags = Video.get_all_tags()
+    versions = caching.depend_on(request, [caching.LISTING, caching.TAG_CLOUD])
     selected_tag = request.GET.get('tag')
 
     if selected_tag:
-        videos = Video.objects.filter(tags__icontains=selected_tag).order_by('-uploaded_at')
+        videos = Video.objects.filter(tags__slug=slugify(selected_tag))
     else:
-        videos = Video.objects.all().order_by('-uploaded_at')
+        videos = Video.objects.all()
 
-    # Pagination
-    paginator = Paginator(videos, 12) # Show 12 videos per page
-    page_number = request.GET.get('page')
-    try:
-        page_obj = paginator.page(page_number)
-    except PageNotAnInteger:
-        page_obj = paginator.page(1)
-    except EmptyPage:
-        page_obj = paginator.page(paginator.num_pages)
+    # Keyset pagination: deep pages cost the same as the first one
+    paginator = KeysetPaginator(videos, 12, ordering=('-uploaded_at', '-id')) # Show 12 videos per page
+    page_obj = paginator.page(request.GET.get('cursor'))
+    caching.attach_card_versions(request, page_obj)
 
     context = {
         'page_obj': page_obj,
-        'all_tags': all_tags,
+        'all_tags': Video.get_all_tags, # Only called when the cached tag cloud fragment is missing
+        'tag_cloud_version': versions[caching.TAG_CLOUD],
         'selected_tag': selected_tag,
     }
     return render(request, 'core/index.html', context)
@@ -122,33 +132,33 @@ def user_dashboard_view(request):
     # Or, if this dashboard is for general user consumption:
     all_videos = Video.objects.all().order_by('-uploaded_at')
 
-    all_tags = Video.get_all_tags()
+    tag_cloud_version = caching.depend_on(request, [caching.TAG_CLOUD])[caching.TAG_CLOUD]
     selected_tag = request.GET.get('tag')
     search_query = request.GET.get('q')
 
     if selected_tag:
-        all_videos = all_videos.filter(tags__icontains=selected_tag)
+        all_videos = all_videos.filter(tags__slug=slugify(selected_tag))
     if search_query:
-        all_videos = all_videos.filter(
-            models.Q(title__icontains=search_query) |
-            models.Q(description__icontains=search_query) |
-            models.Q(tags__icontains=search_query)
-        )
-
-    paginator = Paginator(all_videos, 12)
-    page_number = request.GET.get('page')
-    try:
-        page_obj = paginator.page(page_number)
-    except PageNotAnInteger:
-        page_obj = paginator.page(1)
-    except EmptyPage:
-        page_obj = paginator.page(paginator.num_pages)
+        # Ranked matches are ordered by relevance, so they keep numbered pages (snippets for the shown page only)
+        paginator = Paginator(search_videos(search_query, all_videos), 12)
+        page_number = request.GET.get('page')
+        try:
+            page_obj = paginator.page(page_number)
+        except PageNotAnInteger:
+            page_obj = paginator.page(1)
+        except EmptyPage:
+            page_obj = paginator.page(paginator.num_pages)
+    else:
+        paginator = KeysetPaginator(all_videos, 12, ordering=('-uploaded_at', '-id'))
+        page_obj = paginator.page(request.GET.get('cursor'))
+    caching.attach_card_versions(request, page_obj)
 
     user_profile, created = UserProfile.objects.get_or_create(user=request.user)
 
     context = {
         'page_obj': page_obj,
-        'all_tags': all_tags,
+        'all_tags': Video.get_all_tags,
+        'tag_cloud_version': tag_cloud_version,
         'selected_tag': selected_tag,
         'search_query': search_query,
         'user_profile': user_profile,
@@ -157,12 +167,22 @@ def user_dashboard_view(request):
 
 @login_required
 def video_detail_view(request, slug):
+    # Count the view in the write buffer; the row is updated by the next flush.
+    # A revalidated page still counts (once per session, like any other visit).
+    stamp = conditional.video_stamp(slug)
+    if stamp is None:
+        raise Http404("No Video matches the given query.")
+    if not request.session.session_key:
+        request.session.save()
+    counters.record_view(stamp[0], request.session.session_key)
+    return conditional.respond(
+        request, conditional.video_validators(request, stamp),
+        lambda: _render_video_detail(request, slug),
+    )
+
+def _render_video_detail(request, slug):
     video = get_object_or_404(Video, slug=slug)
-    comments = video.comments.all()
-
-    # Increment view count
-    video.views += 1
-    video.save()
+    video.views += counters.pending_views(video.pk) # Show views not flushed yet
 
     # Comment Form
     if request.method == 'POST' and 'comment_form_submit' in request.POST:
@@ -197,27 +217,59 @@ def video_detail_view(request, slug):
 
     context = {
         'video': video,
-        'comments': comments,
+        'comment_page': lambda: _comment_page(video), # Only queried when the cached comment list is missing
+        'comments_version': caching.depend_on(request, [caching.comments_key(video.pk)])[caching.comments_key(video.pk)],
         'comment_form': comment_form,
         'feedback_form': feedback_form,
         'is_liked': is_liked,
     }
     return render(request, 'core/video_detail.html', context)
 
+def _comment_page(video, cursor=None):
+    # Newest first; select_related keeps the usernames and avatars to the one query
+    comments = video.comments.select_related('user__userprofile')
+    return KeysetPaginator(comments, settings.COMMENTS_PER_PAGE, ordering=('-created_at', '-id')).page(cursor)
+
+@login_required
+@require_http_methods(['GET', 'POST'])
+def video_comments(request, slug):
+    # GET: an older page of comments for infinite scroll. POST: adds a comment and returns it rendered.
+    video = get_object_or_404(Video.objects.only('pk', 'slug'), slug=slug)
+    if request.method == 'POST':
+        comment_form = CommentForm(request.POST)
+        if not comment_form.is_valid():
+            return JsonResponse({'errors': comment_form.errors}, status=400)
+        comment = comment_form.save(commit=False)
+        comment.video = video
+        comment.user = request.user
+        comment.save()
+        return JsonResponse({
+            'html': render_to_string('core/_comment.html', {'comment': comment}, request=request),
+            'comments_count': Video.objects.values_list('comments_count', flat=True).get(pk=video.pk),
+        }, status=201)
+
+    page = _comment_page(video, request.GET.get('cursor'))
+    return JsonResponse({
+        'html': ''.join(render_to_string('core/_comment.html', {'comment': comment}, request=request) for comment in page),
+        'next_cursor': page.next_cursor,
+    })
+
+def video_likes(request, slug):
+    # Polled by open video pages; a 304 unless the count (or anything else about the video) changed
+    def render():
+        video = get_object_or_404(Video.objects.only('pk', 'likes_count'), slug=slug)
+        liked = request.user.is_authenticated and video.likes.filter(id=request.user.id).exists()
+        return JsonResponse({'liked': liked, 'likes_count': video.likes_count})
+    return conditional.respond(request, conditional.video_validators(request, conditional.video_stamp(slug)), render)
+
 @login_required
 @require_POST
 def like_video(request, slug):
     video = get_object_or_404(Video, slug=slug)
     if request.user.is_authenticated:
-        if video.likes.filter(id=request.user.id).exists():
-            video.likes.remove(request.user)
-            liked = False
-            message = "Video unliked."
-        else:
-            video.likes.add(request.user)
-            liked = True
-            message = "Video liked!"
-        return JsonResponse({'liked': liked, 'likes_count': video.likes.count(), 'message': message})
+        liked, likes_count = video.toggle_like(request.user)
+        message = "Video liked!" if liked else "Video unliked."
+        return JsonResponse({'liked': liked, 'likes_count': likes_count, 'message': message})
     return JsonResponse({'error': 'Authentication required'}, status=401)
 
 @login_required
@@ -240,50 +292,24 @@ def profile_update_view(request):
 @login_required
 @user_passes_test(is_admin_user, login_url='home')
 def admin_dashboard_view(request):
-    total_users = User.objects.count()
-    total_videos = Video.objects.count()
-    total_likes = Video.objects.aggregate(total_likes=Count('likes'))['total_likes']
-    total_comments = Comment.objects.count()
-    total_feedback = Feedback.objects.count()
-    unread_feedback = Feedback.objects.filter(is_read=False).count()
-
-    # Data for charts (prepare as JSON for frontend Chart.js)
-    # Example 1: Videos per Tag (Pie Chart)
-    video_tags_data = Video.objects.values('tags').annotate(count=Count('id')).order_by('-count')
-    tags_labels = []
-    tags_counts = []
-    for entry in video_tags_data:
-        # Split comma-separated tags and count individually
-        for tag in [t.strip() for t in entry['tags'].split(',') if t.strip()]:
-            if tag not in tags_labels:
-                tags_labels.append(tag)
-                tags_counts.append(1) # Start with 1 if new tag
-            else:
-                tags_counts[tags_labels.index(tag)] += 1 # Increment existing count
-
-    # Example 2: Videos Uploaded over Time (Line Chart)
-    video_upload_dates = Video.objects.extra({'date': "date(uploaded_at)"}).values('date').annotate(count=Count('id')).order_by('date')
-    upload_labels = [str(entry['date']) for entry in video_upload_dates]
-    upload_counts = [entry['count'] for entry in video_upload_dates]
-
-    # Example 3: Most Viewed Videos (Bar Chart)
-    most_viewed_videos = Video.objects.order_by('-views')[:5]
-    viewed_labels = [v.title for v in most_viewed_videos]
-    viewed_counts = [v.views for v in most_viewed_videos]
-
+    # Totals come from the daily rollups (core/rollups.py); the charts load from admin_dashboard_charts
+    totals = rollups.totals()
     context = {
-        'total_users': total_users,
-        'total_videos': total_videos,
-        'total_likes': total_likes,
-        'total_comments': total_comments,
-        'total_feedback': total_feedback,
-        'unread_feedback': unread_feedback,
-        'tags_chart_data': json.dumps({'labels': tags_labels, 'data': tags_counts}),
-        'upload_chart_data': json.dumps({'labels': upload_labels, 'data': upload_counts}),
-        'viewed_chart_data': json.dumps({'labels': viewed_labels, 'data': viewed_counts}),
+        'total_users': totals['users'],
+        'total_videos': totals['videos'],
+        'total_likes': totals['likes'],
+        'total_comments': totals['comments'],
+        'total_feedback': totals['feedback'],
+        'unread_feedback': totals['unread_feedback'],
+        'export_form': ExportForm(),
     }
     return render(request, 'core/admin_dashboard.html', context)
 
+@login_required
+@user_passes_test(is_admin_user, login_url='home')
+def admin_dashboard_charts(request):
+    return JsonResponse(rollups.chart_data())
+
 @login_required
 @user_passes_test(is_admin_user, login_url='home')
 def admin_video_upload_view(request):
@@ -292,28 +318,167 @@ def admin_video_upload_view(request):
         if form.is_valid():
             video = form.save(commit=False)
             video.admin = request.user
-            video.save()
-            messages.success(request, f"Video '{video.title}' uploaded successfully!")
+            video.save() # Stores the file and queues thumbnailing for the job worker
+            form.save_m2m() # Tags
+            if video.duplicate_of:
+                messages.success(request, f"Video '{video.title}' uploaded successfully! It is identical to '{video.duplicate_of.title}', so its processed media was reused.")
+            else:
+                messages.success(request, f"Video '{video.title}' uploaded successfully! Its thumbnail will appear once processing finishes.")
             return redirect('admin_dashboard')
         else:
             messages.error(request, "Video upload failed. Please correct errors.")
     else:
         form = VideoUploadForm()
-    return render(request, 'core/admin_video_upload.html', {'form': form})
+    return render(request, 'core/admin_video_upload.html', {'form': form, 'direct_uploads': direct_uploads.direct_uploads_enabled()})
+
+# --- Resumable chunked uploads (JSON API used by core/js/chunked_upload.js) ---
+
+@login_required
+@user_passes_test(is_admin_user, login_url='home')
+@require_POST
+def admin_chunked_upload_start(request):
+    form = ChunkedUploadStartForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    session = uploads.start_upload(
+        request.user,
+        filename=form.cleaned_data['filename'],
+        size=form.cleaned_data['size'],
+        title=form.cleaned_data['title'],
+        description=form.cleaned_data['description'],
+        tags=form.cleaned_data['tags'],
+    )
+    return JsonResponse({
+        'upload_id': str(session.pk),
+        'offset': session.offset,
+        'chunk_size': settings.CHUNKED_UPLOAD_CHUNK_SIZE,
+        'upload_url': reverse('admin_chunked_upload', args=[session.pk]),
+        'finalize_url': reverse('admin_chunked_upload_finalize', args=[session.pk]),
+    }, status=201)
+
+@login_required
+@user_passes_test(is_admin_user, login_url='home')
+@require_http_methods(['HEAD', 'GET', 'PATCH'])
+def admin_chunked_upload(request, upload_id):
+    session = get_object_or_404(UploadSession, pk=upload_id, admin=request.user)
+    if request.method == 'PATCH':
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+            length = int(request.headers.get('Content-Length', ''))
+        except ValueError:
+            return JsonResponse({'error': 'Upload-Offset and Content-Length headers are required.'}, status=400)
+        try:
+            uploads.append_chunk(session, offset, request, length)
+        except uploads.OffsetMismatch as e:
+            response = JsonResponse({'error': str(e), 'offset': e.expected}, status=e.status)
+            response['Upload-Offset'] = e.expected
+            return response
+        except uploads.UploadError as e:
+            return JsonResponse({'error': str(e)}, status=e.status)
+    response = JsonResponse({'offset': session.offset, 'size': session.size})
+    response['Upload-Offset'] = session.offset
+    response['Upload-Length'] = session.size
+    response['Cache-Control'] = 'no-store'
+    return response
+
+@login_required
+@user_passes_test(is_admin_user, login_url='home')
+@require_POST
+def admin_chunked_upload_finalize(request, upload_id):
+    session = get_object_or_404(UploadSession, pk=upload_id, admin=request.user)
+    try:
+        video = uploads.finalize_upload(session)
+    except uploads.UploadError as e:
+        return JsonResponse({'error': str(e), 'offset': session.offset}, status=e.status)
+    messages.success(request, f"Video '{video.title}' uploaded successfully! Its thumbnail will appear once processing finishes.")
+    return JsonResponse({'video_id': video.pk, 'redirect_url': reverse('admin_dashboard')}, status=201)
+
+# --- Direct-to-bucket multipart uploads (S3 storage only; see core/direct_uploads.py) ---
+
+def _direct_upload_session(request, upload_id):
+    if not direct_uploads.direct_uploads_enabled():
+        raise Http404
+    return get_object_or_404(UploadSession, pk=upload_id, admin=request.user, multipart_id__gt='')
+
+@login_required
+@user_passes_test(is_admin_user, login_url='home')
+@require_POST
+def admin_direct_upload_start(request):
+    if not direct_uploads.direct_uploads_enabled():
+        raise Http404
+    form = ChunkedUploadStartForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    try:
+        session = direct_uploads.start_direct_upload(
+            request.user,
+            filename=form.cleaned_data['filename'],
+            size=form.cleaned_data['size'],
+            title=form.cleaned_data['title'],
+            description=form.cleaned_data['description'],
+            tags=form.cleaned_data['tags'],
+        )
+    except uploads.UploadError as e:
+        return JsonResponse({'error': str(e)}, status=502)
+    return JsonResponse({
+        'upload_id': str(session.pk),
+        'part_size': direct_uploads.part_size_for(session.size),
+        'part_count': direct_uploads.part_count(session),
+        'parts_url': reverse('admin_direct_upload_parts', args=[session.pk]),
+        'complete_url': reverse('admin_direct_upload_complete', args=[session.pk]),
+        'abort_url': reverse('admin_direct_upload_abort', args=[session.pk]),
+    }, status=201)
+
+@login_required
+@user_passes_test(is_admin_user, login_url='home')
+@require_http_methods(['GET', 'POST'])
+def admin_direct_upload_parts(request, upload_id):
+    """GET lists the parts already in the bucket; POST {"part_numbers": [...]} signs upload URLs."""
+    session = _direct_upload_session(request, upload_id)
+    try:
+        if request.method == 'GET':
+            response = JsonResponse({'parts': direct_uploads.uploaded_parts(session), 'part_count': direct_uploads.part_count(session)})
+            response['Cache-Control'] = 'no-store'
+            return response
+        try:
+            part_numbers = [int(number) for number in json.loads(request.body)['part_numbers']]
+        except (ValueError, KeyError, TypeError):
+            return JsonResponse({'error': 'Expected {"part_numbers": [...]}.'}, status=400)
+        urls = direct_uploads.sign_parts(session, part_numbers)
+    except uploads.UploadError as e:
+        return JsonResponse({'error': str(e)}, status=e.status)
+    return JsonResponse({'urls': {str(number): url for number, url in urls.items()}})
+
+@login_required
+@user_passes_test(is_admin_user, login_url='home')
+@require_POST
+def admin_direct_upload_complete(request, upload_id):
+    session = _direct_upload_session(request, upload_id)
+    try:
+        parts = json.loads(request.body)['parts']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected {"parts": [{"PartNumber": ..., "ETag": ...}, ...]}.'}, status=400)
+    try:
+        video = direct_uploads.complete_direct_upload(session, parts)
+    except uploads.UploadError as e:
+        return JsonResponse({'error': str(e)}, status=e.status)
+    messages.success(request, f"Video '{video.title}' uploaded successfully! Its thumbnail will appear once processing finishes.")
+    return JsonResponse({'video_id': video.pk, 'redirect_url': reverse('admin_dashboard')}, status=201)
+
+@login_required
+@user_passes_test(is_admin_user, login_url='home')
+@require_POST
+def admin_direct_upload_abort(request, upload_id):
+    direct_uploads.abort_direct_upload(_direct_upload_session(request, upload_id))
+    return JsonResponse({'aborted': True})
 
 @login_required
 @user_passes_test(is_admin_user, login_url='home')
 def admin_video_list_view(request):
-    videos = Video.objects.all().order_by('-uploaded_at')
+    videos = Video.objects.all()
     # Add search and filter if needed
-    paginator = Paginator(videos, 10) # 10 videos per page
-    page_number = request.GET.get('page')
-    try:
-        page_obj = paginator.page(page_number)
-    except PageNotAnInteger:
-        page_obj = paginator.page(1)
-    except EmptyPage:
-        page_obj = paginator.page(paginator.num_pages)
+    paginator = KeysetPaginator(videos, 10, ordering=('-uploaded_at', '-id'), estimate_total=True) # 10 videos per page
+    page_obj = paginator.page(request.GET.get('cursor'))
 
     context = {'page_obj': page_obj}
     return render(request, 'core/admin_video_list.html', context)
@@ -334,6 +499,18 @@ def admin_video_edit_view(request, pk):
         form = VideoEditForm(instance=video)
     return render(request, 'core/admin_video_edit.html', {'form': form, 'video': video})
 
+@login_required
+@user_passes_test(is_admin_user, login_url='home')
+def admin_video_jobs_view(request, pk):
+    # Polled by the admin UI; the same payload is pushed over the notification socket
+    video = get_object_or_404(Video, pk=pk)
+    jobs = [job.as_dict() for job in video.jobs.order_by('created_at')]
+    return JsonResponse({
+        'video_id': video.pk,
+        'thumbnail_url': video.thumbnail.url if video.thumbnail else None,
+        'jobs': jobs,
+    })
+
 @login_required
 @user_passes_test(is_admin_user, login_url='home')
 @require_POST
@@ -370,15 +547,9 @@ def admin_video_add_likes_view(request, pk):
 @login_required
 @user_passes_test(is_admin_user, login_url='home')
 def admin_user_list_view(request):
-    users = User.objects.select_related('userprofile').order_by('username')
-    paginator = Paginator(users, 10)
-    page_number = request.GET.get('page')
-    try:
-        page_obj = paginator.page(page_number)
-    except PageNotAnInteger:
-        page_obj = paginator.page(1)
-    except EmptyPage:
-        page_obj = paginator.page(paginator.num_pages)
+    users = User.objects.select_related('userprofile')
+    paginator = KeysetPaginator(users, 10, ordering=('username', 'id'), estimate_total=True)
+    page_obj = paginator.page(request.GET.get('cursor'))
     context = {'page_obj': page_obj}
     return render(request, 'core/admin_user_list.html', context)
 
@@ -436,15 +607,9 @@ def admin_user_delete_view(request, pk):
 @login_required
 @user_passes_test(is_admin_user, login_url='home')
 def admin_feedback_list_view(request):
-    feedback_list = Feedback.objects.all().order_by('-created_at')
-    paginator = Paginator(feedback_list, 10)
-    page_number = request.GET.get('page')
-    try:
-        page_obj = paginator.page(page_number)
-    except PageNotAnInteger:
-        page_obj = paginator.page(1)
-    except EmptyPage:
-        page_obj = paginator.page(paginator.num_pages)
+    feedback_list = Feedback.objects.all()
+    paginator = KeysetPaginator(feedback_list, 10, ordering=('-created_at', '-id'), estimate_total=True)
+    page_obj = paginator.page(request.GET.get('cursor'))
     context = {'page_obj': page_obj}
     return render(request, 'core/admin_feedback_list.html', context)
 
@@ -473,56 +638,80 @@ def admin_send_notification_view(request):
     if request.method == 'POST':
         form = NotificationForm(request.POST)
         if form.is_valid():
-            selected_users = form.cleaned_data['users']
-            message = form.cleaned_data['message']
-
-            channel_layer = get_channel_layer()
-            for user in selected_users:
-                Notification.objects.create(user=user, message=message)
-                # Send real-time notification via WebSocket (if user is connected)
-                async_to_sync(channel_layer.group_send)(
-                    f"user_{user.id}",
-                    {
-                        "type": "send_notification", # Corresponds to consumer method
-                        "message": message,
-                    }
-                )
-            messages.success(request, f"Notifications sent to {len(selected_users)} users.")
-            return redirect('admin_dashboard')
+            # The rows and WebSocket pushes are written by the job worker (core/notifications.py)
+            audience = form.audience()
+            job = notifications.send(form.cleaned_data['message'], request.user, audience)
+            total = job.payload['progress']['total']
+            messages.success(request, f"Sending notifications to {audiences.describe(audience)}: {total} users (job #{job.pk}).")
+            return redirect(f"{reverse('admin_send_notification')}?job={job.pk}")
         else:
             messages.error(request, "Failed to send notifications. Please correct errors.")
     else:
         form = NotificationForm()
-    return render(request, 'core/admin_send_notification.html', {'form': form})
+    job = Job.objects.filter(pk=request.GET.get('job'), kind='notify').first() if request.GET.get('job', '').isdigit() else None
+    picked_users = []
+    if form.is_bound:
+        picked_users = form.cleaned_data.get('users') or [] # Re-shown as chips after a failed post
+    return render(request, 'core/admin_send_notification.html', {'form': form, 'job': job, 'picked_users': picked_users})
 
 @login_required
 @user_passes_test(is_admin_user, login_url='home')
-def admin_download_users_csv(request):
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="users_data.csv"'
-
-    writer = csv.writer(response)
-    # Header row
-    writer.writerow(['ID', 'Username', 'Email', 'First Name', 'Last Name', 'Date Joined', 'Is Active', 'Is Staff', 'Is Superuser', 'Is Main Admin', 'Is Restricted Admin', 'Bio'])
-
-    users = User.objects.all().select_related('userprofile')
-    for user in users:
-        writer.writerow([
-            user.id,
-            user.username,
-            user.email,
-            user.first_name,
-            user.last_name,
-            user.date_joined.strftime('%Y-%m-%d %H:%M:%S'), # Format datetime
-            'Yes' if user.is_active else 'No',
-            'Yes' if user.is_staff else 'No',
-            'Yes' if user.is_superuser else 'No',
-            'Yes' if hasattr(user, 'userprofile') and user.userprofile.is_main_admin else 'No',
-            'Yes' if hasattr(user, 'userprofile') and user.userprofile.is_restricted_admin else 'No',
-            user.userprofile.bio if hasattr(user, 'userprofile') else ''
-        ])
+def admin_notification_audience_count(request):
+    # Live recipient count for the send form: the posted audience resolved with a single COUNT
+    form = NotificationForm(request.GET)
+    form.is_valid()
+    if not form.cleaned_data.get('segment') and not form.cleaned_data.get('users'):
+        return JsonResponse({'count': 0})
+    if 'segment' in form.errors or 'tag' in form.errors or 'days' in form.errors:
+        return JsonResponse({'errors': form.errors}, status=400)
+    return JsonResponse({'count': audiences.resolve(form.audience()).count()})
+
+@login_required
+@user_passes_test(is_admin_user, login_url='home')
+def admin_user_autocomplete(request):
+    # Username/email/name prefix search for picking individual recipients
+    query = request.GET.get('q', '').strip()
+    if len(query) < 2:
+        return JsonResponse({'results': []})
+    users = (
+        User.objects.filter(
+            Q(username__istartswith=query) | Q(email__istartswith=query)
+            | Q(first_name__istartswith=query) | Q(last_name__istartswith=query)
+        )
+        .order_by('username').values('id', 'username', 'email')[:20]
+    )
+    return JsonResponse({'results': list(users)})
+
+@login_required
+@user_passes_test(is_admin_user, login_url='home')
+def admin_job_status_view(request, pk):
+    # Progress of a background job, polled by the admin UI (also pushed over the notification socket)
+    return JsonResponse(get_object_or_404(Job, pk=pk).as_dict())
+
+def _export_response(name, format='csv', compress=False, since=None, until=None):
+    # Streamed a chunk of rows at a time (core/exports.py), never built in memory
+    response = StreamingHttpResponse(
+        exports.stream(name, format, compress, since, until), content_type=exports.content_type(format, compress),
+    )
+    response['Content-Disposition'] = f'attachment; filename="{exports.filename(name, format, compress)}"'
     return response
 
+@login_required
+@user_passes_test(is_admin_user, login_url='home')
+def admin_export_view(request):
+    form = ExportForm(request.GET)
+    if not form.is_valid():
+        for errors in form.errors.values():
+            messages.error(request, errors[0])
+        return redirect('admin_dashboard')
+    data = form.cleaned_data
+    return _export_response(data['dataset'], data['format'], data['gzip'], data['since'], data['until'])
+
+@login_required
+@user_passes_test(is_admin_user, login_url='home')
+def admin_download_users_csv(request):
+    return _export_response('users')
+
 # --- Static/Informational Pages ---
 def terms_view(request):
     return render(request, 'core/terms.html')
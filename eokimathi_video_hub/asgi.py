@@ -1,7 +1,7 @@
 # eokimathi_video_hub/asgi.py
 import os
 import django
-from channels.routing import ProtocolTypeRouter, URLRouter
+from channels.routing import ChannelNameRouter, ProtocolTypeRouter, URLRouter
 from django.core.asgi import get_asgi_application
 from channels.auth import AuthMiddlewareStack
 
@@ -17,4 +17,5 @@ application = ProtocolTypeRouter({
             routing.websocket_urlpatterns
         )
     ),
+    "channel": ChannelNameRouter(routing.channel_routes),
 })
\ No newline at end of file
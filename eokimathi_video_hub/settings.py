@@ -1,4 +1,5 @@
 import os
+import socket
 from pathlib import Path
 import dj_database_url # Make sure you have installed: pip install dj-database-url
 
@@ -66,6 +67,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'core.context_processors.notifications',
             ],
         },
     },
@@ -139,12 +141,32 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Local media serving with Range/ETag support (core/media_serving.py). Behind nginx set
+# MEDIA_ACCEL_REDIRECT_PREFIX to an internal location (e.g. /protected-media/); behind
+# Apache/lighttpd set MEDIA_SENDFILE_HEADER = 'X-Sendfile' to hand the transfer off.
+SERVE_MEDIA_LOCALLY = os.environ.get('SERVE_MEDIA_LOCALLY', str(DEBUG)) == 'True'
+MEDIA_RANGE_SERVE_DIRS = ('videos/', 'thumbnails/')
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get('MEDIA_ACCEL_REDIRECT_PREFIX', '')
+MEDIA_SENDFILE_HEADER = os.environ.get('MEDIA_SENDFILE_HEADER', '')
+MEDIA_CACHE_MAX_AGE = 24 * 3600
+
+# Responsive video thumbnails (core/media.py): widths generated in WebP and JPEG for srcset
+THUMBNAIL_WIDTHS = (320, 480, 640, 960)
+THUMBNAIL_QUALITY = 80
+
+# Avatar variants (core/avatars.py): CSS pixel size per place an avatar is shown, rendered at
+# AVATAR_DENSITY times that for high-DPI screens
+AVATAR_VARIANTS = {'navbar': 32, 'comment': 48, 'profile': 160}
+AVATAR_DENSITY = 2
+AVATAR_QUALITY = 82
+
 # AWS S3 Configuration for Media Files (Production)
 if not DEBUG:
     AWS_ACCESS_KEY_ID = os.environ.get('AWS_ACCESS_KEY_ID')
     AWS_SECRET_ACCESS_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY')
     AWS_STORAGE_BUCKET_NAME = os.environ.get('AWS_STORAGE_BUCKET_NAME')
     AWS_S3_REGION_NAME = os.environ.get('AWS_S3_REGION_NAME', 'us-east-1') # Or your preferred region
+    AWS_S3_ENDPOINT_URL = os.environ.get('AWS_S3_ENDPOINT_URL') # Set for S3-compatible stores such as MinIO
 
     AWS_S3_CUSTOM_DOMAIN = f'{AWS_STORAGE_BUCKET_NAME}.s3.amazonaws.com'
     AWS_S3_FILE_OVERWRITE = False
@@ -167,15 +189,102 @@ LOGOUT_REDIRECT_URL = 'home' # After logout, redirect to homepage
 
 
 # Django Channels settings for real-time notifications
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0') # For Render Redis or local
+
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels_redis.core.RedisChannelLayer",
         "CONFIG": {
-            "hosts": [os.environ.get('REDIS_URL', 'redis://localhost:6379/0')], # For Render Redis or local
+            "hosts": [REDIS_URL],
         },
     },
 }
 
+# Shared cache (tag cloud, dashboard charts, page and fragment caches; see core/caching.py).
+# 'locmem' is per-process memory, meant for development and tests.
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem' if DEBUG else 'redis')
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    } if CACHE_BACKEND == 'locmem' else {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,
+    },
+}
+PAGE_CACHE_SECONDS = int(os.environ.get('PAGE_CACHE_SECONDS', 300)) # Anonymous responses of cached views
+
+COMMENTS_PER_PAGE = 20 # Comments rendered with a video page; older ones load by cursor as the list scrolls
+
+# Admin dashboard charts (core/rollups.py) are cached for this long
+ROLLUP_CHARTS_CACHE_SECONDS = int(os.environ.get('ROLLUP_CHARTS_CACHE_SECONDS', 300))
+
+# Buffered view counts (core/counters.py). 'redis' shares the buffer between all web processes;
+# 'local' keeps it in-process, which is only right for a single development server.
+VIEW_COUNTER_STORE = os.environ.get('VIEW_COUNTER_STORE', 'local' if DEBUG else 'redis')
+VIEW_COUNT_FLUSH_INTERVAL = int(os.environ.get('VIEW_COUNT_FLUSH_INTERVAL', 10)) # seconds between flush_view_counts --loop runs
+VIEW_COUNT_MAX_STALENESS = int(os.environ.get('VIEW_COUNT_MAX_STALENESS', 60)) # a request flushes inline past this age
+VIEW_COUNT_DEDUPE_WINDOW = 30 * 60 # seconds during which repeat views from one session are not counted
+
+# Uploaded files are hashed while they stream in (content-addressed storage, core/blobs.py)
+FILE_UPLOAD_HANDLERS = [
+    'core.uploads.HashingMemoryFileUploadHandler',
+    'core.uploads.HashingTemporaryFileUploadHandler',
+]
+
+# Resumable chunked video uploads (core/uploads.py)
+CHUNKED_UPLOAD_CHUNK_SIZE = int(os.environ.get('CHUNKED_UPLOAD_CHUNK_SIZE', 5 * 1024 * 1024)) # bytes per PATCH
+CHUNKED_UPLOAD_DIR = os.environ.get('CHUNKED_UPLOAD_DIR', os.path.join(BASE_DIR, 'upload_staging'))
+CHUNKED_UPLOAD_EXPIRY = 24 * 3600 # Partial uploads idle for longer than this are swept
+
+# Direct-to-bucket multipart uploads (core/direct_uploads.py); only used when media lives in S3,
+# otherwise the upload page falls back to chunked uploads through the web workers
+DIRECT_UPLOADS = os.environ.get('DIRECT_UPLOADS', 'True') == 'True'
+DIRECT_UPLOAD_PART_SIZE = int(os.environ.get('DIRECT_UPLOAD_PART_SIZE', 16 * 1024 * 1024)) # bytes per presigned PUT
+DIRECT_UPLOAD_URL_EXPIRY = 3600 # seconds a presigned part URL stays valid
+
+# Background job queue (core/jobs.py). Jobs are stored in the database and run by
+# the `runworker ... media-jobs` process from the Procfile.
+JOB_CHANNEL = 'media-jobs'
+JOB_WORKER_NODE = os.environ.get('JOB_WORKER_NODE', socket.gethostname()) # Concurrency is capped per node
+JOB_WORKER_CONCURRENCY = int(os.environ.get('JOB_WORKER_CONCURRENCY', 2))
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BACKOFF_BASE = 30 # seconds; doubled on each failed attempt
+JOB_RETRY_BACKOFF_MAX = 3600
+JOB_HEARTBEAT_INTERVAL = 60 # seconds between heartbeats from a process running jobs
+JOB_LOCK_TIMEOUT = 5 * 60 # Running jobs without a heartbeat for this long are assumed dead and requeued
+NOTIFICATION_BATCH_SIZE = 1000 # Notification rows inserted (and users pushed to) per step of a 'notify' job
+NOTIFICATION_BACKLOG_SIZE = 10 # Unread notifications sent to a socket when it connects
+NOTIFICATION_UNREAD_CACHE_SECONDS = 24 * 3600 # Cached unread counts are recounted at least this often
+
+EXPORT_CHUNK_SIZE = 2000 # Rows fetched, encoded and sent per step of an admin data export (core/exports.py)
+
+# Live comments (core/live_comments.py): new comments are batched by the
+# `runworker comment-fanout` process and pushed to open video pages. It runs apart
+# from the media-jobs worker, whose transcodes would otherwise delay every flush.
+COMMENT_FANOUT_CHANNEL = 'comment-fanout'
+COMMENT_FANOUT_INTERVAL = 0.25 # seconds of comments coalesced into one send per video
+
+# Adaptive-bitrate HLS renditions (core/transcode.py), encoded by the job worker
+FFMPEG_BINARY = os.environ.get('FFMPEG_BINARY', 'ffmpeg')
+FFPROBE_BINARY = os.environ.get('FFPROBE_BINARY', 'ffprobe')
+FFPROBE_TIMEOUT = 60 # seconds; remote files are probed over HTTP range requests
+HLS_LADDER = [
+    {'height': 240, 'video_bitrate': '400k', 'audio_bitrate': '64k'},
+    {'height': 480, 'video_bitrate': '1000k', 'audio_bitrate': '96k'},
+    {'height': 720, 'video_bitrate': '2500k', 'audio_bitrate': '128k'},
+]
+HLS_SEGMENT_SECONDS = 6
+HLS_MAX_PROCESSES = int(os.environ.get('HLS_MAX_PROCESSES', 2)) # Concurrent ffmpeg encodes per worker
+
+# Seek-preview sprite sheets + WebVTT thumbnails track (core/previews.py)
+PREVIEW_INTERVAL = 10 # seconds between sampled frames
+PREVIEW_TILE_WIDTH = 160
+PREVIEW_TILE_HEIGHT = 90
+PREVIEW_COLUMNS = 10
+PREVIEW_ROWS = 10 # 100 tiles (~16 minutes at the default interval) per sheet
+PREVIEW_FORMAT = 'JPEG' # or 'WEBP'
+PREVIEW_QUALITY = 70
+
 # FFmpeg path for moviepy (for local development, Render might have it pre-installed)
 # If moviepy struggles, uncomment and set this path to your ffmpeg.exe
 # import os
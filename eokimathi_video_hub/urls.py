@@ -1,14 +1,25 @@
 # eokimathi_video_hub/urls.py
+import re
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from core.media_serving import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('core.urls')), # Include your app's URLs
 ]
 
+# Serve videos and thumbnails from local disk with Range/ETag support (seeking in the player)
+if settings.SERVE_MEDIA_LOCALLY:
+    urlpatterns += [
+        re_path(r'^%s(?P<path>(?:%s).+)$' % (
+            re.escape(settings.MEDIA_URL.lstrip('/')),
+            '|'.join(re.escape(d) for d in settings.MEDIA_RANGE_SERVE_DIRS),
+        ), serve_media, name='serve_media'),
+    ]
+
 # Serve media files in development
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)